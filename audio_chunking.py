@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+"""
+Découpage des longs fichiers audio en segments chevauchants
+Ce module prépare les segments envoyés en parallèle à Whisper et recolle les
+transcriptions partielles (dédoublonnage du chevauchement, horodatages corrigés)
+"""
+
+import io
+import re
+import subprocess
+
+DEFAULT_CHUNK_SECONDS = 600
+DEFAULT_OVERLAP_SECONDS = 5
+
+
+def _find_silence_cut(silences, earliest, latest):
+    """Retourne le milieu du silence le plus tardif dont le milieu est dans [earliest, latest]"""
+    best = None
+    for silence_start, silence_end in silences or []:
+        middle = (silence_start + silence_end) / 2
+        if earliest <= middle <= latest:
+            best = middle
+    return best
+
+
+def plan_chunks(duration, chunk_seconds=DEFAULT_CHUNK_SECONDS, overlap_seconds=DEFAULT_OVERLAP_SECONDS,
+                silences=None, silence_search_ratio=0.15):
+    """
+    Calcule le plan de découpage d'un fichier audio
+
+    Chaque segment « possède » la portion [own_start, own_end) de l'audio; c'est
+    cette zone qui sert au dédoublonnage lors du recollage. Quand des silences
+    sont fournis, les coupures sont placées au milieu d'un silence proche de la
+    coupure nominale et ne nécessitent alors pas de chevauchement.
+
+    Args:
+        duration (float): Durée totale en secondes
+        chunk_seconds (float): Durée maximale d'un segment
+        overlap_seconds (float): Chevauchement autour des coupures faites hors silence
+        silences (list, optional): Plages de silence [début, fin] (voir preprocess_audio.detect_silences)
+        silence_search_ratio (float): Fraction de chunk_seconds avant la coupure nominale où chercher un silence
+
+    Returns:
+        list: Segments {index, start, end, own_start, own_end}
+    """
+    if chunk_seconds <= overlap_seconds:
+        raise ValueError("La durée des segments doit être supérieure au chevauchement")
+
+    # Coupures (position, chevauchement autour de la coupure)
+    cuts = [(0.0, 0.0)]
+    while True:
+        position, overlap = cuts[-1]
+        window_start = position - overlap / 2
+        if window_start + chunk_seconds >= duration:
+            break
+
+        nominal = window_start + chunk_seconds - overlap_seconds / 2
+        silence_cut = _find_silence_cut(
+            silences,
+            nominal - chunk_seconds * silence_search_ratio,
+            window_start + chunk_seconds
+        )
+        if silence_cut is not None and silence_cut > position:
+            cuts.append((silence_cut, 0.0))
+        else:
+            cuts.append((nominal, overlap_seconds))
+
+    chunks = []
+    for i, (position, overlap) in enumerate(cuts):
+        is_last = i == len(cuts) - 1
+        next_position, next_overlap = (duration, 0.0) if is_last else cuts[i + 1]
+        chunks.append({
+            "index": i,
+            "start": max(0.0, position - overlap / 2),
+            "end": min(duration, next_position + next_overlap / 2),
+            "own_start": position,
+            "own_end": float("inf") if is_last else next_position
+        })
+
+    return chunks
+
+
+def extract_chunk(input_file, start, duration, output_file, bitrate_kbps=64):
+    """
+    Extrait un segment audio mono 16 kHz avec FFmpeg
+
+    Args:
+        input_file (str): Fichier source
+        start (float): Début du segment en secondes
+        duration (float): Durée du segment en secondes
+        output_file (str): Fichier MP3 de sortie
+        bitrate_kbps (int): Bitrate du segment
+
+    Returns:
+        str: Chemin du segment extrait
+    """
+    command = [
+        "ffmpeg",
+        "-v", "error",
+        "-ss", f"{start:.3f}",
+        "-t", f"{duration:.3f}",
+        "-i", input_file,
+        "-vn",
+        "-ac", "1",
+        "-ar", "16000",
+        "-c:a", "libmp3lame",
+        "-b:a", f"{bitrate_kbps}k",
+        "-y",
+        output_file
+    ]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(f"Erreur FFmpeg: {process.stderr.decode('utf-8', errors='replace')}")
+    return output_file
+
+
+class FFmpegAudioStream(io.RawIOBase):
+    """
+    Flux MP3 lu directement sur la sortie standard d'FFmpeg
+
+    L'objet se comporte comme un fichier en lecture seule, non repositionnable
+    et de taille inconnue: il peut être passé tel quel au SDK OpenAI, qui lit
+    le corps de la requête par blocs bornés sans fichier intermédiaire.
+    """
+
+    def __init__(self, input_file, start=None, duration=None, bitrate_kbps=64, sample_rate=16000):
+        super().__init__()
+        command = ["ffmpeg", "-v", "error"]
+        if start:
+            command += ["-ss", f"{start:.3f}"]
+        if duration:
+            command += ["-t", f"{duration:.3f}"]
+        command += [
+            "-i", input_file,
+            "-vn",
+            "-ac", "1",
+            "-ar", str(sample_rate),
+            "-c:a", "libmp3lame",
+            "-b:a", f"{bitrate_kbps}k",
+            "-f", "mp3",
+            "pipe:1"
+        ]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.process.stdout.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        self.bytes_read += size
+        return size
+
+    def check(self):
+        """Attend la fin d'FFmpeg et lève une erreur s'il a échoué"""
+        self.process.stdout.close()
+        stderr = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"Erreur FFmpeg: {stderr.decode('utf-8', errors='replace')}")
+
+    def close(self):
+        if not self.closed:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+            self.process.stdout.close()
+            self.process.stderr.close()
+        super().close()
+
+
+def decode_audio(input_file, sample_rate=16000, duration=None):
+    """
+    Décode un fichier audio en échantillons PCM mono avec FFmpeg, sans fichier intermédiaire
+
+    Les échantillons restent en int16 (deux fois moins de mémoire qu'en float32):
+    chaque segment est converti au moment de sa transcription.
+
+    Args:
+        duration (float, optional): Ne décode que ce début de l'audio (FFmpeg s'arrête ensuite)
+
+    Returns:
+        numpy.ndarray: Échantillons int16 à sample_rate Hz
+    """
+    import numpy as np
+
+    command = ["ffmpeg", "-v", "error", "-nostdin", "-threads", "0"]
+    if duration:
+        command += ["-t", f"{duration:.3f}"]
+    command += [
+        "-i", input_file,
+        "-vn",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-f", "s16le",
+        "pipe:1"
+    ]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(f"Erreur FFmpeg: {process.stderr.decode('utf-8', errors='replace')}")
+    return np.frombuffer(process.stdout, dtype=np.int16)
+
+
+def _normalize_word(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def merge_overlapping_text(previous, following, max_words=60):
+    """
+    Recolle deux textes dont la fin du premier recouvre le début du second
+
+    Cherche la plus longue suite de mots (au plus max_words) qui termine
+    previous et commence following, et ne la conserve qu'une fois.
+    """
+    previous_words = previous.split()
+    following_words = following.split()
+    if not previous_words:
+        return following.strip()
+    if not following_words:
+        return previous.strip()
+
+    previous_norm = [_normalize_word(w) for w in previous_words[-max_words:]]
+    following_norm = [_normalize_word(w) for w in following_words[:max_words]]
+
+    for size in range(min(len(previous_norm), len(following_norm)), 0, -1):
+        if previous_norm[-size:] == following_norm[:size]:
+            return " ".join(previous_words + following_words[size:])
+
+    return " ".join(previous_words + following_words)
+
+
+def to_columns(items, fields):
+    """
+    Convertit une liste de dictionnaires en colonnes parallèles
+
+    Exemple: [{"start": 0, "text": "a"}, {"start": 1, "text": "b"}]
+    devient {"start": [0, 1], "text": ["a", "b"]}
+    """
+    return {field: [item.get(field) for item in items] for field in fields}
+
+
+def merge_chunk_results(chunks, results, segment_fields=("start", "end", "text"), word_fields=("start", "end", "word")):
+    """
+    Recolle les transcriptions des segments
+
+    Les segments et les mots sont décalés au temps absolu, puis conservés
+    uniquement s'ils tombent (par leur milieu) dans la zone possédée par le segment.
+
+    Args:
+        chunks (list): Plan de découpage (voir plan_chunks)
+        results (list): Pour chaque segment, {"text": str, "segments": [{"start", "end", "text", ...}],
+            "words": [{"start", "end", "word"}]} avec des horodatages relatifs au début du segment
+        segment_fields (tuple): Colonnes des segments en sortie
+        word_fields (tuple): Colonnes des mots en sortie
+
+    Returns:
+        tuple: (texte complet, segments en colonnes, mots en colonnes)
+    """
+    segments = []
+    words = []
+    text = ""
+
+    def owned(item, chunk):
+        start = item["start"] + chunk["start"]
+        end = item["end"] + chunk["start"]
+        if not chunk["own_start"] <= (start + end) / 2 < chunk["own_end"]:
+            return None
+        return dict(item, start=round(start, 3), end=round(end, 3))
+
+    for chunk, result in zip(chunks, results):
+        chunk_segments = result.get("segments") or []
+
+        if not chunk_segments:
+            # Pas d'horodatages: dédoublonnage sur le texte uniquement
+            text = merge_overlapping_text(text, result.get("text", ""))
+            continue
+
+        kept = [segment for segment in (owned(item, chunk) for item in chunk_segments) if segment]
+        for segment in kept:
+            segment["text"] = segment["text"].strip()
+        segments.extend(kept)
+        words.extend(word for word in (owned(item, chunk) for item in result.get("words") or []) if word)
+
+        text = " ".join(part for part in [text.strip(), " ".join(segment["text"] for segment in kept)] if part)
+
+    return text, to_columns(segments, segment_fields), to_columns(words, word_fields)
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Batch Summarization Engine
+Summarizes many conversations or transcripts in one process: requests run
+concurrently on asyncio behind a rate limiter that bounds concurrency and
+tokens per minute and honours Retry-After, and texts longer than the
+context window are summarized hierarchically (map-reduce).
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from collections import deque
+
+from chat_context import count_tokens
+from transcript_index import split_passages
+from openai_client import check_openai_config, create_async_client
+from openai_cache_utils import extract_cache_metrics, record_cache_metrics
+from openai_scheduler import PRIORITY_BACKGROUND, get_retry_after, get_scheduler, is_rate_limited, is_retryable
+from pipeline_timings import add_counter, instrumented, stage
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TOKENS_PER_MINUTE = 200000
+DEFAULT_CHUNK_TOKENS = 6000
+DEFAULT_SUMMARY_TOKENS = 500
+DEFAULT_MAX_RETRIES = 5
+
+# Reduce levels before the partial summaries are truncated to one chunk
+MAX_REDUCE_DEPTH = 3
+
+# Same instructions as PromptUtils::$defaultPrompts['summarize'] on the PHP side
+CONVERSATION_PROMPT = """Tu es un expert en résumé de conversations. Ta tâche est de créer un résumé concis de l'historique de conversation fourni. Concentre-toi sur :
+1. Les principaux sujets discutés
+2. Les questions clés posées
+3. Les informations importantes fournies
+4. Les décisions ou conclusions atteintes
+
+Garde ton résumé clair, précis et concentré sur les points les plus importants. Le résumé doit capturer l'essence de la conversation sans inclure de détails inutiles."""
+
+TEXT_PROMPT = """Tu es un expert en résumé de transcriptions. Résume le texte fourni de manière claire et fidèle, dans la même langue que le texte, en conservant les faits, chiffres, noms et conclusions importants."""
+
+# Étape "map": résumé d'un extrait d'un document plus long
+PARTIAL_PROMPT = """Le texte fourni est un extrait d'un document plus long. Résume cet extrait de manière fidèle et dense, dans la même langue, en conservant les faits, chiffres, noms et conclusions. Ne fais aucune introduction ni conclusion générale."""
+
+
+class AsyncRateLimiter:
+    """
+    Bound concurrent requests and tokens per minute for one asyncio run
+
+    Each request reserves its estimated tokens in a sliding one-minute
+    window; pause() blocks every new request until a deadline (used for
+    Retry-After).
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+        self.tokens_per_minute = tokens_per_minute
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._window = deque()
+        self._window_tokens = 0
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        await self._semaphore.acquire()
+        try:
+            while True:
+                async with self._lock:
+                    now = time.monotonic()
+                    while self._window and self._window[0][0] <= now - 60:
+                        self._window_tokens -= self._window.popleft()[1]
+
+                    wait = self._blocked_until - now
+                    if wait <= 0:
+                        if not self._window or self._window_tokens + tokens <= self.tokens_per_minute:
+                            self._window.append((now, tokens))
+                            self._window_tokens += tokens
+                            return
+                        wait = self._window[0][0] + 60 - now
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def release(self):
+        self._semaphore.release()
+
+    def pause(self, seconds):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class BatchSummarizer:
+    """Concurrent, rate-limited and hierarchical summarization of many items"""
+
+    def __init__(self, client, limiter, model=DEFAULT_MODEL, chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                 summary_tokens=DEFAULT_SUMMARY_TOKENS, max_retries=DEFAULT_MAX_RETRIES):
+        self.client = client
+        self.limiter = limiter
+        self.model = model
+        self.chunk_tokens = chunk_tokens
+        self.summary_tokens = summary_tokens
+        self.max_retries = max_retries
+
+    async def complete(self, messages, usage):
+        """One chat completion with rate limiting and retries; usage is accumulated in place"""
+        estimate = sum(count_tokens(m.get("content") or "", self.model) + 4 for m in messages) + self.summary_tokens
+        scheduler = get_scheduler()
+        attempt = 0
+        while True:
+            with stage("rate_limit_wait"):
+                await self.limiter.acquire(estimate)
+            try:
+                # Budgets shared with the other processes (chat keeps priority over batch jobs)
+                if scheduler is not None:
+                    with stage("rate_limit_wait"):
+                        await asyncio.to_thread(scheduler.acquire, "chat", estimate, PRIORITY_BACKGROUND)
+                with stage("openai_request"):
+                    response = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=self.summary_tokens
+                    )
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                if scheduler is not None:
+                    await asyncio.to_thread(scheduler.backoff, "chat", is_rate_limited(e))
+                delay = get_retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(30, 2 ** (attempt + 1)))
+                logging.warning(f"Summarization request failed ({e}), retrying in {delay:.1f}s")
+                add_counter("retries")
+                self.limiter.pause(delay)
+                attempt += 1
+                continue
+            finally:
+                self.limiter.release()
+
+            metrics = extract_cache_metrics(response)
+            if scheduler is not None:
+                await asyncio.to_thread(scheduler.settle, "chat", estimate, metrics.get("total_tokens"))
+            record_cache_metrics(metrics, model=self.model, context="summarization_batch")
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens"):
+                usage[key] = usage.get(key, 0) + metrics.get(key, 0)
+            usage["requests"] = usage.get("requests", 0) + 1
+            return response.choices[0].message.content.strip()
+
+    async def summarize_text(self, text, system_prompt, usage, depth=0):
+        """
+        Summarize a text, splitting it into chunks summarized in parallel when it exceeds chunk_tokens
+
+        The partial summaries are summarized again until they fit (reduce step).
+        After MAX_REDUCE_DEPTH levels, or when a level no longer shrinks the
+        text, only its first chunk is summarized (usage["truncated"]).
+        """
+        text_tokens = count_tokens(text, self.model)
+        if text_tokens <= self.chunk_tokens:
+            return await self.complete([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text}
+            ], usage)
+
+        chunks = [passage["text"] for passage in split_passages(text, self.chunk_tokens, self.model)]
+        if len(chunks) == 1 or depth >= MAX_REDUCE_DEPTH:
+            if len(chunks) > 1:
+                logging.warning(f"Summary still {text_tokens} tokens after the reduce steps, truncating to one chunk")
+                usage["truncated"] = True
+                add_counter("truncated")
+            return await self.complete([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": chunks[0]}
+            ], usage)
+
+        usage["depth"] = max(usage.get("depth", 0), depth + 1)
+        partials = await asyncio.gather(*(
+            self.complete([
+                {"role": "system", "content": PARTIAL_PROMPT},
+                {"role": "user", "content": chunk}
+            ], usage)
+            for chunk in chunks
+        ))
+        reduced = "\n\n".join(partials)
+        if count_tokens(reduced, self.model) >= text_tokens:
+            # No progress: another level would only spend more requests
+            depth = MAX_REDUCE_DEPTH
+        return await self.summarize_text(reduced, system_prompt, usage, depth + 1)
+
+    async def summarize_item(self, item):
+        """
+        Summarize one item: {"id", "messages": [...]} (conversation) or {"id", "text": ...} (transcript)
+
+        A conversation that fits in a chunk is sent as is (its own system
+        prompt, if any, is kept); longer ones are flattened and map-reduced.
+        """
+        usage = {}
+        try:
+            messages = item.get("messages")
+            if messages:
+                if messages[0].get("role") == "system":
+                    system_prompt, turns = messages[0]["content"], messages[1:]
+                else:
+                    system_prompt, turns = item.get("system_prompt") or CONVERSATION_PROMPT, messages
+
+                if sum(count_tokens(m.get("content") or "", self.model) + 4 for m in messages) <= self.chunk_tokens:
+                    summary = await self.complete([{"role": "system", "content": system_prompt}] + turns, usage)
+                else:
+                    text = "\n\n".join(f"{m.get('role')}: {m.get('content')}" for m in turns)
+                    summary = await self.summarize_text(text, system_prompt, usage)
+            else:
+                text = item.get("text") or ""
+                if not text.strip():
+                    return {"id": item.get("id"), "success": False, "error": "Nothing to summarize"}
+                summary = await self.summarize_text(text, item.get("system_prompt") or TEXT_PROMPT, usage)
+
+            return {"id": item.get("id"), "success": True, "response": summary, "usage": usage}
+        except Exception as e:
+            logging.error(f"Error summarizing item {item.get('id')}: {e}")
+            return {"id": item.get("id"), "success": False, "error": str(e), "usage": usage}
+
+
+async def summarize_batch_async(items, model=DEFAULT_MODEL, concurrency=DEFAULT_CONCURRENCY,
+                                tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                                summary_tokens=DEFAULT_SUMMARY_TOKENS, on_result=None):
+    client = create_async_client()
+    limiter = AsyncRateLimiter(concurrency, tokens_per_minute)
+    summarizer = BatchSummarizer(client, limiter, model, chunk_tokens, summary_tokens)
+
+    async def run(item):
+        result = await summarizer.summarize_item(item)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    try:
+        return await asyncio.gather(*(run(item) for item in items))
+    finally:
+        await client.close()
+
+
+@instrumented("summarize_batch")
+def summarize_batch(items, model=DEFAULT_MODEL, concurrency=None, tokens_per_minute=None,
+                    chunk_tokens=DEFAULT_CHUNK_TOKENS, summary_tokens=DEFAULT_SUMMARY_TOKENS, on_event=None):
+    """
+    Summarize many conversations or transcripts in a single bounded-concurrency job
+
+    Args:
+        items (list): {"id", "messages": [...]} or {"id", "text": str}, optionally with "system_prompt"
+        model (str): OpenAI model
+        concurrency (int, optional): Maximum simultaneous requests (SUMMARIZE_CONCURRENCY)
+        tokens_per_minute (int, optional): Token budget per minute (SUMMARIZE_TOKENS_PER_MINUTE)
+        chunk_tokens (int): Largest text sent in one request before map-reduce kicks in
+        summary_tokens (int): Maximum tokens of each summary
+        on_event (callable, optional): Receives an "item_done" event per finished item
+
+    Returns:
+        dict: {"success", "results": [...], "stats": {...}}
+    """
+    config_error = check_openai_config()
+    if config_error:
+        return config_error
+
+    # Each chunk must shrink to well under its size, or the reduce step never converges
+    if chunk_tokens <= 2 * summary_tokens:
+        return {"success": False,
+                "error": f"chunk_tokens ({chunk_tokens}) doit dépasser deux fois summary_tokens ({summary_tokens})"}
+
+    if concurrency is None:
+        concurrency = int(os.getenv("SUMMARIZE_CONCURRENCY", DEFAULT_CONCURRENCY))
+    if tokens_per_minute is None:
+        tokens_per_minute = int(os.getenv("SUMMARIZE_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE))
+
+    on_result = None
+    if on_event is not None:
+        def on_result(result):
+            on_event({"event": "item_done", "timestamp": round(time.time(), 3),
+                      "id": result.get("id"), "success": result.get("success")})
+
+    started = time.monotonic()
+    results = asyncio.run(summarize_batch_async(
+        items, model, concurrency, tokens_per_minute, chunk_tokens, summary_tokens, on_result
+    ))
+
+    succeeded = sum(1 for result in results if result["success"])
+    return {
+        "success": succeeded == len(results),
+        "results": results,
+        "stats": {
+            "items": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "requests": sum(result.get("usage", {}).get("requests", 0) for result in results),
+            "total_tokens": sum(result.get("usage", {}).get("total_tokens", 0) for result in results),
+            "duration_s": round(time.monotonic() - started, 3)
+        }
+    }
+
+
+def read_items(path):
+    """Read a JSON array or JSON lines file of items to summarize"""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    try:
+        items = json.loads(content)
+        if not isinstance(items, list):
+            items = [items]
+    except json.JSONDecodeError:
+        items = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            items[i] = item = {"text": item}
+        item.setdefault("id", i)
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Résumé par lots de conversations ou de transcriptions")
+    parser.add_argument("--input", required=True, help="Fichier JSON (tableau) ou JSON lines d'éléments à résumer")
+    parser.add_argument("--output", required=True, help="Fichier de sortie JSON")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Modèle OpenAI")
+    parser.add_argument("--concurrency", type=int, help="Nombre maximal de requêtes simultanées")
+    parser.add_argument("--tokens-per-minute", type=int, help="Budget de tokens par minute")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS, help="Taille maximale d'un extrait avant découpage")
+    args = parser.parse_args()
+
+    # Same log file as chat_api.py, whatever the working directory
+    logging.basicConfig(
+        filename=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_api.log'),
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s'
+    )
+
+    try:
+        items = read_items(args.input)
+    except Exception as e:
+        result = {"success": False, "error": f"Erreur lors de la lecture du fichier: {str(e)}"}
+        print(json.dumps(result))
+        sys.exit(1)
+
+    result = summarize_batch(items, args.model, args.concurrency, args.tokens_per_minute, args.chunk_tokens)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    print(json.dumps({key: value for key, value in result.items() if key != "results"}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Mock OpenAI Server
+Local OpenAI-compatible HTTP server for benchmarks: chat completions
+(streamed or not) and Whisper transcriptions with configurable latency,
+jitter, 429 injection and canned usage (including prompt_tokens_details).
+
+Point the scripts at it with OPENAI_BASE_URL=http://127.0.0.1:PORT/v1.
+
+Usage:
+    python benchmarks/mock_openai_server.py --port 8765 --latency-ms 200 --jitter-ms 50 --error-rate 0.05
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_TEXT = (
+    "Ceci est une transcription simulée produite par le serveur de benchmark. "
+    "Elle contient quelques phrases pour donner un volume réaliste à la réponse."
+)
+
+
+class MockSettings:
+    """Behaviour of the mock server (shared by every request thread)"""
+
+    def __init__(self, latency_ms=200.0, jitter_ms=50.0, audio_ms_per_mb=300.0, error_rate=0.0,
+                 retry_after_ms=500, cached_ratio=0.5, stream_chunks=20, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.audio_ms_per_mb = audio_ms_per_mb
+        self.error_rate = error_rate
+        self.retry_after_ms = retry_after_ms
+        self.cached_ratio = cached_ratio
+        self.stream_chunks = stream_chunks
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "rate_limited": 0, "chat": 0, "audio": 0, "bytes_received": 0}
+
+    def delay(self, extra_ms=0.0):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, self.latency_ms + jitter + extra_ms) / 1000)
+
+    def should_fail(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+
+def make_usage(prompt_tokens, completion_tokens, cached_ratio):
+    """Usage block; OpenAI caches prompts of 1024+ tokens in 128-token increments"""
+    cached = 0
+    if prompt_tokens >= 1024:
+        cached = int(prompt_tokens * cached_ratio) // 128 * 128
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached, "audio_tokens": 0},
+        "completion_tokens_details": {"reasoning_tokens": 0, "audio_tokens": 0}
+    }
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        """Read the request body, plain or chunked (streamed uploads)"""
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int(self.rfile.readline().strip().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = b"".join(parts)
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.settings.count("bytes_received", len(body))
+        return body
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_rate_limit(self):
+        self.settings.count("rate_limited")
+        self.send_json(429, {
+            "error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}
+        }, {
+            "retry-after-ms": str(self.settings.retry_after_ms),
+            "retry-after": str(max(1, round(self.settings.retry_after_ms / 1000)))
+        })
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/health", "/v1/health"):
+            self.send_json(200, {"status": "ok"})
+        elif self.path.rstrip("/") in ("/stats", "/v1/stats"):
+            with self.settings.lock:
+                self.send_json(200, dict(self.settings.counters))
+        else:
+            self.send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        body = self.read_body()
+        self.settings.count("requests")
+
+        if self.path.endswith("/chat/completions"):
+            self.settings.count("chat")
+            handler = self.handle_chat
+        elif self.path.endswith("/audio/transcriptions"):
+            self.settings.count("audio")
+            handler = self.handle_transcription
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+            return
+
+        if self.settings.should_fail():
+            self.settings.delay()
+            self.send_rate_limit()
+            return
+        handler(body)
+
+    def handle_chat(self, body):
+        request = json.loads(body or b"{}")
+        messages = request.get("messages", [])
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4 + 4 * len(messages)
+        last = (messages[-1].get("content") or "") if messages else ""
+        content = f"Réponse simulée ({len(last)} caractères reçus). " + CANNED_TEXT
+        completion_tokens = len(content) // 4
+        usage = make_usage(prompt_tokens, completion_tokens, self.settings.cached_ratio)
+        base = {"id": f"chatcmpl-mock-{random.getrandbits(32):08x}", "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"), "system_fingerprint": "mock"}
+
+        if not request.get("stream"):
+            self.settings.delay()
+            self.send_json(200, dict(base, object="chat.completion", choices=[{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "refusal": None},
+                "logprobs": None,
+                "finish_reason": "stop"
+            }], usage=usage))
+            return
+
+        # Streamed answer: first token after the latency, then evenly spaced deltas
+        self.settings.delay()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        words = content.split(" ")
+        size = max(1, len(words) // self.settings.stream_chunks)
+        pieces = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        for i, piece in enumerate(pieces):
+            chunk = dict(base, object="chat.completion.chunk", choices=[{
+                "index": 0,
+                "delta": {"role": "assistant", "content": piece} if i == 0 else {"content": piece},
+                "logprobs": None,
+                "finish_reason": "stop" if i == len(pieces) - 1 else None
+            }])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.settings.latency_ms / 1000 / max(1, len(pieces)))
+
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = dict(base, object="chat.completion.chunk", choices=[], usage=usage)
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def handle_transcription(self, body):
+        match = re.search(rb'name="response_format"\r\n\r\n([a-z_]+)', body)
+        response_format = match.group(1).decode() if match else "json"
+
+        # Processing time grows with the uploaded audio
+        self.settings.delay(len(body) / (1024 * 1024) * self.settings.audio_ms_per_mb)
+
+        if response_format == "text":
+            data = CANNED_TEXT.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        if response_format != "verbose_json":
+            self.send_json(200, {"text": CANNED_TEXT})
+            return
+
+        words = CANNED_TEXT.split()
+        self.send_json(200, {
+            "task": "transcribe",
+            "language": "french",
+            "duration": len(words) * 0.4,
+            "text": CANNED_TEXT,
+            "segments": [{
+                "id": 0, "seek": 0, "start": 0.0, "end": len(words) * 0.4, "text": " " + CANNED_TEXT,
+                "tokens": [], "temperature": 0.0, "avg_logprob": -0.2, "compression_ratio": 1.3, "no_speech_prob": 0.01
+            }],
+            "words": [{"word": word, "start": i * 0.4, "end": i * 0.4 + 0.35} for i, word in enumerate(words)]
+        })
+
+
+def create_server(settings, host="127.0.0.1", port=0):
+    """Build the server (port 0 = any free port); run it with serve_forever() in a thread"""
+    handler = type("BoundMockOpenAIHandler", (MockOpenAIHandler,), {"settings": settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur OpenAI simulé pour les benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Latence de base par requête")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Variation aléatoire de la latence (±)")
+    parser.add_argument("--audio-ms-per-mb", type=float, default=300.0, help="Latence supplémentaire par Mo d'audio reçu")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses 429")
+    parser.add_argument("--retry-after-ms", type=int, default=500, help="Délai annoncé dans les réponses 429")
+    parser.add_argument("--cached-ratio", type=float, default=0.5, help="Part des tokens de prompt annoncés comme en cache")
+    parser.add_argument("--seed", type=int, help="Graine aléatoire (résultats reproductibles)")
+    args = parser.parse_args()
+
+    settings = MockSettings(args.latency_ms, args.jitter_ms, args.audio_ms_per_mb, args.error_rate,
+                            args.retry_after_ms, args.cached_ratio, seed=args.seed)
+    server = create_server(settings, args.host, args.port)
+    print(json.dumps({"base_url": f"http://{args.host}:{server.server_address[1]}/v1"}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
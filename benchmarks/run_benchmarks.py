@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Benchmark Harness
+Measures the Python processing scripts (preprocess_audio, transcribe_audio,
+send_chat_request, paraphrase_text) against the local mock OpenAI server,
+both through direct function calls and through their CLI, and reports
+p50/p95/p99 latency, throughput, peak RSS and subprocess startup cost as JSON.
+
+No network access is needed: every OpenAI call goes to mock_openai_server.py
+through OPENAI_BASE_URL. Audio benchmarks need ffmpeg and are skipped without it.
+
+Usage:
+    python benchmarks/run_benchmarks.py --iterations 10 --output bench.json
+    python benchmarks/run_benchmarks.py --only chat,paraphrase --mode direct --latency-ms 50
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+BENCHMARKS = ["startup", "preprocess", "transcribe", "chat", "paraphrase"]
+STARTUP_MODULES = ["preprocess_audio", "transcribe", "chat_api", "paraphrase", "python_worker"]
+DEFAULT_DURATIONS = [10, 60, 300]
+
+SAMPLE_TEXT = (
+    "La réunion a commencé par un point sur le budget du trimestre. "
+    "Les dépenses de communication ont augmenté tandis que les ventes sont restées stables. "
+    "L'équipe propose de réduire les coûts d'hébergement et de reporter le recrutement prévu. "
+) * 8
+
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+
+def percentile(values, fraction):
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize_latencies(latencies_ms, wall_s, errors=0, extra=None):
+    """Latency percentiles (ms) and throughput (calls/s) of a series of calls"""
+    summary = {
+        "calls": len(latencies_ms),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies_ms, 0.50), 2) if latencies_ms else None,
+        "p95_ms": round(percentile(latencies_ms, 0.95), 2) if latencies_ms else None,
+        "p99_ms": round(percentile(latencies_ms, 0.99), 2) if latencies_ms else None,
+        "mean_ms": round(sum(latencies_ms) / len(latencies_ms), 2) if latencies_ms else None,
+        "throughput_per_s": round(len(latencies_ms) / wall_s, 3) if wall_s > 0 else None
+    }
+    summary.update(extra or {})
+    return summary
+
+
+def peak_rss_mb():
+    """Peak RSS of the current process (ru_maxrss is in KiB on Linux, bytes on macOS)"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+def run_child(command, env, cwd):
+    """
+    Run a subprocess and collect its own rusage
+
+    Returns:
+        dict: {"wall_ms", "peak_rss_mb", "user_s", "system_s", "exit_code"}
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_ms = (time.perf_counter() - started) * 1000
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "wall_ms": wall_ms,
+        "peak_rss_mb": round(usage.ru_maxrss / divisor, 2),
+        "user_s": round(usage.ru_utime, 3),
+        "system_s": round(usage.ru_stime, 3),
+        "exit_code": process.returncode
+    }
+
+
+def run_cli(command, env, cwd, iterations, output_path=None):
+    """
+    Run a script's CLI iterations times
+
+    A run fails on a non-zero exit code or when its JSON output reports
+    {"success": false} (the scripts exit 0 after writing an error result).
+    """
+    runs = []
+    for _ in range(iterations):
+        if output_path and os.path.exists(output_path):
+            os.unlink(output_path)
+        run = run_child(command, env, cwd)
+        if output_path:
+            try:
+                with open(output_path, "r", encoding="utf-8") as f:
+                    result = json.load(f)
+                if not result.get("success", True):
+                    run["error"] = result.get("error")
+            except (OSError, ValueError) as e:
+                run["error"] = f"sortie illisible: {e}"
+        runs.append(run)
+    return summarize_children(runs)
+
+
+def summarize_children(runs, extra=None):
+    """Aggregate run_child results into the report format"""
+    wall = sum(run["wall_ms"] for run in runs) / 1000
+    failures = sum(1 for run in runs if run["exit_code"] != 0 or run.get("error"))
+    errors = [run["error"] for run in runs if run.get("error")]
+    if errors:
+        extra = dict(extra or {}, first_error=errors[0])
+    return summarize_latencies([run["wall_ms"] for run in runs], wall, failures, dict({
+        "peak_rss_mb": max((run["peak_rss_mb"] for run in runs), default=None),
+        "cpu_s_per_call": round(sum(run["user_s"] + run["system_s"] for run in runs) / len(runs), 3) if runs else None
+    }, **(extra or {})))
+
+
+def time_calls(function, arguments, concurrency=1):
+    """
+    Call function(*args) for every args tuple, concurrency at a time
+
+    A call fails when it raises or returns {"success": False}.
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def run(args):
+        started = time.perf_counter()
+        try:
+            result = function(*args)
+            failed = isinstance(result, dict) and not result.get("success", True)
+            error = result.get("error") if failed else None
+        except Exception as e:
+            failed, error = True, str(e)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if failed:
+                errors.append(error)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, arguments))
+    wall = time.perf_counter() - started
+
+    extra = {"concurrency": concurrency, "peak_rss_mb": peak_rss_mb()}
+    if errors:
+        extra["first_error"] = errors[0]
+    return summarize_latencies(latencies, wall, len(errors), extra)
+
+
+def generate_audio(work_dir, durations):
+    """
+    Generate synthetic speech-band audio with ffmpeg: an uncompressed WAV (input
+    of preprocess_audio) and a 64 kbps MP3 (input of transcribe) per duration
+
+    Tones alternate with pauses so silence detection has something to find.
+    """
+    files = {}
+    for duration in durations:
+        wav = os.path.join(work_dir, f"synthetic_{duration}s.wav")
+        mp3 = os.path.join(work_dir, f"synthetic_{duration}s.mp3")
+        source = (f"sine=frequency=220:duration={duration},"
+                  f"volume='if(lt(mod(t,6),4),1,0)':eval=frame")
+        subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", source,
+                        "-ar", "44100", "-ac", "2", "-c:a", "pcm_s16le", wav], check=True)
+        subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", wav,
+                        "-ar", "16000", "-ac", "1", "-b:a", "64k", mp3], check=True)
+        files[duration] = {"wav": wav, "mp3": mp3, "wav_mb": round(os.path.getsize(wav) / (1024 * 1024), 2)}
+    return files
+
+
+def bench_startup(env, iterations, work_dir):
+    """Interpreter start-up and per-module import cost, each in a fresh subprocess"""
+    # Imported from work_dir: import-time log files (python_api.log) stay out of the repository
+    env = dict(env, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, env.get("PYTHONPATH")])))
+    baseline = summarize_children([run_child([sys.executable, "-c", "pass"], env, work_dir) for _ in range(iterations)])
+    results = {"interpreter": baseline}
+    for module in STARTUP_MODULES:
+        summary = summarize_children([
+            run_child([sys.executable, "-c", f"import {module}"], env, work_dir) for _ in range(iterations)
+        ])
+        summary["import_overhead_ms"] = round(summary["p50_ms"] - baseline["p50_ms"], 2)
+        results[module] = summary
+    return results
+
+
+def bench_preprocess(env, iterations, audio, work_dir, modes):
+    from preprocess_audio import preprocess_audio
+
+    results = {}
+    for duration, files in audio.items():
+        output_dir = os.path.join(work_dir, f"preprocessed_{duration}")
+        os.makedirs(output_dir, exist_ok=True)
+        entry = {"input_mb": files["wav_mb"]}
+        if "direct" in modes:
+            entry["direct"] = time_calls(preprocess_audio, [(files["wav"], output_dir)] * iterations)
+        if "cli" in modes:
+            command = [sys.executable, os.path.join(ROOT_DIR, "preprocess_audio.py"), "--file", files["wav"],
+                       "--output_dir", output_dir]
+            entry["cli"] = run_cli(command, env, work_dir, iterations)
+        for result in entry.values():
+            if isinstance(result, dict) and result.get("p50_ms"):
+                result["audio_s_per_s"] = round(duration / (result["p50_ms"] / 1000), 2)
+        results[f"{duration}s"] = entry
+    return results
+
+
+def bench_transcribe(env, iterations, audio, work_dir, modes, concurrency):
+    from transcribe import transcribe_audio
+
+    results = {}
+    for duration, files in audio.items():
+        entry = {}
+        if "direct" in modes:
+            entry["direct"] = time_calls(
+                lambda path: transcribe_audio(path, language="fr", use_cache=False),
+                [(files["mp3"],)] * iterations, concurrency
+            )
+        if "cli" in modes:
+            output = os.path.join(work_dir, f"transcription_{duration}.json")
+            command = [sys.executable, os.path.join(ROOT_DIR, "transcribe.py"), "--file", files["mp3"],
+                       "--language", "fr", "--no-cache", "--output", output]
+            entry["cli"] = run_cli(command, env, work_dir, iterations, output)
+        for result in entry.values():
+            if result.get("p50_ms"):
+                result["audio_s_per_s"] = round(duration / (result["p50_ms"] / 1000), 2)
+        results[f"{duration}s"] = entry
+    return results
+
+
+def bench_chat(env, iterations, work_dir, modes, concurrency):
+    import chat_api
+
+    messages = [
+        {"role": "system", "content": "Tu es un assistant qui répond aux questions sur une transcription.\n\n" + SAMPLE_TEXT * 4},
+        {"role": "user", "content": "Quelles économies l'équipe propose-t-elle ?"}
+    ]
+    results = {}
+    if "direct" in modes:
+        chat_api.setup_api_key()
+        results["direct"] = time_calls(chat_api.send_chat_request, [(messages,)] * iterations, concurrency)
+        results["direct_stream"] = time_calls(
+            lambda m: chat_api.send_chat_request(m, on_event=lambda event: None),
+            [(messages,)] * iterations, concurrency
+        )
+    if "cli" in modes:
+        message_file = os.path.join(work_dir, "chat_message.txt")
+        context_file = os.path.join(work_dir, "chat_context.json")
+        with open(message_file, "w", encoding="utf-8") as f:
+            f.write(messages[-1]["content"])
+        with open(context_file, "w", encoding="utf-8") as f:
+            json.dump({"messages": messages[1:], "transcription": SAMPLE_TEXT * 4,
+                       "system_prompt": "Tu es un assistant qui répond aux questions sur une transcription."}, f)
+        output = os.path.join(work_dir, "chat_output.json")
+        command = [sys.executable, os.path.join(ROOT_DIR, "chat_api.py"), "--message", message_file,
+                   "--context", context_file, "--output", output]
+        # chat_api.py logs to python_api.log in its working directory
+        results["cli"] = run_cli(command, env, work_dir, iterations, output)
+    return results
+
+
+def bench_paraphrase(env, iterations, work_dir, modes, concurrency):
+    from paraphrase import paraphrase_text
+
+    long_text = "\n\n".join([SAMPLE_TEXT] * 12)
+    results = {}
+    if "direct" in modes:
+        results["direct_short"] = time_calls(paraphrase_text, [(SAMPLE_TEXT,)] * iterations, concurrency)
+        results["direct_long"] = time_calls(paraphrase_text, [(long_text,)] * iterations, concurrency)
+    if "cli" in modes:
+        text_file = os.path.join(work_dir, "paraphrase_input.txt")
+        with open(text_file, "w", encoding="utf-8") as f:
+            f.write(SAMPLE_TEXT)
+        output = os.path.join(work_dir, "paraphrase_output.json")
+        command = [sys.executable, os.path.join(ROOT_DIR, "paraphrase.py"), "--file", text_file, "--output", output]
+        results["cli"] = run_cli(command, env, work_dir, iterations, output)
+    return results
+
+
+def build_environment(base_url, work_dir, use_scheduler):
+    """Environment of the benchmarked code: mock server, no worker, caches off or in work_dir"""
+    env = {
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_ORG_ID": "org-bench",
+        "PYTHON_WORKER_DISABLED": "1",
+        "TRANSCRIPTION_CACHE_DISABLED": "1",
+        "CHAT_RESPONSE_CACHE_DISABLED": "1",
+        "CACHE_METRICS_DISABLED": "1",
+        "TRANSLATION_MEMORY_DISABLED": "1",
+        # Synthetic jobs must not end up in the production logs/pipeline_timings.jsonl
+        "PIPELINE_TIMINGS_PATH": os.path.join(work_dir, "pipeline_timings.jsonl"),
+        "TRANSCRIPT_INDEX_PATH": os.path.join(work_dir, "transcript_index"),
+        "OPENAI_SCHEDULER_PATH": os.path.join(work_dir, "openai_scheduler.db"),
+        # Budgets far above the benchmark load: only injected 429s slow calls down
+        "OPENAI_CHAT_RPM": "100000",
+        "OPENAI_CHAT_TPM": "100000000",
+        "OPENAI_AUDIO_RPM": "100000"
+    }
+    if not use_scheduler:
+        env["OPENAI_SCHEDULER_DISABLED"] = "1"
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks des scripts Python contre un serveur OpenAI simulé")
+    parser.add_argument("--only", help=f"Benchmarks à lancer, séparés par des virgules (parmi: {', '.join(BENCHMARKS)})")
+    parser.add_argument("--mode", choices=["direct", "cli", "both"], default="both", help="Appels de fonction, CLI ou les deux")
+    parser.add_argument("--iterations", type=int, default=5, help="Nombre de mesures par cas")
+    parser.add_argument("--concurrency", type=int, default=1, help="Appels directs simultanés (transcription, chat, paraphrase)")
+    parser.add_argument("--durations", default=",".join(map(str, DEFAULT_DURATIONS)), help="Durées de l'audio synthétique en secondes")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Latence simulée de l'API")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Variation de la latence simulée (±)")
+    parser.add_argument("--audio-ms-per-mb", type=float, default=300.0, help="Latence supplémentaire par Mo d'audio envoyé")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses 429 injectées")
+    parser.add_argument("--cached-ratio", type=float, default=0.5, help="Part des tokens de prompt annoncés comme en cache")
+    parser.add_argument("--no-scheduler", action="store_true", help="Désactive openai_scheduler (les retries reviennent au SDK)")
+    parser.add_argument("--seed", type=int, default=42, help="Graine aléatoire du serveur simulé")
+    parser.add_argument("--keep", action="store_true", help="Conserve le répertoire de travail (audio généré, sorties)")
+    parser.add_argument("--output", help="Fichier du rapport JSON (par défaut: sortie standard)")
+    args = parser.parse_args()
+
+    selected = args.only.split(",") if args.only else BENCHMARKS
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"benchmarks inconnus: {', '.join(sorted(unknown))}")
+    modes = ["direct", "cli"] if args.mode == "both" else [args.mode]
+
+    from mock_openai_server import MockSettings, create_server
+
+    settings = MockSettings(args.latency_ms, args.jitter_ms, args.audio_ms_per_mb, args.error_rate,
+                            cached_ratio=args.cached_ratio, seed=args.seed)
+    server = create_server(settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    bench_env = build_environment(base_url, work_dir, not args.no_scheduler)
+    # Direct calls run in this process: same configuration as the subprocesses
+    os.environ.update(bench_env)
+    env = dict(os.environ)
+    # Relative log files of the scripts (python_api.log) land in the work directory
+    os.chdir(work_dir)
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "modes": modes,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "audio_ms_per_mb": args.audio_ms_per_mb,
+            "error_rate": args.error_rate,
+            "cached_ratio": args.cached_ratio,
+            "scheduler": not args.no_scheduler
+        },
+        "results": {},
+        "skipped": {}
+    }
+
+    audio = {}
+    if {"preprocess", "transcribe"} & set(selected):
+        if shutil.which("ffmpeg"):
+            audio = generate_audio(work_dir, [int(d) for d in args.durations.split(",") if d])
+        else:
+            for name in ("preprocess", "transcribe"):
+                if name in selected:
+                    report["skipped"][name] = "ffmpeg introuvable"
+
+    runners = {
+        "startup": lambda: bench_startup(env, args.iterations, work_dir),
+        "preprocess": lambda: bench_preprocess(env, args.iterations, audio, work_dir, modes),
+        "transcribe": lambda: bench_transcribe(env, args.iterations, audio, work_dir, modes, args.concurrency),
+        "chat": lambda: bench_chat(env, args.iterations, work_dir, modes, args.concurrency),
+        "paraphrase": lambda: bench_paraphrase(env, args.iterations, work_dir, modes, args.concurrency)
+    }
+
+    try:
+        for name in selected:
+            if name in report["skipped"]:
+                continue
+            print(f"[bench] {name}...", file=sys.stderr, flush=True)
+            try:
+                report["results"][name] = runners[name]()
+            except ImportError as e:
+                report["skipped"][name] = f"dépendance manquante: {e}"
+    finally:
+        with settings.lock:
+            report["mock_server"] = dict(settings.counters)
+        report["peak_rss_mb"] = peak_rss_mb()
+        server.shutdown()
+        os.chdir(ROOT_DIR)
+        if args.keep:
+            report["work_dir"] = work_dir
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,16 @@ import os
 import sys
 import json
 import argparse
-import openai
 import logging
-from datetime import datetime
-from openai_cache_utils import extract_cache_metrics, log_cache_performance
+import time
+from chat_context import build_context
+from chat_response_cache import cached_response_metrics, get_chat_response_cache, make_scope
+from transcript_index import needs_retrieval, retrieve_passages
+from openai_cache_utils import extract_cache_metrics, log_cache_performance, record_cache_metrics
+from python_worker import call_worker, JsonLinesWriter
+from openai_client import check_openai_config, get_client
+from openai_scheduler import PRIORITY_DEFAULT, PRIORITY_INTERACTIVE, estimate_chat_tokens, get_scheduler, run_scheduled
+from pipeline_timings import current, instrumented, stage
 
 # Setup logging
 logging.basicConfig(
@@ -21,77 +27,138 @@ logging.basicConfig(
 )
 
 def setup_api_key():
-    """Get OpenAI API key and organization ID from environment"""
-    # Try to get from config file first
-    try:
-        config_path = os.path.join(os.path.dirname(__file__), 'config.php')
-        with open(config_path, 'r') as f:
-            config_content = f.read()
-            # Extract API key and org ID using pattern match
-            import re
-            api_match = re.search(r"define\('OPENAI_API_KEY',\s*'([^']+)'\)", config_content)
-            org_match = re.search(r"define\('OPENAI_ORG_ID',\s*'([^']+)'\)", config_content)
-            
-            if api_match:
-                api_key = api_match.group(1)
-                openai.api_key = api_key
-                
-                # Set organization ID if found
-                if org_match:
-                    org_id = org_match.group(1)
-                    openai.organization = org_id
-                    logging.info(f"Using OpenAI Organization ID: {org_id}")
-                
-                return True
-    except Exception as e:
-        logging.error(f"Error reading config file: {e}")
+    """
+    Check that the OpenAI SDK and API key are available
+
+    The credentials are resolved once from the environment (.env, also read by
+    config.php); the SDK itself is only imported when a request is sent.
+    """
+    config_error = check_openai_config()
+    if config_error:
+        logging.error(config_error["error"])
+        return False
+    return True
+
+def write_result(result, output_file):
+    """Write a result for PHP, with the timings of the job so far"""
+    timings = current()
+    if timings is not None:
+        result["timings"] = timings.to_dict()
+    with open(output_file, 'w') as f:
+        json.dump(result, f)
+
+def emit_event(on_event, event, **fields):
+    """Send a timestamped streaming event (if a receiver is given)"""
+    if on_event is not None:
+        on_event(dict(event=event, timestamp=round(time.time(), 3), **fields))
+
+def stream_chat_completion(messages, model, on_event):
+    """
+    Stream a chat completion, emitting each content delta as it arrives
+
+    Returns:
+        tuple: (full content, usage dict, finish reason, time to first token in ms)
+    """
+    started = time.monotonic()
+    first_token_ms = None
+    parts = []
+    usage = {}
+    finish_reason = None
     
-    # Fallback to environment variable
-    api_key = os.environ.get('OPENAI_API_KEY')
-    org_id = os.environ.get('OPENAI_ORG_ID')
+    emit_event(on_event, "started", model=model)
+    tokens = estimate_chat_tokens(messages, 1000, model)
+    stream = run_scheduled(
+        lambda: get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True,
+            stream_options={"include_usage": True}
+        ),
+        tokens=tokens,
+        priority=PRIORITY_INTERACTIVE
+    )
+    for chunk in stream:
+        # The last chunk carries the usage and no choices
+        if getattr(chunk, 'usage', None):
+            usage = chunk.usage.model_dump() if hasattr(chunk.usage, 'model_dump') else dict(chunk.usage)
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+        content = choice.delta.content if choice.delta else None
+        if content:
+            if first_token_ms is None:
+                first_token_ms = round((time.monotonic() - started) * 1000)
+            parts.append(content)
+            emit_event(on_event, "delta", content=content)
     
-    if api_key:
-        openai.api_key = api_key
-        if org_id:
-            openai.organization = org_id
-            logging.info(f"Using OpenAI Organization ID from env: {org_id}")
-        return True
+    # The usage is only known once the stream is consumed: correct the reservation now
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        scheduler.settle("chat", tokens, usage.get("total_tokens"))
     
-    logging.error("No API key found")
-    return False
+    return "".join(parts), usage, finish_reason, first_token_ms
 
-def send_chat_request(messages, model="gpt-4o-mini"):
-    """Send a request to OpenAI chat API with cache metrics tracking"""
+@instrumented("chat_request")
+def send_chat_request(messages, model="gpt-4o-mini", context="chat", on_event=None):
+    """
+    Send a request to OpenAI chat API with cache metrics tracking
+    
+    When on_event is given the completion is streamed: every content delta is
+    emitted as a "delta" event and a final "done" event carries the usage.
+    """
     try:
         logging.info(f"Sending chat request with {len(messages)} messages")
-        response = openai.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1000
-        )
-        
-        # Extract cache metrics using utility function
-        cache_metrics = extract_cache_metrics(response)
+        with stage("openai_request"):
+            if on_event is None:
+                response = run_scheduled(
+                    lambda: get_client().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=0.7,
+                        max_tokens=1000
+                    ),
+                    tokens=estimate_chat_tokens(messages, 1000, model),
+                    priority=PRIORITY_INTERACTIVE if context == "chat" else PRIORITY_DEFAULT
+                )
+                content = response.choices[0].message.content
+            
+                # Extract cache metrics using utility function
+                cache_metrics = extract_cache_metrics(response)
+                first_token_ms = None
+            else:
+                content, usage, finish_reason, first_token_ms = stream_chat_completion(messages, model, on_event)
+                cache_metrics = extract_cache_metrics({"usage": usage})
+                emit_event(on_event, "done", finish_reason=finish_reason, usage=cache_metrics,
+                           time_to_first_token_ms=first_token_ms)
         
         # Log cache performance
         log_cache_performance(cache_metrics, context=f"model={model}")
+        record_cache_metrics(cache_metrics, model=model, context=context)
         
-        return {
+        result = {
             "success": True,
-            "response": response.choices[0].message.content,
+            "response": content,
             "usage": cache_metrics,
             "model": model
         }
+        if first_token_ms is not None:
+            result["time_to_first_token_ms"] = first_token_ms
+        return result
     except Exception as e:
         logging.error(f"Error in OpenAI API request: {e}")
+        emit_event(on_event, "error", error=str(e))
         return {
             "success": False,
             "error": str(e)
         }
 
-def process_chat(message_file, context_file, output_file, model="gpt-4o-mini"):
-    """Process chat request using provided message and context"""
+@instrumented("chat")
+def process_chat(message_file, context_file, output_file, model="gpt-4o-mini", on_event=None):
+    """Process chat request using provided message and context (streamed when on_event is given)"""
     try:
         # Read user message
         with open(message_file, 'r') as f:
@@ -103,14 +170,61 @@ def process_chat(message_file, context_file, output_file, model="gpt-4o-mini"):
             messages = context_data.get('messages', [])
             transcription = context_data.get('transcription', '')
         
-        logging.info(f"Processing chat: message={message[:30]}..., context size={len(messages)}")
+        # The current message is normally already the last turn of the context
+        if message and not (messages and messages[-1].get('role') == 'user' and messages[-1].get('content', '').strip() == message):
+            messages = messages + [{"role": "user", "content": message}]
+        
+        # Answer repeated (or reworded) questions from the response cache
+        response_cache = get_chat_response_cache()
+        question = messages[-1].get('content', '') if messages else message
+        scope = make_scope(messages, model, context_data.get('system_prompt'), transcription)
+        if response_cache is not None:
+            with stage("response_cache"):
+                cached, match = response_cache.get(scope, question)
+            if cached is not None:
+                logging.info(f"Chat response cache hit ({match['match']}, similarity={match['similarity']})")
+                result = {
+                    "success": True,
+                    "response": cached["response"],
+                    "usage": cached_response_metrics(match),
+                    "model": model,
+                    "from_cache": True
+                }
+                emit_event(on_event, "delta", content=result["response"])
+                emit_event(on_event, "done", finish_reason="cache", usage=result["usage"])
+                write_result(result, output_file)
+                return result
+        
+        # Long transcriptions: send only the passages relevant to the question
+        excerpts = None
+        with stage("retrieval"):
+            if needs_retrieval(transcription, model):
+                query = " ".join(m.get('content', '') for m in messages[-3:] if m.get('role') == 'user')
+                excerpts = retrieve_passages(transcription, query)
+                transcription = ""
+        
+        # Fit the conversation in the token budget behind a stable, cacheable prefix
+        with stage("context_build"):
+            messages, context_tokens = build_context(
+                messages,
+                transcription=transcription,
+                system_prompt=context_data.get('system_prompt'),
+                model=model,
+                max_tokens=context_data.get('max_context_tokens'),
+                excerpts=excerpts
+            )
+        
+        logging.info(f"Processing chat: message={message[:30]}..., context size={len(messages)}, tokens={context_tokens['total']}")
         
         # Send request to OpenAI
-        result = send_chat_request(messages, model)
+        result = send_chat_request(messages, model, on_event=on_event)
+        result["context_tokens"] = context_tokens
+        
+        if response_cache is not None and result.get("success"):
+            response_cache.set(scope, question, {"response": result["response"]})
         
         # Write result to output file
-        with open(output_file, 'w') as f:
-            json.dump(result, f)
+        write_result(result, output_file)
         
         return result
     except Exception as e:
@@ -119,10 +233,10 @@ def process_chat(message_file, context_file, output_file, model="gpt-4o-mini"):
             "success": False,
             "error": str(e)
         }
-        with open(output_file, 'w') as f:
-            json.dump(result, f)
+        write_result(result, output_file)
         return result
 
+@instrumented("summarization")
 def process_summarization(context_file, output_file, model="gpt-4o-mini"):
     """Summarize conversation messages"""
     try:
@@ -134,11 +248,10 @@ def process_summarization(context_file, output_file, model="gpt-4o-mini"):
         logging.info(f"Processing summarization: context size={len(messages)}")
         
         # Send request to OpenAI
-        result = send_chat_request(messages, model)
+        result = send_chat_request(messages, model, context="summarization")
         
         # Write result to output file
-        with open(output_file, 'w') as f:
-            json.dump(result, f)
+        write_result(result, output_file)
         
         return result
     except Exception as e:
@@ -147,10 +260,59 @@ def process_summarization(context_file, output_file, model="gpt-4o-mini"):
             "success": False,
             "error": str(e)
         }
-        with open(output_file, 'w') as f:
-            json.dump(result, f)
+        write_result(result, output_file)
         return result
 
+def run_locally(args, summarize, on_event=None):
+    """Process the request in this process (no worker available)"""
+    # Setup API key
+    if not setup_api_key():
+        result = {
+            "success": False,
+            "error": "No API key available"
+        }
+        with open(args.output, 'w') as f:
+            json.dump(result, f)
+        return None
+    
+    # Process based on mode
+    if summarize:
+        return process_summarization(args.context, args.output, args.model)
+    
+    # Validate required args for chat
+    if not args.message:
+        result = {
+            "success": False,
+            "error": "Message file is required for chat mode"
+        }
+        with open(args.output, 'w') as f:
+            json.dump(result, f)
+        return None
+        
+    return process_chat(args.message, args.context, args.output, args.model, on_event=on_event)
+
+def run_batch_summarization(args):
+    """Summarize every item of the context file in one bounded-concurrency job"""
+    from batch_summarize import read_items, summarize_batch
+    
+    try:
+        items = read_items(args.context)
+    except Exception as e:
+        result = {"success": False, "error": f"Invalid batch file: {e}"}
+    else:
+        params = {"items": items, "model": args.model}
+        result = call_worker("summarize_batch", params)
+        if result is None:
+            result = summarize_batch(**params)
+    
+    with open(args.output, 'w') as f:
+        json.dump(result, f)
+    
+    if result.get("success"):
+        logging.info(f"Batch summarization completed: {result['stats']}")
+    else:
+        logging.error(f"Batch summarization failed: {result.get('error') or result.get('stats')}")
+
 def main():
     """Main function to parse arguments and process requests"""
     parser = argparse.ArgumentParser(description='Chat API for Intelligent Transcription')
@@ -159,34 +321,50 @@ def main():
     parser.add_argument('--output', type=str, required=True, help='Path to output file')
     parser.add_argument('--model', type=str, default="gpt-4o-mini", help='OpenAI model to use')
     parser.add_argument('--summarize', type=str, default="false", help='Set to "true" for summarization mode')
+    parser.add_argument('--batch', action='store_true', help='Summarize mode: the context file holds many conversations or texts (see batch_summarize.py)')
+    parser.add_argument('--stream', action='store_true', help='Write chat deltas as JSON lines on stdout as they arrive')
+    parser.add_argument('--stream-file', type=str, help='File or FIFO receiving the chat deltas as JSON lines')
     
     args = parser.parse_args()
     
-    # Setup API key
-    if not setup_api_key():
-        result = {
-            "success": False,
-            "error": "No API key available"
-        }
-        with open(args.output, 'w') as f:
-            json.dump(result, f)
-        return
+    # Streaming destination for the chat deltas (the final result still goes to --output)
+    stream_file = None
+    on_event = None
+    if args.stream_file:
+        stream_file = open(args.stream_file, 'a', encoding='utf-8')
+        on_event = JsonLinesWriter(stream_file)
+    elif args.stream:
+        on_event = JsonLinesWriter(sys.stdout)
     
-    # Process based on mode
-    if args.summarize.lower() == "true":
-        result = process_summarization(args.context, args.output, args.model)
+    # Forward the request to the persistent worker when it is running
+    summarize = args.summarize.lower() == "true"
+    if summarize and args.batch:
+        run_batch_summarization(args)
+        return
+    if summarize:
+        result = call_worker("process_summarization", {
+            "context_file": os.path.abspath(args.context),
+            "output_file": os.path.abspath(args.output),
+            "model": args.model
+        })
+    elif args.message:
+        result = call_worker("process_chat", {
+            "message_file": os.path.abspath(args.message),
+            "context_file": os.path.abspath(args.context),
+            "output_file": os.path.abspath(args.output),
+            "model": args.model
+        }, on_event=on_event)
     else:
-        # Validate required args for chat
-        if not args.message:
-            result = {
-                "success": False,
-                "error": "Message file is required for chat mode"
-            }
-            with open(args.output, 'w') as f:
-                json.dump(result, f)
-            return
-            
-        result = process_chat(args.message, args.context, args.output, args.model)
+        result = None
+    
+    try:
+        if result is None:
+            result = run_locally(args, summarize, on_event)
+    finally:
+        if stream_file:
+            stream_file.close()
+    if result is None:
+        return
     
     # Log completion and status
     if result.get("success"):
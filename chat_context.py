@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Chat Context Assembly
+Builds the messages sent to the chat API within a token budget: a stable,
+cacheable prefix (system prompt + transcription) followed by the most recent
+conversation turns, with the older middle of the history condensed.
+"""
+
+import os
+import functools
+
+DEFAULT_MAX_CONTEXT_TOKENS = 16000
+DEFAULT_RESPONSE_TOKENS = 1000
+DEFAULT_SUMMARY_TOKENS = 500
+
+# Tokens added by the chat format (see OpenAI's counting guide)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+TRANSCRIPTION_HEADER = "\n\n## Transcription Content\n\n"
+SUMMARY_HEADER = "Previous conversation summary:\n\n"
+EXCERPTS_HEADER = "## Relevant Transcription Excerpts\n\n"
+
+
+@functools.lru_cache(maxsize=8)
+def get_encoding(model):
+    """Return the tiktoken encoding for a model, or None when tiktoken is unavailable"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """
+    Count the tokens of a text
+
+    Uses the model's tokenizer when tiktoken is installed, otherwise falls back
+    to the characters/4 estimate used on the PHP side.
+    """
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message, model="gpt-4o-mini"):
+    """Count the tokens of one chat message, formatting overhead included"""
+    return TOKENS_PER_MESSAGE + count_tokens(message.get("role", ""), model) + count_tokens(message.get("content") or "", model)
+
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4o-mini"):
+    """Cut a text to at most max_tokens tokens (deterministic, so the result stays cacheable)"""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def summarize_messages(messages, max_tokens=DEFAULT_SUMMARY_TOKENS, model="gpt-4o-mini"):
+    """
+    Condense dropped turns into one extractive summary within max_tokens
+
+    Every turn keeps an equal share of the budget so the whole span stays
+    represented; no extra API call is made.
+    """
+    if not messages:
+        return ""
+    share = max(8, (max_tokens - count_tokens(SUMMARY_HEADER, model)) // len(messages) - 4)
+    lines = []
+    for message in messages:
+        role = "User" if message.get("role") == "user" else "Assistant"
+        content = " ".join((message.get("content") or "").split())
+        excerpt = truncate_to_tokens(content, share, model)
+        if excerpt != content:
+            excerpt += "..."
+        lines.append(f"- {role}: {excerpt}")
+    return truncate_to_tokens(SUMMARY_HEADER + "\n".join(lines), max_tokens, model)
+
+
+def build_context(messages, transcription="", system_prompt=None, model="gpt-4o-mini",
+                  max_tokens=None, response_tokens=DEFAULT_RESPONSE_TOKENS,
+                  summary_tokens=DEFAULT_SUMMARY_TOKENS, history_tokens=None, excerpts=None):
+    """
+    Assemble the chat messages within a token budget
+
+    The prefix (system prompt + transcription) depends only on its inputs and
+    the budget, never on the history, so it stays byte-identical across turns
+    and OpenAI prompt caching can reuse it. When the history does not fit, the
+    oldest turns are condensed into a summary message placed after the prefix
+    and the newest turns are kept verbatim (the latest one always).
+
+    Args:
+        messages (list): Conversation turns; a leading system message is used as
+            the system prompt when system_prompt is not given
+        transcription (str): Transcription text appended to the system prompt
+        system_prompt (str, optional): Static system prompt
+        model (str): Model whose tokenizer is used
+        max_tokens (int, optional): Context budget (CHAT_CONTEXT_MAX_TOKENS by default)
+        response_tokens (int): Tokens reserved for the answer
+        summary_tokens (int): Budget of the summary message
+        history_tokens (int, optional): Tokens kept free of transcription for the
+            conversation (a quarter of the budget by default)
+        excerpts (list, optional): Retrieved transcription passages ({"text": ...}, see
+            transcript_index), sent after the prefix instead of the full transcription
+
+    Returns:
+        tuple: (messages, token report per section)
+    """
+    if max_tokens is None:
+        max_tokens = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", DEFAULT_MAX_CONTEXT_TOKENS))
+    budget = max_tokens - response_tokens - TOKENS_PER_REPLY
+    if history_tokens is None:
+        history_tokens = budget // 4
+
+    history = list(messages or [])
+    if system_prompt is None and history and history[0].get("role") == "system":
+        system_prompt = history.pop(0).get("content") or ""
+
+    # Stable prefix; the transcription is truncated only when it alone exceeds its share
+    prefix_content = system_prompt or ""
+    if transcription:
+        overhead = count_message_tokens({"role": "system", "content": prefix_content + TRANSCRIPTION_HEADER}, model)
+        room = budget - overhead - history_tokens
+        prefix_content += TRANSCRIPTION_HEADER + truncate_to_tokens(transcription, room, model)
+    prefix = [{"role": "system", "content": prefix_content}] if prefix_content else []
+    prefix_tokens = sum(count_message_tokens(m, model) for m in prefix)
+
+    # Retrieved passages change with the question, so they come after the cached prefix
+    retrieved = []
+    if excerpts:
+        content = EXCERPTS_HEADER + "\n\n".join(f"[{i + 1}] {passage['text']}" for i, passage in enumerate(excerpts))
+        retrieved = [{"role": "system", "content": truncate_to_tokens(content, budget - prefix_tokens - history_tokens, model)}]
+    excerpts_used = sum(count_message_tokens(m, model) for m in retrieved)
+
+    turn_tokens = [count_message_tokens(m, model) for m in history]
+    available = budget - prefix_tokens - excerpts_used
+    summary = []
+    summary_used = 0
+
+    if sum(turn_tokens) <= available:
+        kept = len(history)
+        used = sum(turn_tokens)
+    else:
+        # Newest turns first, leaving room for the summary of the older ones
+        kept = 0
+        used = 0
+        for tokens in reversed(turn_tokens):
+            if kept and used + tokens > available - summary_tokens:
+                break
+            used += tokens
+            kept += 1
+
+        room = min(summary_tokens, available - used)
+        if kept < len(history) and room > TOKENS_PER_MESSAGE + 8:
+            content = summarize_messages(history[:len(history) - kept], room - TOKENS_PER_MESSAGE - 2, model)
+            summary = [{"role": "system", "content": content}]
+            summary_used = count_message_tokens(summary[0], model)
+
+    recent = history[len(history) - kept:]
+    report = {
+        "prefix": prefix_tokens,
+        "excerpts": excerpts_used,
+        "summary": summary_used,
+        "history": used,
+        "total": prefix_tokens + excerpts_used + summary_used + used + TOKENS_PER_REPLY,
+        "budget": max_tokens,
+        "reserved_for_response": response_tokens,
+        "messages_kept": len(recent),
+        "messages_summarized": len(history) - len(recent),
+        "exact": get_encoding(model) is not None
+    }
+    return prefix + retrieved + summary + recent, report
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Chat Response Cache
+Stores chat answers per conversation scope (system prompt, transcription,
+model and previous turns) and normalised question, with near-duplicate
+matching of reworded questions through MinHash signatures, a TTL and
+size-bounded LRU eviction.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+import unicodedata
+from contextlib import contextmanager
+
+from openai_client import load_environment
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "chat_response_cache.db")
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_SIMILARITY = 0.9
+
+MINHASH_PERMUTATIONS = 64
+_MERSENNE_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], "big") % (_MERSENNE_PRIME - 1) + 1,
+     int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], "big") % _MERSENNE_PRIME)
+    for i in range(MINHASH_PERMUTATIONS)
+]
+
+
+_WORD_RE = re.compile(r"\w+")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def normalize_question(question):
+    """
+    Lowercase, accent-free words without punctuation
+
+    Every word is kept: negations and question words ("not", "pas", "who",
+    "qui") change the answer, so unlike the BM25 tokenizer no stopword is dropped.
+    """
+    text = unicodedata.normalize("NFKD", (question or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_WORD_RE.findall(text))
+
+
+def make_scope(messages, model, system_prompt="", transcription=""):
+    """
+    Identify the context a question is asked in
+
+    Two questions can share an answer only if the model, system prompt,
+    transcription and previous turns are the same; first questions about a
+    transcription are therefore shared between users.
+
+    Args:
+        messages (list): Conversation turns, the question last
+        model (str): Model answering
+        system_prompt (str): Static system prompt
+        transcription (str): Transcription text
+    """
+    previous = [[m.get("role"), m.get("content")] for m in messages[:-1]]
+    material = json.dumps([model, system_prompt or "", transcription or "", previous], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def minhash(text, shingle_size=3):
+    """MinHash signature over the character shingles of a normalised question"""
+    text = f" {text} "
+    shingles = {text[i:i + shingle_size] for i in range(max(1, len(text) - shingle_size + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+
+class ChatResponseCache:
+    """SQLite cache of chat answers with TTL, LRU eviction and near-duplicate lookup"""
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS, similarity_threshold=DEFAULT_SIMILARITY):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    signature TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_response_cache_scope ON chat_response_cache(scope)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_response_cache_access ON chat_response_cache(last_access)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_response_cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _increment(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO chat_response_cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    @staticmethod
+    def _key(scope, question):
+        return hashlib.sha256(f"{scope}\n{question}".encode("utf-8")).hexdigest()
+
+    def get(self, scope, question):
+        """
+        Look up an answer for a question asked in a scope
+
+        Returns:
+            tuple: (cached result or None, match details {"match": "exact"|"similar", "similarity": float})
+        """
+        normalized = normalize_question(question)
+        now = time.time()
+
+        with self._lock, self._connect() as conn:
+            expired = conn.execute(
+                "DELETE FROM chat_response_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+            if expired:
+                self._increment(conn, "expired", expired)
+
+            cache_key = self._key(scope, normalized)
+            row = conn.execute(
+                "SELECT cache_key, result FROM chat_response_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            match = {"match": "exact", "similarity": 1.0}
+
+            if row is None and normalized and self.similarity_threshold < 1:
+                signature = minhash(normalized)
+                numbers = _NUMBER_RE.findall(normalized)
+                best = None
+                for candidate_key, candidate_question, candidate_signature, result in conn.execute(
+                    "SELECT cache_key, question, signature, result FROM chat_response_cache WHERE scope = ?", (scope,)
+                ):
+                    # A different year or figure asks for a different answer
+                    if _NUMBER_RE.findall(candidate_question) != numbers:
+                        continue
+                    score = similarity(signature, json.loads(candidate_signature))
+                    if score >= self.similarity_threshold and (best is None or score > best[0]):
+                        best = (score, candidate_key, result)
+                if best:
+                    row = (best[1], best[2])
+                    match = {"match": "similar", "similarity": round(best[0], 3)}
+
+            if row is None:
+                self._increment(conn, "misses")
+                return None, None
+
+            conn.execute(
+                "UPDATE chat_response_cache SET last_access = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (now, row[0])
+            )
+            self._increment(conn, f"hits_{match['match']}")
+            return json.loads(row[1]), match
+
+    def set(self, scope, question, result):
+        """Store an answer then evict the least recently used entries beyond max_entries"""
+        normalized = normalize_question(question)
+        now = time.time()
+
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chat_response_cache "
+                "(cache_key, scope, question, signature, result, created_at, last_access, hit_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (self._key(scope, normalized), scope, normalized, json.dumps(minhash(normalized)),
+                 json.dumps(result, ensure_ascii=False), now, now)
+            )
+            evicted = conn.execute(
+                "DELETE FROM chat_response_cache WHERE cache_key IN ("
+                "SELECT cache_key FROM chat_response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            if evicted:
+                self._increment(conn, "evictions", evicted)
+
+    def stats(self):
+        """Return the counters and occupancy of the cache"""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM chat_response_cache_stats").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM chat_response_cache").fetchone()[0]
+
+        hits_exact = counters.get("hits_exact", 0)
+        hits_similar = counters.get("hits_similar", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits_exact + hits_similar + misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits_exact": hits_exact,
+            "hits_similar": hits_similar,
+            "misses": misses,
+            "expired": counters.get("expired", 0),
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round((hits_exact + hits_similar) / lookups * 100, 2) if lookups else 0
+        }
+
+    def clear(self):
+        """Empty the cache and reset the counters"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM chat_response_cache")
+            conn.execute("DELETE FROM chat_response_cache_stats")
+
+
+def cached_response_metrics(match):
+    """Usage block of a cached answer, in extract_cache_metrics' format"""
+    return {
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'total_tokens': 0,
+        'cached_tokens': 0,
+        'cache_hit_rate': 0,
+        'cache_eligible': False,
+        'estimated_cost_saved_usd': 0,
+        'cache_metrics_available': False,
+        'response_cache_hit': True,
+        'response_cache_match': match["match"],
+        'response_cache_similarity': match["similarity"]
+    }
+
+
+_cache = None
+
+
+def get_chat_response_cache():
+    """
+    Return the process-wide cache, or None if it is disabled
+
+    Configuration: CHAT_RESPONSE_CACHE_PATH, CHAT_RESPONSE_CACHE_MAX_ENTRIES,
+    CHAT_RESPONSE_CACHE_TTL, CHAT_RESPONSE_CACHE_SIMILARITY, CHAT_RESPONSE_CACHE_DISABLED
+    """
+    global _cache
+    load_environment()
+
+    if os.getenv("CHAT_RESPONSE_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+
+    if _cache is None:
+        _cache = ChatResponseCache(
+            os.getenv("CHAT_RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH),
+            int(os.getenv("CHAT_RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            float(os.getenv("CHAT_RESPONSE_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+            float(os.getenv("CHAT_RESPONSE_CACHE_SIMILARITY", DEFAULT_SIMILARITY))
+        )
+    return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestion du cache des réponses du chat")
+    parser.add_argument("--stats", action="store_true", help="Affiche les statistiques du cache")
+    parser.add_argument("--clear", action="store_true", help="Vide le cache")
+    args = parser.parse_args()
+
+    cache = get_chat_response_cache()
+    if cache is None:
+        print(json.dumps({"success": False, "error": "Le cache des réponses du chat est désactivé"}))
+        return
+
+    if args.clear:
+        cache.clear()
+
+    print(json.dumps({"success": True, **cache.stats()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import sys
 import uuid
 import time
 from google.oauth2.credentials import Credentials
@@ -24,6 +25,11 @@ from openai import AssistantEventHandler
 from openai import OpenAI
 import json
 
+# Pool de modèles Whisper partagé avec les scripts de l'application
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from whisper_models import get_model_pool
+from language_id import identify_language
+
 ## Scopes pour l'API Google Docs
 SCOPES = ['https://www.googleapis.com/auth/documents']
 
@@ -37,6 +43,9 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 assistant_id = os.getenv("ASSISTANT_ID")
 paraphraser_assistant_id = os.getenv("PARAPHRASER_ASSISTANT_ID")  # Définie dans le fichier .env
 
+# Modèle Whisper local (chargé une seule fois, partagé entre les requêtes)
+WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL", "base")
+
 # Variables globales pour le compteur d'utilisations et les threads
 usage_counter = 0
 paraphraser_usage_counter = 0
@@ -182,8 +191,8 @@ def append_text_to_google_doc_streaming(service, document_id, text):
 
 # Fonction pour transcrire avec Whisper
 def transcribe_whisper(audio_file, source_lang):
-    model = whisper.load_model("base")
-    result = model.transcribe(audio_file, language=source_lang)
+    with get_model_pool().use(WHISPER_MODEL_NAME) as model:
+        result = model.transcribe(audio_file, language=source_lang)
     return result["text"]
 
 def generate_unique_filename():
@@ -658,18 +667,15 @@ def process_youtube_url(youtube_url, use_whisper=True, source_lang="auto"):
                 # Ajouter le fichier à la liste des fichiers temporaires
                 temporary_files.append(final_audio)
                 
-                # Transcription avec Whisper
-                model = whisper.load_model("base")
-                
+                # Langue identifiée sur les 30 premières secondes seulement (décodage partiel, mise en cache)
                 if source_lang == "auto":
-                    audio = whisper.load_audio(final_audio)
-                    audio = whisper.pad_or_trim(audio)
-                    mel = whisper.log_mel_spectrogram(audio).to(model.device)
-                    _, probs = model.detect_language(mel)
-                    detected_lang = max(probs, key=probs.get)
-                    result = model.transcribe(final_audio, language=detected_lang)
+                    detected_lang = identify_language(final_audio, backend="local", model=WHISPER_MODEL_NAME)["language"]
                 else:
-                    result = model.transcribe(final_audio, language=source_lang)
+                    detected_lang = source_lang
+                
+                # Transcription avec Whisper (modèle partagé du pool)
+                with get_model_pool().use(WHISPER_MODEL_NAME) as model:
+                    result = model.transcribe(final_audio, language=detected_lang)
                 
                 transcription_text = result["text"]
                 
@@ -1054,4 +1060,6 @@ with gr.Blocks() as iface:
             outputs=[gdocs_document_id]
         )
 
+    # Charger les modèles épinglés (WHISPER_PRELOAD_MODELS) avant la première requête
+    get_model_pool().preload()
     iface.launch()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Identification de la langue d'un fichier audio
+Seul un court début de l'audio est décodé (FFmpeg s'arrête après l'extrait)
+puis soumis à un modèle Whisper local; le résultat est mis en cache par
+empreinte du fichier. transcribe.py s'en sert pour guider la transcription et
+éviter la traduction quand l'audio est déjà dans la langue demandée.
+
+Usage:
+    python language_id.py --file audio.mp3 [--backend faster-whisper]
+"""
+
+import os
+import json
+import argparse
+
+from openai_client import load_environment
+from audio_chunking import decode_audio
+from transcription_cache import get_transcription_cache, hash_file, make_cache_key
+from whisper_models import SAMPLE_RATE, LOCAL_BACKENDS, get_local_backend, get_model_pool
+
+DEFAULT_PREFIX_SECONDS = 30
+DEFAULT_BACKEND = "local"
+
+# Probabilité minimale pour se fier à la langue identifiée
+DEFAULT_MIN_PROBABILITY = 0.8
+
+# auto: seulement si le moteur est installé et que son modèle est déjà chargé ou épinglé;
+# always: à chaque traduction (modèle chargé à la demande); off: jamais
+DEFAULT_MODE = "auto"
+
+# Noms renvoyés par l'API Whisper (verbose_json) et codes ISO 639-1 correspondants
+LANGUAGE_CODES = {
+    "afrikaans": "af", "arabic": "ar", "armenian": "hy", "bulgarian": "bg", "catalan": "ca",
+    "chinese": "zh", "croatian": "hr", "czech": "cs", "danish": "da", "dutch": "nl",
+    "english": "en", "estonian": "et", "finnish": "fi", "french": "fr", "german": "de",
+    "greek": "el", "hebrew": "he", "hindi": "hi", "hungarian": "hu", "indonesian": "id",
+    "italian": "it", "japanese": "ja", "korean": "ko", "latvian": "lv", "lithuanian": "lt",
+    "malay": "ms", "norwegian": "no", "persian": "fa", "polish": "pl", "portuguese": "pt",
+    "romanian": "ro", "russian": "ru", "serbian": "sr", "slovak": "sk", "slovenian": "sl",
+    "spanish": "es", "swahili": "sw", "swedish": "sv", "tagalog": "tl", "thai": "th",
+    "turkish": "tr", "ukrainian": "uk", "urdu": "ur", "vietnamese": "vi", "welsh": "cy"
+}
+
+
+def normalize_language(language):
+    """Code ISO 639-1 d'une langue donnée par son code ("fr", "fr-FR") ou son nom anglais ("french")"""
+    if not language:
+        return None
+    language = language.strip().lower()
+    if language in LANGUAGE_CODES:
+        return LANGUAGE_CODES[language]
+    return language.replace("_", "-").split("-")[0]
+
+
+def same_language(first, second):
+    first = normalize_language(first)
+    return first is not None and first == normalize_language(second)
+
+
+def get_min_probability():
+    return float(os.getenv("LANGUAGE_ID_MIN_PROBABILITY", DEFAULT_MIN_PROBABILITY))
+
+
+def get_identification_backend(backend=None, model=None):
+    """Moteur local utilisé pour l'identification (LANGUAGE_ID_BACKEND, LANGUAGE_ID_MODEL)"""
+    load_environment()
+    return get_local_backend(backend or os.getenv("LANGUAGE_ID_BACKEND", DEFAULT_BACKEND),
+                             model or os.getenv("LANGUAGE_ID_MODEL") or None)
+
+
+def should_identify(backend=None, model=None):
+    """
+    Indique si l'identification vaut son coût dans ce processus (LANGUAGE_ID_MODE)
+
+    En mode auto, aucun modèle local n'est chargé rien que pour l'extrait:
+    l'identification n'a lieu que si le moteur est installé et que son modèle
+    est déjà chargé ou épinglé (WHISPER_PRELOAD_MODELS). Le mode always charge
+    le modèle à la demande.
+    """
+    load_environment()
+    mode = os.getenv("LANGUAGE_ID_MODE", DEFAULT_MODE).lower()
+    if mode in ("off", "false", "0"):
+        return False
+    try:
+        engine = get_identification_backend(backend, model)
+    except ValueError:
+        return False
+    if not engine.is_installed():
+        return False
+    if mode == "always":
+        return True
+    pool = get_model_pool()
+    return engine.key in pool.pinned or pool.is_loaded(engine.key)
+
+
+def identify_language(file_path, source=None, backend=None, model=None, seconds=None, use_cache=True):
+    """
+    Identifie la langue parlée au début d'un fichier audio
+
+    Args:
+        file_path (str): Chemin vers le fichier audio
+        source (str, optional): Clé de la source ("sha256:..." ou "youtube:..."), calculée si absente
+        backend (str, optional): Moteur local (LANGUAGE_ID_BACKEND, "local" par défaut)
+        model (str, optional): Modèle (LANGUAGE_ID_MODEL, sinon celui de la transcription)
+        seconds (float, optional): Durée de l'extrait décodé (LANGUAGE_ID_SECONDS, 30 par défaut)
+        use_cache (bool): Si False, ignore le cache des transcriptions
+
+    Returns:
+        dict: {"language": code ISO 639-1, "probability", "engine", "seconds", "cached"}
+    """
+    backend = get_identification_backend(backend, model)
+    seconds = float(seconds or os.getenv("LANGUAGE_ID_SECONDS", DEFAULT_PREFIX_SECONDS))
+    engine = f"{backend.name}:{backend.model}"
+
+    cache = get_transcription_cache() if use_cache else None
+    if cache is not None:
+        source = source or f"sha256:{hash_file(file_path)}"
+        cache_key = make_cache_key(source, task="language_id", model=engine, seconds=seconds)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+    samples = decode_audio(file_path, SAMPLE_RATE, duration=seconds)
+    if not len(samples):
+        raise RuntimeError(f"Aucun échantillon audio décodé dans {file_path}")
+    language, probability = backend.detect_language(samples)
+
+    result = {
+        "language": normalize_language(language),
+        "probability": round(probability, 4),
+        "engine": engine,
+        "seconds": round(len(samples) / SAMPLE_RATE, 3)
+    }
+    if cache is not None:
+        cache.set(cache_key, source, result)
+    return dict(result, cached=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Identification de la langue d'un fichier audio")
+    parser.add_argument("--file", required=True, help="Chemin vers le fichier audio")
+    parser.add_argument("--backend", choices=list(LOCAL_BACKENDS), help="Moteur local (par défaut: LANGUAGE_ID_BACKEND ou local)")
+    parser.add_argument("--model", help="Modèle Whisper (par défaut: LANGUAGE_ID_MODEL ou WHISPER_MODEL)")
+    parser.add_argument("--seconds", type=float, help=f"Durée de l'extrait analysé (par défaut: {DEFAULT_PREFIX_SECONDS})")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore le cache local")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(json.dumps({"success": False, "error": f"Le fichier {args.file} n'existe pas"}))
+        return
+    try:
+        result = identify_language(args.file, backend=args.backend, model=args.model,
+                                   seconds=args.seconds, use_cache=not args.no_cache)
+    except Exception as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        return
+    print(json.dumps({"success": True, **result}))
+
+
+if __name__ == "__main__":
+    main()
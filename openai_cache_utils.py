@@ -4,9 +4,22 @@ OpenAI Cache Utilities
 Provides utilities for tracking and optimizing OpenAI prompt caching
 """
 
+import os
 import json
+import time
+import atexit
 import logging
-from typing import Dict, Any, Optional
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends stay atomic per write, without the extra lock
+    fcntl = None
+
+DEFAULT_METRICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'cache_metrics.jsonl')
 
 def extract_cache_metrics(response) -> Dict[str, Any]:
     """
@@ -114,33 +127,227 @@ def format_cache_report(metrics: Dict[str, Any]) -> str:
     
     return report
 
-def save_cache_metrics_to_file(metrics: Dict[str, Any], filename: str = "cache_metrics.json") -> None:
+class CacheMetricsSink:
     """
-    Save cache metrics to a JSON file for analysis
-    
+    Append-only JSON-lines sink for cache metrics
+
+    Entries are buffered in memory and written in batches with a single
+    O_APPEND write under an exclusive file lock, so several processes can log
+    to the same file without losing entries and a write never depends on the
+    size of the existing history. A daemon thread flushes entries older than
+    flush_interval even when no new entry arrives (idle long-lived worker);
+    pending entries are also flushed at exit and by flush_all(), which the
+    worker calls on SIGTERM since atexit does not run on a signal.
+    """
+
+    _instances: List["CacheMetricsSink"] = []
+
+    def __init__(self, path: str = DEFAULT_METRICS_PATH, batch_size: int = 50, flush_interval: float = 5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flusher: Optional[threading.Thread] = None
+        CacheMetricsSink._instances.append(self)
+        atexit.register(self.flush)
+
+    @classmethod
+    def flush_all(cls) -> None:
+        """Flush every sink of the process (metrics, pipeline timings)"""
+        for sink in list(cls._instances):
+            sink.flush()
+
+    def _flush_periodically(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def record(self, metrics: Dict[str, Any], model: Optional[str] = None, context: Optional[str] = None) -> None:
+        """
+        Buffer one metrics entry, flushing when the batch is full or old enough
+
+        Args:
+            metrics: Cache metrics dictionary (see extract_cache_metrics)
+            model: Model used for the request
+            context: Kind of request (chat, summarization, paraphrase, ...)
+        """
+        entry = dict(metrics)
+        entry['timestamp'] = datetime.now().isoformat()
+        if model:
+            entry['model'] = model
+        if context:
+            entry['context'] = context
+
+        with self._lock:
+            self._buffer.append(json.dumps(entry, ensure_ascii=False) + "\n")
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+            # Started on first use only: short-lived scripts that record nothing stay thread-free
+            if self._flusher is None and not due:
+                self._flusher = threading.Thread(target=self._flush_periodically, name="metrics-flush", daemon=True)
+                self._flusher.start()
+
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Append the buffered entries to the file"""
+        with self._lock:
+            if not self._buffer:
+                return
+            data = "".join(self._buffer).encode('utf-8')
+            self._buffer = []
+            self._last_flush = time.monotonic()
+
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                view = memoryview(data)
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logging.error(f"Error saving cache metrics: {e}")
+
+_sinks: Dict[str, CacheMetricsSink] = {}
+_sinks_lock = threading.Lock()
+
+def get_metrics_sink(path: Optional[str] = None) -> Optional[CacheMetricsSink]:
+    """
+    Return the process-wide sink for a metrics file, or None if recording is disabled
+
+    Configuration: CACHE_METRICS_PATH, CACHE_METRICS_DISABLED
+    """
+    if os.getenv('CACHE_METRICS_DISABLED', '').lower() in ('1', 'true', 'yes'):
+        return None
+
+    path = os.path.abspath(path or os.getenv('CACHE_METRICS_PATH', DEFAULT_METRICS_PATH))
+    with _sinks_lock:
+        if path not in _sinks:
+            _sinks[path] = CacheMetricsSink(path)
+        return _sinks[path]
+
+def record_cache_metrics(metrics: Dict[str, Any], model: Optional[str] = None, context: Optional[str] = None) -> None:
+    """
+    Record cache metrics in the configured sink
+
+    Args:
+        metrics: Cache metrics dictionary
+        model: Model used for the request
+        context: Kind of request (chat, summarization, paraphrase, ...)
+    """
+    sink = get_metrics_sink()
+    if sink:
+        sink.record(metrics, model=model, context=context)
+
+def save_cache_metrics_to_file(metrics: Dict[str, Any], filename: str = DEFAULT_METRICS_PATH) -> None:
+    """
+    Save cache metrics to a JSON-lines file for analysis
+
+    Kept for compatibility: appends through the buffered sink instead of
+    rewriting the whole history.
+
     Args:
         metrics: Cache metrics dictionary
         filename: Output filename
     """
+    sink = get_metrics_sink(filename)
+    if sink:
+        sink.record(metrics, model=metrics.get('model'), context=metrics.get('context'))
+
+def iter_cache_metrics(filename: str = DEFAULT_METRICS_PATH) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the entries of a metrics file
+
+    Reads JSON lines one at a time; a legacy file holding a single JSON array
+    (the old cache_metrics.json format) is also accepted. Truncated or invalid
+    lines are skipped.
+    """
+    with open(filename, 'r', encoding='utf-8') as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+
+        if first == '[':
+            yield from json.load(f)
+            return
+
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def rollup_cache_metrics(filename: str = DEFAULT_METRICS_PATH,
+                         group_by: Sequence[str] = ('model', 'day', 'context')) -> List[Dict[str, Any]]:
+    """
+    Aggregate cache metrics in a single streaming pass
+
+    Args:
+        filename: Metrics file (JSON lines)
+        group_by: Grouping fields among model, day and context
+
+    Returns:
+        One row per group with request count, token totals, hit rate and estimated savings
+    """
+    groups: Dict[tuple, Dict[str, Any]] = {}
+
+    for entry in iter_cache_metrics(filename):
+        values = {
+            'model': entry.get('model') or 'unknown',
+            'day': (entry.get('timestamp') or '')[:10] or 'unknown',
+            'context': entry.get('context') or 'unknown'
+        }
+        key = tuple(values[field] for field in group_by)
+
+        row = groups.get(key)
+        if row is None:
+            row = {field: values[field] for field in group_by}
+            row.update(requests=0, prompt_tokens=0, cached_tokens=0, completion_tokens=0, estimated_cost_saved_usd=0.0)
+            groups[key] = row
+
+        row['requests'] += 1
+        row['prompt_tokens'] += entry.get('prompt_tokens', 0)
+        row['cached_tokens'] += entry.get('cached_tokens', 0)
+        row['completion_tokens'] += entry.get('completion_tokens', 0)
+        row['estimated_cost_saved_usd'] += entry.get('estimated_cost_saved_usd', 0)
+
+    rows = [groups[key] for key in sorted(groups)]
+    for row in rows:
+        row['cache_hit_rate'] = round(row['cached_tokens'] / row['prompt_tokens'] * 100, 2) if row['prompt_tokens'] else 0
+        row['estimated_cost_saved_usd'] = round(row['estimated_cost_saved_usd'], 6)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrégation des métriques de cache OpenAI")
+    parser.add_argument("--file", default=os.getenv('CACHE_METRICS_PATH', DEFAULT_METRICS_PATH),
+                        help="Fichier de métriques (JSON lines)")
+    parser.add_argument("--group-by", default="model,day,context",
+                        help="Champs de regroupement parmi model, day, context (séparés par des virgules)")
+    args = parser.parse_args()
+
+    group_by = [field.strip() for field in args.group_by.split(',') if field.strip()]
+    invalid = [field for field in group_by if field not in ('model', 'day', 'context')]
+    if invalid:
+        print(json.dumps({"success": False, "error": f"Champs de regroupement invalides: {', '.join(invalid)}"}))
+        return
+
     try:
-        # Load existing metrics if file exists
-        try:
-            with open(filename, 'r') as f:
-                all_metrics = json.load(f)
-        except FileNotFoundError:
-            all_metrics = []
-        
-        # Add timestamp to current metrics
-        import datetime
-        metrics['timestamp'] = datetime.datetime.now().isoformat()
-        
-        # Append new metrics
-        all_metrics.append(metrics)
-        
-        # Save updated metrics
-        with open(filename, 'w') as f:
-            json.dump(all_metrics, f, indent=2)
-            
-        logging.info(f"Cache metrics saved to {filename}")
-    except Exception as e:
-        logging.error(f"Error saving cache metrics: {e}")
\ No newline at end of file
+        rows = rollup_cache_metrics(args.file, group_by)
+    except FileNotFoundError:
+        rows = []
+    print(json.dumps({"success": True, "groups": rows}, indent=2))
+
+if __name__ == "__main__":
+    main()
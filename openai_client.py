@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+OpenAI Client Utilities
+Shared environment loading and a process-wide OpenAI client for the Python scripts
+"""
+
+import os
+import threading
+import importlib.util
+
+DEFAULT_ORG_ID = "org-HzNhomFpeY5ewhrUNlmpTehv"
+
+# Emplacements possibles du fichier .env (même ordre que les scripts historiques)
+ENV_PATHS = [
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))), 'inteligent-transcription-env', '.env'),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+]
+
+_env_loaded = False
+_settings = None
+_client = None
+_client_lock = threading.Lock()
+
+
+def load_environment():
+    """Load the first .env file found (only once per process; dotenv is imported only if there is one)"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+
+    env_path = next((path for path in ENV_PATHS if os.path.exists(path)), None)
+    if env_path is None:
+        return
+
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+
+    load_dotenv(env_path)
+
+
+def get_openai_settings():
+    """
+    Return the OpenAI credentials, resolved once per process
+
+    config.php reads the same .env file, so the environment is the single source.
+
+    Returns:
+        dict: {"api_key": str or None, "organization": str}
+    """
+    global _settings
+    if _settings is None:
+        load_environment()
+        _settings = {
+            "api_key": os.getenv("OPENAI_API_KEY"),
+            "organization": os.getenv("OPENAI_ORG_ID", DEFAULT_ORG_ID)
+        }
+    return _settings
+
+
+def check_openai_config():
+    """
+    Check that the OpenAI SDK and API key are available
+
+    The SDK is only located, not imported: error paths stay cheap and the
+    import cost is paid when a client is actually built.
+
+    Returns:
+        dict or None: Error result in the scripts' format, or None if everything is configured
+    """
+    if importlib.util.find_spec("openai") is None:
+        return {
+            "success": False,
+            "error": "Le module openai n'est pas installé. Installez-le avec: pip install openai"
+        }
+
+    if not get_openai_settings()["api_key"]:
+        return {
+            "success": False,
+            "error": "La clé API OpenAI n'est pas configurée dans le fichier .env"
+        }
+
+    return None
+
+
+def get_client():
+    """
+    Return the process-wide OpenAI client
+
+    The client (and its HTTP connection pool) is built once and reused, so a
+    long-lived process such as python_worker.py keeps its connections warm.
+    The pool size can be tuned with OPENAI_MAX_CONNECTIONS.
+    """
+    global _client
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is None:
+            import openai
+
+            kwargs = dict(get_openai_settings())
+
+            # Retries are handled by openai_scheduler.run_scheduled, within the shared budgets
+            from openai_scheduler import scheduler_enabled
+            if scheduler_enabled():
+                kwargs["max_retries"] = 0
+
+            max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+            if hasattr(openai, "DefaultHttpxClient"):
+                import httpx
+                kwargs["http_client"] = openai.DefaultHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_connections
+                    )
+                )
+
+            _client = openai.OpenAI(**kwargs)
+
+    return _client
+
+
+def create_async_client(max_retries=0):
+    """
+    Build an AsyncOpenAI client for one asyncio run
+
+    Async clients are bound to the event loop they are used on, so callers
+    create one per run and close it afterwards. Retries are disabled by
+    default so that the caller's rate limiter decides when to retry.
+    """
+    import openai
+
+    return openai.AsyncOpenAI(**get_openai_settings(), max_retries=max_retries)
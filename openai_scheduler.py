@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+OpenAI Request Scheduler
+Coordinates the OpenAI calls of every Python process (CLI scripts, worker,
+batch jobs) through token buckets stored in a shared SQLite database:
+requests/min and tokens/min budgets per resource, priority for interactive
+calls, jittered retries on 429/5xx and queue/wait metrics.
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+
+from chat_context import count_message_tokens
+from openai_client import load_environment
+from pipeline_timings import add_counter, stage
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "openai_rate_limits.db")
+DEFAULT_MAX_RETRIES = 4
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2
+
+# Budgets per resource: (requests/min env, default, tokens/min env, default)
+RESOURCES = {
+    "chat": ("OPENAI_CHAT_RPM", 500, "OPENAI_CHAT_TPM", 200000),
+    "audio": ("OPENAI_AUDIO_RPM", 50, None, None),
+}
+
+# Waiters that stopped polling (killed process) are forgotten after this delay
+STALE_WAITER_SECONDS = 120
+
+
+def get_retry_after(error):
+    """Return the delay requested by the API (retry-after-ms / retry-after headers), if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def is_retryable(error):
+    """Rate limits, timeouts, connection errors and server errors are retried"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError")
+
+
+def is_rate_limited(error):
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+class RequestScheduler:
+    """Token buckets shared between processes through SQLite"""
+
+    def __init__(self, db_path=DEFAULT_STATE_PATH, budgets=None):
+        self.db_path = db_path
+        self.budgets = budgets or {}
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    name TEXT PRIMARY KEY,
+                    level REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_waiters (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    resource TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    seen_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_stats (
+                    name TEXT PRIMARY KEY,
+                    value REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _increment(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO rate_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def _set_max(self, conn, name, value):
+        conn.execute(
+            "INSERT INTO rate_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)",
+            (name, value)
+        )
+
+    def _limits(self, resource):
+        """Return [(bucket name, capacity per minute)] for a resource"""
+        rpm, tpm = self.budgets.get(resource, (None, None))
+        limits = []
+        if rpm:
+            limits.append((f"{resource}:requests", float(rpm)))
+        if tpm:
+            limits.append((f"{resource}:tokens", float(tpm)))
+        return limits
+
+    def _levels(self, conn, limits, now):
+        """Refill and return the current level of each bucket"""
+        levels = {}
+        for name, capacity in limits:
+            row = conn.execute("SELECT level, updated_at FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                levels[name] = capacity
+            else:
+                levels[name] = min(capacity, row[0] + (now - row[1]) * capacity / 60)
+        return levels
+
+    def _store(self, conn, levels, now):
+        for name, level in levels.items():
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (name, level, updated_at) VALUES (?, ?, ?)",
+                (name, level, now)
+            )
+
+    def acquire(self, resource, tokens=0, priority=PRIORITY_DEFAULT):
+        """
+        Block until the resource has budget for one request of `tokens` tokens
+
+        Requests of a lower priority wait while a higher-priority request is
+        queued for the same resource, whichever process it comes from.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        limits = self._limits(resource)
+        if not limits:
+            return 0.0
+
+        started = time.monotonic()
+        waiter_id = None
+        try:
+            while True:
+                with self._connect() as conn:
+                    now = time.time()
+                    conn.execute("DELETE FROM rate_waiters WHERE seen_at < ?", (now - STALE_WAITER_SECONDS,))
+                    if waiter_id is not None:
+                        conn.execute("UPDATE rate_waiters SET seen_at = ? WHERE id = ?", (now, waiter_id))
+
+                    ahead = conn.execute(
+                        "SELECT COUNT(*) FROM rate_waiters WHERE resource = ? AND priority < ?",
+                        (resource, priority)
+                    ).fetchone()[0]
+
+                    levels = self._levels(conn, limits, now)
+                    needs = {name: (1.0 if name.endswith(":requests") else min(float(tokens), capacity))
+                             for name, capacity in limits}
+
+                    if not ahead and all(levels[name] >= needs[name] for name in needs):
+                        for name in needs:
+                            levels[name] -= needs[name]
+                        self._store(conn, levels, now)
+                        if waiter_id is not None:
+                            conn.execute("DELETE FROM rate_waiters WHERE id = ?", (waiter_id,))
+                            waiter_id = None
+
+                        waited = time.monotonic() - started
+                        self._increment(conn, f"{resource}:acquired")
+                        self._increment(conn, f"{resource}:wait_ms", waited * 1000)
+                        self._set_max(conn, f"{resource}:max_wait_ms", waited * 1000)
+                        if waited > 0.001:
+                            self._increment(conn, f"{resource}:waited")
+                        return waited
+
+                    if waiter_id is None:
+                        waiter_id = conn.execute(
+                            "INSERT INTO rate_waiters (resource, priority, created_at, seen_at) VALUES (?, ?, ?, ?)",
+                            (resource, priority, now, now)
+                        ).lastrowid
+
+                    if ahead:
+                        delay = 0.1
+                    else:
+                        delay = max(
+                            (needs[name] - levels[name]) * 60 / capacity
+                            for name, capacity in limits
+                        )
+                time.sleep(min(5.0, max(0.05, delay)) * (1 + random.random() * 0.1))
+        finally:
+            if waiter_id is not None:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM rate_waiters WHERE id = ?", (waiter_id,))
+
+    def settle(self, resource, estimated_tokens, actual_tokens):
+        """Correct the token bucket once the real usage of a request is known"""
+        limits = dict(self._limits(resource))
+        name = f"{resource}:tokens"
+        if name not in limits or actual_tokens is None:
+            return
+        with self._connect() as conn:
+            now = time.time()
+            levels = self._levels(conn, [(name, limits[name])], now)
+            levels[name] = min(limits[name], levels[name] + estimated_tokens - actual_tokens)
+            self._store(conn, levels, now)
+
+    def backoff(self, resource, rate_limited):
+        """Record a failed attempt; a 429 empties the buckets so every process slows down"""
+        with self._connect() as conn:
+            self._increment(conn, f"{resource}:retries")
+            if rate_limited:
+                self._increment(conn, f"{resource}:rate_limited")
+                self._store(conn, {name: 0.0 for name, _ in self._limits(resource)}, time.time())
+
+    def stats(self):
+        """Return bucket levels, queue depth and wait metrics per resource"""
+        with self._connect() as conn:
+            now = time.time()
+            counters = dict(conn.execute("SELECT name, value FROM rate_stats").fetchall())
+            waiters = conn.execute(
+                "SELECT resource, priority, COUNT(*), MIN(created_at) FROM rate_waiters "
+                "WHERE seen_at >= ? GROUP BY resource, priority",
+                (now - STALE_WAITER_SECONDS,)
+            ).fetchall()
+
+            result = {}
+            for resource in self.budgets:
+                limits = self._limits(resource)
+                levels = self._levels(conn, limits, now)
+                acquired = counters.get(f"{resource}:acquired", 0)
+                queued = [row for row in waiters if row[0] == resource]
+                result[resource] = {
+                    "budgets_per_minute": {name.split(":")[1]: capacity for name, capacity in limits},
+                    "available": {name.split(":")[1]: round(levels[name], 1) for name, _ in limits},
+                    "queue_depth": sum(row[2] for row in queued),
+                    "queue_by_priority": {str(row[1]): row[2] for row in queued},
+                    "oldest_wait_s": round(now - min(row[3] for row in queued), 3) if queued else 0,
+                    "acquired": int(acquired),
+                    "waited": int(counters.get(f"{resource}:waited", 0)),
+                    "avg_wait_ms": round(counters.get(f"{resource}:wait_ms", 0) / acquired, 1) if acquired else 0,
+                    "max_wait_ms": round(counters.get(f"{resource}:max_wait_ms", 0), 1),
+                    "retries": int(counters.get(f"{resource}:retries", 0)),
+                    "rate_limited": int(counters.get(f"{resource}:rate_limited", 0))
+                }
+        return result
+
+    def reset(self):
+        """Refill every bucket and reset the counters"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM rate_buckets")
+            conn.execute("DELETE FROM rate_waiters")
+            conn.execute("DELETE FROM rate_stats")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def scheduler_enabled():
+    load_environment()
+    return os.getenv("OPENAI_SCHEDULER_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+def get_scheduler():
+    """
+    Return the process-wide scheduler, or None if it is disabled
+
+    Configuration: OPENAI_SCHEDULER_PATH, OPENAI_SCHEDULER_DISABLED and the
+    budgets OPENAI_CHAT_RPM, OPENAI_CHAT_TPM, OPENAI_AUDIO_RPM
+    """
+    global _scheduler
+    if not scheduler_enabled():
+        return None
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            budgets = {}
+            for resource, (rpm_env, rpm_default, tpm_env, tpm_default) in RESOURCES.items():
+                rpm = float(os.getenv(rpm_env, rpm_default))
+                tpm = float(os.getenv(tpm_env, tpm_default)) if tpm_env else None
+                budgets[resource] = (rpm, tpm)
+            _scheduler = RequestScheduler(os.getenv("OPENAI_SCHEDULER_PATH", DEFAULT_STATE_PATH), budgets)
+    return _scheduler
+
+
+def estimate_chat_tokens(messages, max_completion_tokens=1000, model="gpt-4o-mini"):
+    """Tokens to reserve for a chat request: the prompt plus the longest allowed completion"""
+    return sum(count_message_tokens(m, model) for m in messages) + max_completion_tokens
+
+
+def _usage_tokens(response):
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def run_scheduled(call, resource="chat", tokens=0, priority=PRIORITY_DEFAULT, max_retries=DEFAULT_MAX_RETRIES,
+                  before_retry=None):
+    """
+    Run an OpenAI call within the shared budgets, retrying 429/5xx with jittered backoff
+
+    Args:
+        call (callable): Performs the request and returns the response
+        resource (str): Budget to draw from ("chat" or "audio")
+        tokens (int): Estimated tokens of the request (prompt + expected completion)
+        priority (int): PRIORITY_INTERACTIVE, PRIORITY_DEFAULT or PRIORITY_BACKGROUND
+        max_retries (int): Retries after the first attempt
+        before_retry (callable, optional): Prepares the next attempt (e.g. rewinds an upload);
+            when it returns False the error is raised instead of retried
+
+    Returns:
+        The response of call()
+    """
+    scheduler = get_scheduler()
+    attempt = 0
+    while True:
+        if scheduler is not None:
+            with stage("rate_limit_wait"):
+                scheduler.acquire(resource, tokens, priority)
+        try:
+            response = call()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            if before_retry is not None and before_retry() is False:
+                raise
+            if scheduler is not None:
+                scheduler.backoff(resource, is_rate_limited(e))
+            delay = get_retry_after(e)
+            if delay is None:
+                # Full jitter exponential backoff
+                delay = random.uniform(0, min(30, 2 ** (attempt + 1)))
+            logging.warning(f"OpenAI {resource} request failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+            add_counter("retries")
+            with stage("retry_backoff"):
+                time.sleep(delay)
+            attempt += 1
+            continue
+
+        if scheduler is not None and tokens:
+            scheduler.settle(resource, tokens, _usage_tokens(response))
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ordonnanceur partagé des appels OpenAI")
+    parser.add_argument("--stats", action="store_true", help="Affiche les budgets, la file d'attente et les temps d'attente")
+    parser.add_argument("--reset", action="store_true", help="Remplit les budgets et remet les compteurs à zéro")
+    args = parser.parse_args()
+
+    scheduler = get_scheduler()
+    if scheduler is None:
+        print(json.dumps({"success": False, "error": "L'ordonnanceur OpenAI est désactivé"}))
+        return
+
+    if args.reset:
+        scheduler.reset()
+
+    print(json.dumps({"success": True, **scheduler.stats()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
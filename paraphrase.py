@@ -1,211 +1,261 @@
 #!/usr/bin/env python3
 
 """
-Script de paraphrase de texte avec OpenAI Assistant
-Ce script utilise l'API OpenAI Assistant pour paraphraser un texte
+Script de paraphrase de texte avec OpenAI
+Ce script paraphrase un texte (ou un lot de textes) en une seule requête de
+chat completion par morceau, les longs textes étant découpés en paragraphes
+traités en parallèle
 """
 
-import os
 import sys
 import json
 import argparse
-from dotenv import load_dotenv
-import openai
-from openai import OpenAI
-from typing_extensions import override
-from openai import AssistantEventHandler
-
-# Charger les variables d'environnement depuis différents emplacements possibles
-env_paths = [
-    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))), 'inteligent-transcription-env', '.env'),
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
-]
-
-for env_path in env_paths:
-    if os.path.exists(env_path):
-        load_dotenv(env_path)
-        break
-
-# Vérifier si la clé API OpenAI est configurée
-if not os.getenv("OPENAI_API_KEY"):
-    print(json.dumps({
-        "success": False,
-        "error": "La clé API OpenAI n'est pas configurée dans le fichier .env"
-    }))
-    sys.exit(1)
-
-# Vérifier si l'ID de l'assistant est configuré
-paraphraser_assistant_id = os.getenv("PARAPHRASER_ASSISTANT_ID")
-if not paraphraser_assistant_id:
-    # Si l'ID de l'assistant n'est pas configuré, nous allons créer un nouvel assistant
-    try:
-        client = OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            organization=os.getenv("OPENAI_ORG_ID", "org-HzNhomFpeY5ewhrUNlmpTehv")
-        )
-        assistant = client.beta.assistants.create(
-            name="Paraphraser",
-            instructions="""Tu es un assistant spécialisé dans la paraphrase de texte. 
-Ta tâche est de reformuler le texte fourni pour le rendre plus clair, plus fluide et plus professionnel, tout en conservant le sens original. 
-Améliore la structure des phrases, le vocabulaire et la cohérence globale. 
+from concurrent.futures import ThreadPoolExecutor
+
+from openai_client import check_openai_config, get_client
+from openai_cache_utils import extract_cache_metrics, record_cache_metrics
+from python_worker import call_worker
+from chat_context import count_tokens
+from openai_scheduler import estimate_chat_tokens, run_scheduled
+from pipeline_timings import in_context, instrumented, stage
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_MAX_WORKERS = 4
+
+# Taille maximale (en caractères) d'un morceau envoyé en une requête
+MAX_CHUNK_CHARS = 4000
+
+# Préfixe système statique: identique d'un appel à l'autre pour bénéficier du cache de prompt OpenAI
+PARAPHRASER_INSTRUCTIONS = """Tu es un assistant spécialisé dans la paraphrase de texte.
+Ta tâche est de reformuler le texte fourni pour le rendre plus clair, plus fluide et plus professionnel, tout en conservant le sens original.
+Améliore la structure des phrases, le vocabulaire et la cohérence globale.
 Ne réponds qu'avec le texte paraphrasé, sans commentaires ni explications.
-IMPORTANT: Tu dois toujours paraphraser dans la même langue que le texte original. 
+IMPORTANT: Tu dois toujours paraphraser dans la même langue que le texte original.
 Si le texte est en français, ta réponse doit être en français.
 Si le texte est en anglais, ta réponse doit être en anglais.
-Ne traduis jamais le texte dans une autre langue.""",
-            model="gpt-4o-mini",
-        )
-        paraphraser_assistant_id = assistant.id
-        print(f"Nouvel assistant créé avec l'ID: {paraphraser_assistant_id}")
-        print(f"Ajoutez cet ID à votre fichier .env: PARAPHRASER_ASSISTANT_ID={paraphraser_assistant_id}")
-    except Exception as e:
-        print(json.dumps({
-            "success": False,
-            "error": f"Erreur lors de la création de l'assistant: {str(e)}"
-        }))
-        sys.exit(1)
-
-# Variables globales pour le compteur d'utilisations et le thread
-paraphraser_usage_counter = 0
-MAX_USAGE_BEFORE_CLEANUP = 5
-paraphraser_thread = None
-
-# Classe pour gérer les événements de streaming
-class EventHandler(AssistantEventHandler):
-    def __init__(self):
-        super().__init__()
-        self.paraphrased_text = ""
-    
-    @override
-    def on_text_created(self, text) -> None:
-        pass
-    
-    @override
-    def on_text_delta(self, delta, snapshot):
-        self.paraphrased_text += delta.value
-
-# Fonction pour supprimer le thread
-def delete_thread(thread_id):
-    try:
-        client = OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            organization=os.getenv("OPENAI_ORG_ID", "org-HzNhomFpeY5ewhrUNlmpTehv")
+Ne traduis jamais le texte dans une autre langue.
+Le texte peut être un extrait d'un document plus long: paraphrase uniquement l'extrait fourni.
+Une consigne de style peut précéder le texte, sur une ligne commençant par "Style:"."""
+
+# Consignes par style (styles acceptés par ValidationUtils::validateParaphraseParams)
+STYLE_INSTRUCTIONS = {
+    "standard": None,
+    "simple": "utilise des phrases courtes et un vocabulaire simple",
+    "formel": "adopte un registre soutenu et formel",
+    "academique": "adopte un style académique, précis et argumenté",
+    "creatif": "reformule de manière créative et vivante",
+    "professionnel": "adopte un ton professionnel et direct",
+    "concis": "sois le plus concis possible sans perdre d'information",
+}
+
+def split_into_chunks(text, max_chars=MAX_CHUNK_CHARS):
+    """
+    Découpe un texte en morceaux de paragraphes entiers d'au plus max_chars caractères
+
+    Un paragraphe plus long que max_chars forme un morceau à lui seul.
+    """
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+    chunks = []
+    current = []
+    current_size = 0
+    for paragraph in paragraphs:
+        if current and current_size + len(paragraph) > max_chars:
+            chunks.append("\n\n".join(current))
+            current = []
+            current_size = 0
+        current.append(paragraph)
+        current_size += len(paragraph) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def build_messages(text, style="standard"):
+    """Construit les messages: préfixe système statique puis consigne de style et texte"""
+    instruction = STYLE_INSTRUCTIONS.get(style)
+    content = f"Style: {instruction}\n\n{text}" if instruction else text
+    return [
+        {"role": "system", "content": PARAPHRASER_INSTRUCTIONS},
+        {"role": "user", "content": content}
+    ]
+
+def paraphrase_chunk(text, style="standard", model=DEFAULT_MODEL):
+    """
+    Paraphrase un morceau de texte en une seule requête
+
+    Returns:
+        tuple: (texte paraphrasé, métriques d'utilisation)
+    """
+    messages = build_messages(text, style)
+    with stage("openai_request"):
+        response = run_scheduled(
+            lambda: get_client().chat.completions.create(
+                model=model,
+                messages=messages
+            ),
+            tokens=estimate_chat_tokens(messages, count_tokens(text, model), model)
         )
-        client.beta.threads.delete(thread_id)
-        print(f"Thread {thread_id} supprimé avec succès.")
-    except Exception as e:
-        print(f"Erreur lors de la suppression du thread {thread_id}: {str(e)}")
+    metrics = extract_cache_metrics(response)
+    record_cache_metrics(metrics, model=model, context="paraphrase")
+    return response.choices[0].message.content.strip(), metrics
+
+def _sum_usage(metrics_list):
+    """Additionne les compteurs de tokens de plusieurs requêtes"""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+    for metrics in metrics_list:
+        for key in usage:
+            usage[key] += metrics.get(key, 0)
+    return usage
 
-def paraphrase_text(text, language="fr"):
+@instrumented("paraphrase_batch")
+def paraphrase_batch(texts, language="fr", style="standard", model=DEFAULT_MODEL, max_workers=DEFAULT_MAX_WORKERS):
     """
-    Paraphrase un texte avec l'API OpenAI Assistant
-    
+    Paraphrase plusieurs textes; tous leurs morceaux partagent un même pool de requêtes
+
+    Args:
+        texts (list): Textes à paraphraser
+        language (str, optional): Code de langue (fr, en, etc.)
+        style (str, optional): Style de paraphrase (voir STYLE_INSTRUCTIONS)
+        model (str, optional): Modèle OpenAI
+        max_workers (int, optional): Nombre de requêtes simultanées
+
+    Returns:
+        list: Un résultat par texte, dans l'ordre
+    """
+    config_error = check_openai_config()
+    if config_error:
+        return [config_error for _ in texts]
+
+    chunked_texts = [split_into_chunks(text) if text and text.strip() else [] for text in texts]
+    jobs = [(i, chunk) for i, chunks in enumerate(chunked_texts) for chunk in chunks]
+
+    def run(job):
+        try:
+            return paraphrase_chunk(job[1], style, model), None
+        except Exception as e:
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        outputs = list(executor.map(in_context(run), jobs))
+
+    results = []
+    for i, text in enumerate(texts):
+        if not chunked_texts[i]:
+            results.append({"success": False, "error": "Le texte à paraphraser est vide"})
+            continue
+
+        text_outputs = [output for (index, _), output in zip(jobs, outputs) if index == i]
+        errors = [error for _, error in text_outputs if error]
+        if errors:
+            results.append({"success": False, "error": errors[0]})
+            continue
+
+        results.append({
+            "success": True,
+            "original_text": text,
+            "paraphrased_text": "\n\n".join(paraphrased for (paraphrased, _), _ in text_outputs),
+            "language": language,
+            "style": style,
+            "chunks": len(text_outputs),
+            "usage": _sum_usage(metrics for (_, metrics), _ in text_outputs)
+        })
+    return results
+
+@instrumented("paraphrase")
+def paraphrase_text(text, language="fr", style="standard", model=DEFAULT_MODEL, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Paraphrase un texte avec l'API OpenAI (chat completion)
+
     Args:
         text (str): Texte à paraphraser
         language (str, optional): Code de langue (fr, en, etc.)
-        
+        style (str, optional): Style de paraphrase (voir STYLE_INSTRUCTIONS)
+        model (str, optional): Modèle OpenAI
+        max_workers (int, optional): Nombre de morceaux paraphrasés simultanément
+
     Returns:
         dict: Résultat de la paraphrase
     """
-    global paraphraser_thread, paraphraser_usage_counter, MAX_USAGE_BEFORE_CLEANUP, paraphraser_assistant_id
-    
     try:
         # Vérifier si le texte est vide
         if not text or text.strip() == "":
             return {"success": False, "error": "Le texte à paraphraser est vide"}
-        
-        # Initialiser le client OpenAI
-        client = OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            organization=os.getenv("OPENAI_ORG_ID", "org-HzNhomFpeY5ewhrUNlmpTehv")
-        )
-        
-        # Si le thread n'existe pas, le créer
-        if paraphraser_thread is None:
-            paraphraser_thread = client.beta.threads.create()
-            print(f"Nouveau thread créé: {paraphraser_thread.id}")
-        
-        # Ajouter le message de l'utilisateur au Thread
-        message = client.beta.threads.messages.create(
-            thread_id=paraphraser_thread.id,
-            role="user",
-            content=text
-        )
-        
-        # Créer un EventHandler pour gérer le streaming
-        event_handler = EventHandler()
-        
-        # Créer et streamer le Run avec l'assistant
-        with client.beta.threads.runs.stream(
-            thread_id=paraphraser_thread.id,
-            assistant_id=paraphraser_assistant_id,
-            event_handler=event_handler
-        ) as stream:
-            stream.until_done()
-        
-        # Récupérer le texte paraphrasé depuis l'EventHandler
-        paraphrased_text = event_handler.paraphrased_text.strip()
-        
-        # Incrémenter le compteur d'utilisations
-        paraphraser_usage_counter += 1
-        print(f"Compteur d'utilisations: {paraphraser_usage_counter}")
-        
-        # Vérifier si nous devons nettoyer le thread après MAX_USAGE_BEFORE_CLEANUP utilisations
-        if paraphraser_usage_counter >= MAX_USAGE_BEFORE_CLEANUP:
-            delete_thread(paraphraser_thread.id)
-            paraphraser_usage_counter = 0  # Réinitialiser le compteur
-            paraphraser_thread = None      # Réinitialiser le thread
-        
-        # Retourner le résultat
-        return {
-            "success": True,
-            "original_text": text,
-            "paraphrased_text": paraphrased_text,
-            "language": language
-        }
+
+        return paraphrase_batch([text], language, style, model, max_workers)[0]
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def read_batch_file(path):
+    """Lit un lot de textes: tableau JSON ou JSON lines (chaînes ou objets {"text": ...})"""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    try:
+        entries = json.loads(content)
+        if not isinstance(entries, list):
+            entries = [entries]
+    except json.JSONDecodeError:
+        entries = [json.loads(line) for line in content.splitlines() if line.strip()]
+    return [entry if isinstance(entry, str) else entry.get("text", "") for entry in entries]
+
 def main():
     # Analyser les arguments de la ligne de commande
     parser = argparse.ArgumentParser(description="Paraphrase de texte avec OpenAI")
     parser.add_argument("--text", help="Texte à paraphraser")
-    parser.add_argument("--file", help="Chemin vers le fichier contenant le texte à paraphraser")
+    parser.add_argument("--file", "--input", dest="file", help="Chemin vers le fichier contenant le texte à paraphraser")
+    parser.add_argument("--batch", help="Fichier JSON (tableau) ou JSON lines de textes à paraphraser en un seul appel")
     parser.add_argument("--output", help="Chemin vers le fichier de sortie JSON")
     parser.add_argument("--language", default="fr", help="Code de langue (fr, en, etc.)")
+    parser.add_argument("--style", default="standard", choices=sorted(STYLE_INSTRUCTIONS), help="Style de paraphrase")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"Modèle OpenAI (par défaut: {DEFAULT_MODEL})")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS, help="Nombre de requêtes simultanées")
     args = parser.parse_args()
-    
-    # Récupérer le texte à paraphraser
-    text = ""
-    if args.text:
-        text = args.text
-    elif args.file:
+
+    options = {"language": args.language, "style": args.style, "model": args.model, "max_workers": args.max_workers}
+
+    if args.batch:
+        # Paraphraser un lot de textes
         try:
-            with open(args.file, "r", encoding="utf-8") as f:
-                text = f.read()
+            texts = read_batch_file(args.batch)
         except Exception as e:
             result = {"success": False, "error": f"Erreur lors de la lecture du fichier: {str(e)}"}
             print(json.dumps(result))
             sys.exit(1)
+
+        results = call_worker("paraphrase_batch", dict(options, texts=texts))
+        if results is None:
+            results = paraphrase_batch(texts, **options)
+        result = {"success": all(r["success"] for r in results), "results": results}
     else:
-        result = {"success": False, "error": "Vous devez spécifier un texte ou un fichier"}
-        print(json.dumps(result))
-        sys.exit(1)
-    
-    # Paraphraser le texte
-    result = paraphrase_text(text, args.language)
-    
+        # Récupérer le texte à paraphraser
+        text = ""
+        if args.text:
+            text = args.text
+        elif args.file:
+            try:
+                with open(args.file, "r", encoding="utf-8") as f:
+                    text = f.read()
+            except Exception as e:
+                result = {"success": False, "error": f"Erreur lors de la lecture du fichier: {str(e)}"}
+                print(json.dumps(result))
+                sys.exit(1)
+        else:
+            result = {"success": False, "error": "Vous devez spécifier un texte ou un fichier"}
+            print(json.dumps(result))
+            sys.exit(1)
+
+        # Paraphraser le texte via le worker persistant s'il tourne, sinon localement
+        result = call_worker("paraphrase_text", dict(options, text=text))
+        if result is None:
+            result = paraphrase_text(text, **options)
+
     # Enregistrer le résultat dans un fichier JSON si demandé
     if args.output:
         try:
             with open(args.output, "w", encoding="utf-8") as f:
                 json.dump(result, f, ensure_ascii=False, indent=2)
-            print(f"Résultat enregistré dans {args.output}")
         except Exception as e:
             error_msg = f"Erreur lors de l'écriture du fichier de sortie: {str(e)}"
-            print(error_msg)
             result = {"success": False, "error": error_msg}
-    
+
     # Afficher le résultat en JSON pour faciliter le traitement par PHP
     print(json.dumps(result))
 
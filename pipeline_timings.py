@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Pipeline Timings
+Per-stage wall/CPU timers and counters (bytes uploaded, retries, ...) for the
+processing scripts. Each instrumented job adds a "timings" block to its JSON
+result, appends it to a JSON-lines log and can dump a cProfile of the run.
+
+Stages may nest and run on several threads: a stage's times are summed over
+its occurrences, so parallel stages can add up to more than the job's total.
+CPU times are those of the whole process (cpu_ms) and of its finished child
+processes such as FFmpeg (child_cpu_ms) while the stage ran.
+
+Usage:
+    python pipeline_timings.py --group-by job,stage
+"""
+
+import os
+import json
+import time
+import argparse
+import functools
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+
+DEFAULT_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "pipeline_timings.jsonl")
+
+_current = contextvars.ContextVar("pipeline_timings", default=None)
+
+
+def _cpu_times():
+    """(process CPU seconds, CPU seconds of the terminated children)"""
+    times = os.times()
+    return time.process_time(), times.children_user + times.children_system
+
+
+class JobTimings:
+    """Stage timers and counters of one job"""
+
+    def __init__(self, job):
+        self.job = job
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._cpu_started = _cpu_times()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        cpu_started, children_started = _cpu_times()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            cpu, children = _cpu_times()
+            with self._lock:
+                entry = self.stages.setdefault(name, {"calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0, "child_cpu_ms": 0.0})
+                entry["calls"] += 1
+                entry["wall_ms"] += wall * 1000
+                entry["cpu_ms"] += (cpu - cpu_started) * 1000
+                entry["child_cpu_ms"] += (children - children_started) * 1000
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_dict(self):
+        cpu, children = _cpu_times()
+        with self._lock:
+            return {
+                "job": self.job,
+                "total_ms": round((time.perf_counter() - self._started) * 1000, 1),
+                "cpu_ms": round((cpu - self._cpu_started[0]) * 1000, 1),
+                "child_cpu_ms": round((children - self._cpu_started[1]) * 1000, 1),
+                "stages": {
+                    name: {key: round(value, 1) if isinstance(value, float) else value for key, value in entry.items()}
+                    for name, entry in self.stages.items()
+                },
+                "counters": dict(self.counters)
+            }
+
+
+def current():
+    """Timings of the job running in this context, or None"""
+    return _current.get()
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of the current job (does nothing outside an instrumented job)"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.stage(name):
+        yield
+
+
+def add_counter(name, amount=1):
+    """Add to a counter of the current job (bytes uploaded, retries, ...)"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, amount)
+
+
+def in_context(function):
+    """
+    Bind a function to the caller's context before handing it to a thread pool
+
+    Threads do not inherit context variables: without this, stages run by
+    executor workers would not be attributed to the job.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # A context cannot be entered by two threads at once: each call runs in its own copy
+        return context.copy().run(function, *args, **kwargs)
+    return wrapper
+
+
+def timings_enabled():
+    return os.getenv("PIPELINE_TIMINGS_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def log_timings(block, success=None):
+    """Append a timings block to the JSON-lines log (PIPELINE_TIMINGS_PATH)"""
+    global _sink
+    from openai_cache_utils import CacheMetricsSink
+
+    with _sink_lock:
+        if _sink is None:
+            _sink = CacheMetricsSink(os.path.abspath(os.getenv("PIPELINE_TIMINGS_PATH", DEFAULT_LOG_PATH)))
+    entry = dict(block, pid=os.getpid())
+    if success is not None:
+        entry["success"] = success
+    _sink.record(entry)
+
+
+# cProfile can only follow one job at a time per process
+_profile_lock = threading.Lock()
+
+
+def _start_profiler():
+    if not os.getenv("PIPELINE_PROFILE_DIR") or not _profile_lock.acquire(blocking=False):
+        return None
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler (py-spy attached in-process, debugger, ...) is active
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def _stop_profiler(profiler, job):
+    """Write the profile in pstats format (snakeviz, gprof2dot, pstats) and return its path"""
+    profiler.disable()
+    try:
+        profile_dir = os.getenv("PIPELINE_PROFILE_DIR")
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{job}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+        profiler.dump_stats(path)
+        return path
+    except OSError:
+        return None
+    finally:
+        _profile_lock.release()
+
+
+def instrumented(job):
+    """
+    Decorator timing a processing function as one job
+
+    The "timings" block is added to the function's result when it is a dict,
+    then logged. Calls made from inside another job (process_chat calling
+    send_chat_request, ...) are counted as part of that job.
+
+    Configuration: PIPELINE_TIMINGS_DISABLED, PIPELINE_TIMINGS_PATH and
+    PIPELINE_PROFILE_DIR (cProfile dump of every job when set)
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current.get() is not None or not timings_enabled():
+                return function(*args, **kwargs)
+
+            timings = JobTimings(job)
+            token = _current.set(timings)
+            profiler = _start_profiler()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                _current.reset(token)
+                profile_path = _stop_profiler(profiler, job) if profiler else None
+
+            block = timings.to_dict()
+            if profile_path:
+                block["profile"] = profile_path
+            success = result.get("success") if isinstance(result, dict) else None
+            if isinstance(result, dict):
+                result["timings"] = block
+            log_timings(block, success)
+            return result
+        return wrapper
+    return decorator
+
+
+def rollup_timings(filename=DEFAULT_LOG_PATH, group_by=("job", "stage")):
+    """
+    Aggregate a timings log: job count, mean and max wall time per group
+
+    Args:
+        filename (str): JSON-lines log written by log_timings
+        group_by (tuple): Among "job", "stage" and "day"
+    """
+    groups = defaultdict(lambda: {"count": 0, "wall_ms": 0.0, "max_wall_ms": 0.0, "cpu_ms": 0.0})
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            stages = entry.get("stages", {}) if "stage" in group_by else {}
+            rows = [(name, values) for name, values in stages.items()] or [("total", {
+                "wall_ms": entry.get("total_ms", 0), "cpu_ms": entry.get("cpu_ms", 0)
+            })]
+            for name, values in rows:
+                fields = {"job": entry.get("job"), "stage": name, "day": (entry.get("timestamp") or "")[:10]}
+                group = groups[tuple(fields[key] for key in group_by)]
+                group["count"] += 1
+                group["wall_ms"] += values.get("wall_ms", 0)
+                group["max_wall_ms"] = max(group["max_wall_ms"], values.get("wall_ms", 0))
+                group["cpu_ms"] += values.get("cpu_ms", 0)
+
+    return [
+        dict(zip(group_by, key), count=group["count"],
+             mean_wall_ms=round(group["wall_ms"] / group["count"], 1),
+             max_wall_ms=round(group["max_wall_ms"], 1),
+             mean_cpu_ms=round(group["cpu_ms"] / group["count"], 1))
+        for key, group in sorted(groups.items(), key=lambda item: [str(k) for k in item[0]])
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrégation des temps par étape des traitements Python")
+    parser.add_argument("--file", default=os.getenv("PIPELINE_TIMINGS_PATH", DEFAULT_LOG_PATH), help="Journal JSON lines des temps")
+    parser.add_argument("--group-by", default="job,stage", help="Regroupement: job, stage, day (séparés par des virgules)")
+    args = parser.parse_args()
+
+    group_by = tuple(field.strip() for field in args.group_by.split(",") if field.strip())
+    unknown = set(group_by) - {"job", "stage", "day"}
+    if unknown:
+        parser.error(f"regroupement inconnu: {', '.join(sorted(unknown))}")
+    try:
+        print(json.dumps({"success": True, "groups": rollup_timings(args.file, group_by)}, ensure_ascii=False, indent=2))
+    except OSError as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+
+
+if __name__ == "__main__":
+    main()
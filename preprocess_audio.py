@@ -6,18 +6,382 @@ Ce script utilise FFmpeg pour convertir les fichiers audio/vidéo en format MP3
 """
 
 import os
+import re
 import sys
 import json
+import bisect
+import hashlib
 import argparse
 import subprocess
 import tempfile
 from pathlib import Path
 
+from pipeline_timings import instrumented, stage
+
+# Paramètres par défaut de la détection de silences
+DEFAULT_SILENCE_NOISE_DB = -35
+DEFAULT_MIN_SILENCE_S = 1.0
+DEFAULT_KEEP_SILENCE_S = 0.5
+
+# Extensions prises en compte lorsqu'un répertoire est passé en mode batch
+MEDIA_EXTENSIONS = {".mp3", ".wav", ".m4a", ".aac", ".ogg", ".opus", ".flac", ".webm", ".mp4", ".mkv", ".mov", ".avi", ".mpeg", ".mpga"}
+
+_ffmpeg_available = None
+
+SILENCE_START_RE = re.compile(r"silence_start:\s*(-?[\d.]+)")
+SILENCE_END_RE = re.compile(r"silence_end:\s*(-?[\d.]+)")
+
+def check_ffmpeg():
+    """Vérifie qu'FFmpeg est disponible (résultat mémorisé pour la durée du processus)"""
+    global _ffmpeg_available
+    if _ffmpeg_available is None:
+        try:
+            subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+            _ffmpeg_available = True
+        except (subprocess.SubprocessError, FileNotFoundError):
+            _ffmpeg_available = False
+    return _ffmpeg_available
+
 def get_file_size_mb(file_path):
     """Retourne la taille du fichier en Mo"""
     return os.path.getsize(file_path) / (1024 * 1024)
 
-def preprocess_audio(input_file, output_dir=None, target_size_mb=25):
+def get_probe_cache_file(file_path):
+    """Retourne le chemin du fichier de métadonnées ffprobe conservé à côté du média"""
+    return f"{file_path}.probe.json"
+
+def write_probe_cache(file_path, metadata):
+    """Enregistre les métadonnées d'un média à côté du fichier (ignoré si le répertoire est en lecture seule)"""
+    stat = os.stat(file_path)
+    metadata = dict(metadata, size=stat.st_size, mtime=int(stat.st_mtime))
+    try:
+        with open(get_probe_cache_file(file_path), "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+    except OSError:
+        pass
+    return metadata
+
+def read_probe_cache(file_path):
+    """Retourne les métadonnées en cache si elles correspondent encore au fichier, sinon None"""
+    try:
+        with open(get_probe_cache_file(file_path), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return None
+    if metadata.get("size") != stat.st_size or metadata.get("mtime") != int(stat.st_mtime):
+        return None
+    return metadata
+
+def probe_media(file_path, use_cache=True):
+    """
+    Analyse la durée et les flux d'un média avec un seul appel ffprobe
+    
+    Le résultat est mis en cache dans <fichier>.probe.json (invalidé si la
+    taille ou la date de modification change), ce qui permet au code PHP et
+    aux appels suivants de le réutiliser sans relancer ffprobe.
+    
+    Args:
+        file_path (str): Chemin vers le fichier audio/vidéo
+        use_cache (bool, optional): Si False, ignore le cache existant
+        
+    Returns:
+        dict or None: {duration, format_name, bit_rate, has_video, audio_streams: [...]}, ou None si ffprobe échoue
+    """
+    if use_cache:
+        metadata = read_probe_cache(file_path)
+        if metadata is not None:
+            return metadata
+    
+    command = [
+        "ffprobe",
+        "-v", "error",
+        "-show_format",
+        "-show_streams",
+        "-of", "json",
+        file_path
+    ]
+    try:
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        data = json.loads(process.stdout.decode("utf-8"))
+        duration = float(data["format"]["duration"])
+    except (subprocess.SubprocessError, FileNotFoundError, ValueError, KeyError):
+        return None
+    
+    streams = data.get("streams", [])
+    audio_streams = [
+        {
+            "index": stream.get("index"),
+            "codec_name": stream.get("codec_name"),
+            "bit_rate": int(stream["bit_rate"]) if stream.get("bit_rate") else None,
+            "sample_rate": int(stream["sample_rate"]) if stream.get("sample_rate") else None,
+            "channels": stream.get("channels")
+        }
+        for stream in streams if stream.get("codec_type") == "audio"
+    ]
+    
+    metadata = {
+        "duration": duration,
+        "format_name": data["format"].get("format_name"),
+        "bit_rate": int(data["format"]["bit_rate"]) if data["format"].get("bit_rate") else None,
+        # Les pochettes d'album (attached_pic) ne sont pas de vraies pistes vidéo
+        "has_video": any(
+            stream.get("codec_type") == "video" and not stream.get("disposition", {}).get("attached_pic")
+            for stream in streams
+        ),
+        "audio_streams": audio_streams
+    }
+    return write_probe_cache(file_path, metadata)
+
+def get_audio_duration(file_path):
+    """
+    Retourne la durée réelle du fichier en secondes via ffprobe (métadonnées en cache)
+    
+    Args:
+        file_path (str): Chemin vers le fichier audio/vidéo
+        
+    Returns:
+        float or None: Durée en secondes, ou None si ffprobe échoue
+    """
+    metadata = probe_media(file_path)
+    return metadata["duration"] if metadata else None
+
+def compute_target_bitrate(duration_s, target_size_mb, margin=0.97):
+    """
+    Calcule le bitrate exact (kbps) pour que l'audio tienne dans la taille cible
+    
+    Une marge est gardée pour l'en-tête du conteneur; le résultat est limité
+    entre 32 et 192 kbps pour assurer une qualité acceptable.
+    """
+    bitrate_kbps = int((target_size_mb * 8192 * margin) / max(duration_s, 1))
+    return max(32, min(192, bitrate_kbps))
+
+# Codecs acceptés tels quels par l'API Whisper, avec l'extension de conteneur associée
+STREAM_COPY_EXTENSIONS = {
+    "mp3": "mp3",
+    "aac": "m4a",
+    "opus": "ogg",
+    "vorbis": "ogg",
+    "flac": "flac",
+}
+
+def get_stream_copy_plan(metadata, target_size_mb):
+    """
+    Détermine si la piste audio peut être extraite sans réencodage
+    
+    Returns:
+        dict or None: {"stream_index", "extension", "estimated_size_mb"} si la piste audio seule
+            tient dans la taille cible avec un codec accepté, sinon None
+    """
+    if not metadata or not metadata["audio_streams"]:
+        return None
+    
+    stream = metadata["audio_streams"][0]
+    extension = STREAM_COPY_EXTENSIONS.get(stream["codec_name"])
+    if not extension or not stream["bit_rate"]:
+        return None
+    
+    estimated_size_mb = stream["bit_rate"] * metadata["duration"] / 8 / (1024 * 1024)
+    if estimated_size_mb > target_size_mb * 0.97:
+        return None
+    
+    return {"stream_index": stream["index"], "extension": extension, "estimated_size_mb": estimated_size_mb}
+
+def detect_silences(input_file, noise_db=DEFAULT_SILENCE_NOISE_DB, min_silence_s=DEFAULT_MIN_SILENCE_S, duration=None):
+    """
+    Détecte les plages de silence avec le filtre FFmpeg silencedetect
+    
+    Args:
+        input_file (str): Chemin vers le fichier audio/vidéo
+        noise_db (float): Seuil de bruit en dB en dessous duquel l'audio est considéré silencieux
+        min_silence_s (float): Durée minimale d'un silence en secondes
+        duration (float, optional): Durée totale, pour clore un silence final sans fin détectée
+        
+    Returns:
+        list: Plages de silence [début, fin] en secondes
+    """
+    command = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostats",
+        "-i", input_file,
+        "-vn",
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence_s}",
+        "-f", "null",
+        "-"
+    ]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(f"Erreur FFmpeg: {process.stderr.decode('utf-8', errors='replace')}")
+    
+    silences = []
+    silence_start = None
+    for line in process.stderr.decode("utf-8", errors="replace").splitlines():
+        match = SILENCE_START_RE.search(line)
+        if match:
+            silence_start = max(0.0, float(match.group(1)))
+            continue
+        match = SILENCE_END_RE.search(line)
+        if match and silence_start is not None:
+            silences.append([silence_start, float(match.group(1))])
+            silence_start = None
+    
+    if silence_start is not None and duration is not None:
+        silences.append([silence_start, duration])
+    
+    return silences
+
+def build_segment_plan(duration, silences, keep_silence_s=DEFAULT_KEEP_SILENCE_S):
+    """
+    Construit le plan des segments conservés après compression des silences
+    
+    Chaque silence plus long que keep_silence_s est ramené à keep_silence_s
+    (la moitié est conservée de chaque côté de la parole).
+    
+    Args:
+        duration (float): Durée totale du fichier
+        silences (list): Plages de silence [début, fin]
+        keep_silence_s (float): Durée de silence conservée à chaque coupure
+        
+    Returns:
+        dict: Plan en colonnes {"start": [...], "end": [...], "output_start": [...]}
+            start/end dans le fichier original, output_start dans le fichier raccourci
+    """
+    plan = {"start": [], "end": [], "output_start": []}
+    position = 0.0
+    output_position = 0.0
+    
+    for silence_start, silence_end in silences:
+        if silence_end - silence_start <= keep_silence_s:
+            continue
+        cut_start = silence_start + keep_silence_s / 2 if silence_start > 0 else 0.0
+        cut_end = silence_end - keep_silence_s / 2 if silence_end < duration else duration
+        if cut_start > position:
+            plan["start"].append(round(position, 3))
+            plan["end"].append(round(cut_start, 3))
+            plan["output_start"].append(round(output_position, 3))
+            output_position += cut_start - position
+        position = max(position, cut_end)
+    
+    if position < duration:
+        plan["start"].append(round(position, 3))
+        plan["end"].append(round(duration, 3))
+        plan["output_start"].append(round(output_position, 3))
+    
+    return plan
+
+def get_plan_duration(plan):
+    """Retourne la durée totale des segments conservés d'un plan"""
+    return sum(end - start for start, end in zip(plan["start"], plan["end"]))
+
+def map_to_original(timestamp, plan):
+    """
+    Convertit un horodatage du fichier raccourci en horodatage du fichier original
+    
+    Args:
+        timestamp (float): Position en secondes dans le fichier raccourci
+        plan (dict): Plan produit par build_segment_plan
+        
+    Returns:
+        float: Position en secondes dans le fichier original
+    """
+    if not plan["output_start"]:
+        return timestamp
+    index = max(0, bisect.bisect_right(plan["output_start"], timestamp) - 1)
+    return round(plan["start"][index] + (timestamp - plan["output_start"][index]), 3)
+
+def trim_silences(input_file, plan, output_file, bitrate_kbps):
+    """
+    Encode uniquement les segments conservés du plan en MP3 mono
+    
+    Args:
+        input_file (str): Fichier source
+        plan (dict): Plan produit par build_segment_plan
+        output_file (str): Fichier MP3 de sortie
+        bitrate_kbps (int): Bitrate de sortie
+    """
+    selection = "+".join(
+        f"between(t,{start:.3f},{end:.3f})" for start, end in zip(plan["start"], plan["end"])
+    )
+    command = [
+        "ffmpeg",
+        "-i", input_file,
+        "-vn",
+        "-af", f"aselect='{selection}',asetpts=N/SR/TB",
+        "-c:a", "libmp3lame",
+        "-b:a", f"{bitrate_kbps}k",
+        "-ac", "1",  # Mono
+        "-ar", "22050",  # Fréquence d'échantillonnage réduite
+        "-y",  # Écraser le fichier de sortie s'il existe
+        output_file
+    ]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(f"Erreur FFmpeg: {process.stderr.decode('utf-8', errors='replace')}")
+
+def remove_silences(input_file, output_file, target_size_mb=25, noise_db=DEFAULT_SILENCE_NOISE_DB,
+                    min_silence_s=DEFAULT_MIN_SILENCE_S, keep_silence_s=DEFAULT_KEEP_SILENCE_S):
+    """
+    Supprime ou compresse les longs silences d'un fichier et écrit le plan des segments
+    
+    Le plan est également enregistré à côté du fichier de sortie
+    (<output_file>.segments.json) pour recaler les horodatages de la transcription.
+    
+    Returns:
+        dict: Plan des segments, durées et bitrate utilisé
+    """
+    duration = get_audio_duration(input_file)
+    if duration is None:
+        raise RuntimeError(f"Impossible de déterminer la durée de {input_file}")
+    
+    silences = detect_silences(input_file, noise_db, min_silence_s, duration)
+    plan = build_segment_plan(duration, silences, keep_silence_s)
+    kept_duration = get_plan_duration(plan)
+    
+    # Bitrate exact pour la durée conservée
+    target_bitrate_kbps = compute_target_bitrate(kept_duration, target_size_mb)
+    
+    trim_silences(input_file, plan, output_file, target_bitrate_kbps)
+    
+    with open(f"{output_file}.segments.json", "w", encoding="utf-8") as f:
+        json.dump(plan, f)
+    
+    return {
+        "segment_plan": plan,
+        "original_duration_s": round(duration, 3),
+        "trimmed_duration_s": round(kept_duration, 3),
+        "removed_seconds": round(duration - kept_duration, 3),
+        "bitrate_kbps": target_bitrate_kbps
+    }
+
+def link_or_copy(source, destination):
+    """
+    Rend un fichier disponible sous un autre chemin sans le recopier si possible
+    
+    Un lien physique ne coûte aucune écriture disque; la copie n'est utilisée
+    que si la destination est sur un autre système de fichiers.
+    """
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        import shutil
+        shutil.copy2(source, destination)
+
+def get_output_file(input_file, output_dir=None, suffix="_preprocessed", extension="mp3", output_name=None):
+    """Détermine le chemin du fichier de sortie (output_name remplace le nom du fichier d'entrée)"""
+    base_name = output_name or os.path.splitext(os.path.basename(input_file))[0]
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        return os.path.join(output_dir, f"{base_name}{suffix}.{extension}")
+    # Créer un fichier temporaire si aucun répertoire de sortie n'est spécifié
+    return os.path.join(tempfile.gettempdir(), f"{base_name}{suffix}.{extension}")
+
+@instrumented("preprocess")
+def preprocess_audio(input_file, output_dir=None, target_size_mb=25, remove_silence=False,
+                     noise_db=DEFAULT_SILENCE_NOISE_DB, min_silence_s=DEFAULT_MIN_SILENCE_S,
+                     keep_silence_s=DEFAULT_KEEP_SILENCE_S, output_name=None):
     """
     Prétraite un fichier audio/vidéo pour réduire sa taille
     
@@ -25,6 +389,11 @@ def preprocess_audio(input_file, output_dir=None, target_size_mb=25):
         input_file (str): Chemin vers le fichier d'entrée
         output_dir (str, optional): Répertoire de sortie
         target_size_mb (int, optional): Taille cible en Mo
+        remove_silence (bool, optional): Si True, supprime ou compresse les longs silences
+        noise_db (float, optional): Seuil de détection des silences en dB
+        min_silence_s (float, optional): Durée minimale d'un silence détecté
+        keep_silence_s (float, optional): Durée de silence conservée à chaque coupure
+        output_name (str, optional): Nom des fichiers de sortie, sans extension (par défaut: celui du fichier d'entrée)
         
     Returns:
         dict: Résultat du prétraitement
@@ -34,22 +403,40 @@ def preprocess_audio(input_file, output_dir=None, target_size_mb=25):
         if not os.path.exists(input_file):
             return {"success": False, "error": f"Le fichier {input_file} n'existe pas"}
         
-        # Vérifier si FFmpeg est installé
-        try:
-            subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        except (subprocess.SubprocessError, FileNotFoundError):
+        # Vérifier si FFmpeg est installé (une seule fois par processus)
+        if not check_ffmpeg():
             return {"success": False, "error": "FFmpeg n'est pas installé ou n'est pas dans le PATH"}
         
         # Obtenir la taille du fichier en Mo
         file_size_mb = get_file_size_mb(input_file)
         
+        # Supprimer les longs silences (y compris pour les fichiers déjà assez petits)
+        if remove_silence:
+            output_file = get_output_file(input_file, output_dir, "_trimmed", output_name=output_name)
+            with stage("silence_removal"):
+                trim_result = remove_silences(input_file, output_file, target_size_mb, noise_db, min_silence_s, keep_silence_s)
+            new_size_mb = get_file_size_mb(output_file)
+            
+            return {
+                "success": True,
+                "input_file": input_file,
+                "output_file": output_file,
+                "original_size_mb": file_size_mb,
+                "new_size_mb": new_size_mb,
+                **trim_result,
+                "message": f"Silences supprimés ({trim_result['removed_seconds']:.1f} s). Taille réduite de {file_size_mb:.2f} Mo à {new_size_mb:.2f} Mo"
+            }
+        
         # Si le fichier est déjà plus petit que la taille cible, le copier simplement
         if file_size_mb <= target_size_mb:
             if output_dir:
-                output_file = os.path.join(output_dir, os.path.basename(input_file))
+                os.makedirs(output_dir, exist_ok=True)
+                file_name = os.path.basename(input_file)
+                if output_name:
+                    file_name = output_name + os.path.splitext(file_name)[1]
+                output_file = os.path.join(output_dir, file_name)
                 if os.path.abspath(input_file) != os.path.abspath(output_file):
-                    import shutil
-                    shutil.copy2(input_file, output_file)
+                    link_or_copy(input_file, output_file)
             else:
                 output_file = input_file
                 
@@ -62,30 +449,58 @@ def preprocess_audio(input_file, output_dir=None, target_size_mb=25):
                 "message": "Le fichier est déjà plus petit que la taille cible"
             }
         
+        # Analyser la durée réelle et les flux (une seule fois, métadonnées en cache)
+        with stage("probe"):
+            metadata = probe_media(input_file)
+        if metadata is None:
+            return {"success": False, "error": f"Impossible d'analyser le fichier {input_file} avec ffprobe"}
+        
+        # Si la piste audio seule tient dans la taille cible, l'extraire sans réencodage
+        copy_plan = get_stream_copy_plan(metadata, target_size_mb)
+        if copy_plan:
+            output_file = get_output_file(input_file, output_dir, extension=copy_plan["extension"], output_name=output_name)
+            command = [
+                "ffmpeg",
+                "-i", input_file,
+                "-map", f"0:{copy_plan['stream_index']}",
+                "-vn",
+                "-c:a", "copy",
+                "-y",
+                output_file
+            ]
+            with stage("ffmpeg_copy"):
+                process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            
+            if process.returncode == 0 and get_file_size_mb(output_file) <= target_size_mb:
+                new_size_mb = get_file_size_mb(output_file)
+                write_probe_cache(output_file, dict(metadata, has_video=False, audio_streams=metadata["audio_streams"][:1]))
+                return {
+                    "success": True,
+                    "input_file": input_file,
+                    "output_file": output_file,
+                    "original_size_mb": file_size_mb,
+                    "new_size_mb": new_size_mb,
+                    "duration_s": metadata["duration"],
+                    "stream_copy": True,
+                    "message": f"Piste audio extraite sans réencodage. Taille réduite de {file_size_mb:.2f} Mo à {new_size_mb:.2f} Mo"
+                }
+            
+            # Extraction impossible ou trop volumineuse: réencoder
+            if os.path.exists(output_file):
+                os.remove(output_file)
+        
         # Déterminer le fichier de sortie
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-            base_name = os.path.splitext(os.path.basename(input_file))[0]
-            output_file = os.path.join(output_dir, f"{base_name}_preprocessed.mp3")
-        else:
-            # Créer un fichier temporaire si aucun répertoire de sortie n'est spécifié
-            temp_dir = tempfile.gettempdir()
-            base_name = os.path.splitext(os.path.basename(input_file))[0]
-            output_file = os.path.join(temp_dir, f"{base_name}_preprocessed.mp3")
-        
-        # Calculer le bitrate cible en fonction de la taille cible
-        # Formule approximative: bitrate (kbps) = taille cible (Mo) * 8192 / durée (s)
-        # Nous utilisons une estimation de la durée basée sur la taille actuelle et un bitrate moyen de 128 kbps
-        estimated_duration_s = (file_size_mb * 8192) / 128
-        target_bitrate_kbps = int((target_size_mb * 8192) / estimated_duration_s)
-        
-        # Limiter le bitrate entre 32 et 192 kbps pour assurer une qualité acceptable
-        target_bitrate_kbps = max(32, min(192, target_bitrate_kbps))
+        output_file = get_output_file(input_file, output_dir, output_name=output_name)
+        
+        # Calculer le bitrate cible exact à partir de la durée réelle
+        # bitrate (kbps) = taille cible (Mo) * 8192 / durée (s)
+        target_bitrate_kbps = compute_target_bitrate(metadata["duration"], target_size_mb)
         
         # Exécuter FFmpeg pour convertir le fichier
         command = [
             "ffmpeg",
             "-i", input_file,
+            "-vn",
             "-c:a", "libmp3lame",
             "-b:a", f"{target_bitrate_kbps}k",
             "-ac", "1",  # Mono
@@ -94,13 +509,22 @@ def preprocess_audio(input_file, output_dir=None, target_size_mb=25):
             output_file
         ]
         
-        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with stage("ffmpeg_encode"):
+            process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         
         if process.returncode != 0:
             return {"success": False, "error": f"Erreur FFmpeg: {process.stderr.decode('utf-8')}"}
         
         # Vérifier la taille du fichier de sortie
         new_size_mb = get_file_size_mb(output_file)
+        write_probe_cache(output_file, {
+            "duration": metadata["duration"],
+            "format_name": "mp3",
+            "bit_rate": target_bitrate_kbps * 1000,
+            "has_video": False,
+            "audio_streams": [{"index": 0, "codec_name": "mp3", "bit_rate": target_bitrate_kbps * 1000,
+                               "sample_rate": 22050, "channels": 1}]
+        })
         
         return {
             "success": True,
@@ -108,20 +532,146 @@ def preprocess_audio(input_file, output_dir=None, target_size_mb=25):
             "output_file": output_file,
             "original_size_mb": file_size_mb,
             "new_size_mb": new_size_mb,
+            "duration_s": metadata["duration"],
             "bitrate_kbps": target_bitrate_kbps,
+            "exceeds_target": new_size_mb > target_size_mb,
             "message": f"Fichier prétraité avec succès. Taille réduite de {file_size_mb:.2f} Mo à {new_size_mb:.2f} Mo"
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def get_default_jobs():
+    """Retourne le nombre de cœurs réellement disponibles pour le processus"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def read_batch_manifest(source):
+    """
+    Lit la liste des fichiers à traiter en mode batch
+    
+    Args:
+        source (str): Répertoire (fichiers média qu'il contient) ou manifeste JSON lines,
+            chaque ligne étant un chemin JSON ou un objet {"file": ..., <options de preprocess_audio>}
+        
+    Returns:
+        list: Tâches {"file": ..., options...}
+    """
+    if os.path.isdir(source):
+        return [
+            {"file": os.path.join(source, name)}
+            for name in sorted(os.listdir(source))
+            if os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS
+        ]
+    
+    tasks = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                # Ligne illisible: signalée dans les résultats sans interrompre le lot
+                tasks.append({"file": None, "error": f"Ligne {line_number} du manifeste invalide: {e}"})
+                continue
+            if isinstance(entry, str):
+                entry = {"file": entry}
+            elif not isinstance(entry, dict):
+                entry = {"file": None, "error": f"Ligne {line_number} du manifeste invalide: chemin ou objet attendu"}
+            tasks.append(entry)
+    return tasks
+
+def preprocess_batch(tasks, jobs=None, **defaults):
+    """
+    Prétraite plusieurs fichiers en parallèle et produit les résultats au fil de l'eau
+    
+    Chaque tâche lance son propre processus FFmpeg; le pool borne le nombre de
+    conversions simultanées (par défaut, le nombre de cœurs disponibles).
+    
+    Args:
+        tasks (list): Tâches {"file": ..., options...} (voir read_batch_manifest); une tâche
+            {"error": ...} est restituée telle quelle en échec
+        jobs (int, optional): Nombre de conversions simultanées
+        **defaults: Options de preprocess_audio appliquées aux tâches qui ne les précisent pas
+        
+    Yields:
+        dict: Résultat de chaque fichier, dans l'ordre de fin de traitement; une tâche
+            en échec (option inconnue, exception) n'interrompt pas les autres
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    if not check_ffmpeg():
+        for task in tasks:
+            yield {"success": False, "input_file": task.get("file"), "error": "FFmpeg n'est pas installé ou n'est pas dans le PATH"}
+        return
+    
+    # Deux fichiers de même nom dans des répertoires différents écriraient la même sortie:
+    # leur nom de sortie est alors suffixé d'une empreinte de leur répertoire
+    stems = {}
+    for task in tasks:
+        if task.get("file"):
+            stem = os.path.splitext(os.path.basename(task["file"]))[0]
+            stems.setdefault(stem, set()).add(os.path.dirname(os.path.abspath(task["file"])))
+    
+    def output_name(path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if len(stems.get(stem, ())) < 2:
+            return None
+        directory = os.path.dirname(os.path.abspath(path))
+        return f"{stem}_{hashlib.sha1(directory.encode('utf-8')).hexdigest()[:8]}"
+    
+    def run(task):
+        if task.get("error"):
+            return {"success": False, "input_file": task.get("file"), "error": task["error"]}
+        options = dict(defaults)
+        options.setdefault("output_name", output_name(task["file"]))
+        options.update({key: value for key, value in task.items() if key != "file"})
+        result = preprocess_audio(task.get("file"), **options)
+        result.setdefault("input_file", task.get("file"))
+        return result
+    
+    with ThreadPoolExecutor(max_workers=jobs or get_default_jobs()) as executor:
+        futures = {executor.submit(run, task): task for task in tasks}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {"success": False, "input_file": futures[future].get("file"), "error": str(e)}
+
 def main():
     parser = argparse.ArgumentParser(description="Prétraitement audio pour réduire la taille des fichiers")
-    parser.add_argument("--file", required=True, help="Chemin vers le fichier audio/vidéo")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="Chemin vers le fichier audio/vidéo")
+    source.add_argument("--batch", help="Répertoire ou manifeste JSON lines des fichiers à traiter en parallèle")
+    parser.add_argument("--jobs", type=int, help="Nombre de conversions simultanées en mode batch (par défaut: nombre de cœurs)")
     parser.add_argument("--output_dir", help="Répertoire de sortie")
     parser.add_argument("--target_size_mb", type=int, default=25, help="Taille cible en Mo (par défaut: 25)")
+    parser.add_argument("--remove_silence", action="store_true", help="Supprime ou compresse les longs silences")
+    parser.add_argument("--noise_db", type=float, default=DEFAULT_SILENCE_NOISE_DB, help=f"Seuil de silence en dB (par défaut: {DEFAULT_SILENCE_NOISE_DB})")
+    parser.add_argument("--min_silence_s", type=float, default=DEFAULT_MIN_SILENCE_S, help=f"Durée minimale d'un silence en secondes (par défaut: {DEFAULT_MIN_SILENCE_S})")
+    parser.add_argument("--keep_silence_s", type=float, default=DEFAULT_KEEP_SILENCE_S, help=f"Silence conservé à chaque coupure en secondes (par défaut: {DEFAULT_KEEP_SILENCE_S})")
     args = parser.parse_args()
     
-    result = preprocess_audio(args.file, args.output_dir, args.target_size_mb)
+    if args.batch:
+        # Une ligne JSON par fichier, dès qu'il est terminé
+        results = preprocess_batch(
+            read_batch_manifest(args.batch),
+            jobs=args.jobs,
+            output_dir=args.output_dir,
+            target_size_mb=args.target_size_mb,
+            remove_silence=args.remove_silence,
+            noise_db=args.noise_db,
+            min_silence_s=args.min_silence_s,
+            keep_silence_s=args.keep_silence_s
+        )
+        for result in results:
+            print(json.dumps(result), flush=True)
+        return
+    
+    result = preprocess_audio(args.file, args.output_dir, args.target_size_mb, args.remove_silence,
+                              args.noise_db, args.min_silence_s, args.keep_silence_s)
     print(json.dumps(result, indent=2))
 
 if __name__ == "__main__":
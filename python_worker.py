@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Persistent Python worker for Intelligent Transcription
+Keeps the processing modules and the OpenAI client loaded and serves them as
+JSON RPC methods over a Unix socket (or localhost TCP), so that PHP requests
+no longer pay interpreter startup, imports and client construction each time.
+The Unix socket is only accessible to its owner; TCP mode requires a shared
+token (PYTHON_WORKER_TOKEN) sent with every request.
+
+Protocol: the client sends one JSON line {"method": ..., "params": {...},
+"token": ...} and the worker answers with one JSON line {"result": ...}. When the request sets
+"stream_events": true, progress events are relayed first as {"event": ...}
+lines (methods receive them through their on_event callback).
+
+Usage:
+    python python_worker.py serve [--socket PATH | --port PORT]
+    python python_worker.py ping
+"""
+
+import os
+import sys
+import hmac
+import json
+import signal
+import socket
+import logging
+import argparse
+import importlib
+import tempfile
+import threading
+import socketserver
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "intelligent-transcription-worker.sock")
+
+# Méthodes exposées: nom RPC -> (module, fonction)
+METHODS = {
+    "transcribe_audio": ("transcribe", "transcribe_audio"),
+    "preprocess_audio": ("preprocess_audio", "preprocess_audio"),
+    "send_chat_request": ("chat_api", "send_chat_request"),
+    "process_chat": ("chat_api", "process_chat"),
+    "process_summarization": ("chat_api", "process_summarization"),
+    "summarize_batch": ("batch_summarize", "summarize_batch"),
+    "paraphrase_text": ("paraphrase", "paraphrase_text"),
+    "paraphrase_batch": ("paraphrase", "paraphrase_batch"),
+    "translate_segments": ("translate", "translate_segments"),
+    "translate_text": ("translate", "translate_text"),
+}
+
+# Initialisation à exécuter une seule fois au chargement d'un module
+MODULE_SETUP = {
+    "chat_api": "setup_api_key",
+}
+
+
+class JsonLinesWriter:
+    """Thread-safe callable writing one JSON object per line, flushed immediately"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def __call__(self, obj):
+        line = json.dumps(obj, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+
+_modules = {}
+_modules_lock = threading.Lock()
+
+
+def get_socket_address(socket_path=None, port=None):
+    """Resolve the worker address from arguments or environment"""
+    port = port or os.getenv("PYTHON_WORKER_PORT")
+    if port:
+        return ("127.0.0.1", int(port))
+    return socket_path or os.getenv("PYTHON_WORKER_SOCKET", DEFAULT_SOCKET_PATH)
+
+
+def get_worker_token():
+    """Shared secret required with every request (mandatory in TCP mode)"""
+    return os.getenv("PYTHON_WORKER_TOKEN") or None
+
+
+def _load_module(name):
+    """Import a processing module once and run its setup hook"""
+    with _modules_lock:
+        if name not in _modules:
+            module = importlib.import_module(name)
+            setup = MODULE_SETUP.get(name)
+            if setup:
+                getattr(module, setup)()
+            _modules[name] = module
+        return _modules[name]
+
+
+def dispatch(method, params, on_event=None):
+    """
+    Execute an RPC method in the worker process
+
+    Args:
+        method (str): Name of the method (see METHODS)
+        params (dict): Keyword arguments for the function
+        on_event (callable, optional): Receives progress events emitted by the method
+
+    Returns:
+        Result of the function, or an error dict in the scripts' format
+    """
+    if method == "ping":
+        return {"success": True, "pid": os.getpid(), "methods": sorted(METHODS)}
+
+    if method not in METHODS:
+        return {"success": False, "error": f"Méthode inconnue: {method}"}
+
+    module_name, function_name = METHODS[method]
+    try:
+        function = getattr(_load_module(module_name), function_name)
+        params = dict(params or {})
+        if on_event is not None:
+            params["on_event"] = on_event
+        return function(**params)
+    except Exception as e:
+        logging.error(f"Error in worker method {method}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+class WorkerRequestHandler(socketserver.StreamRequestHandler):
+    """Handle one JSON line request per connection"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        lock = threading.Lock()
+
+        def send(message):
+            data = json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+            with lock:
+                self.wfile.write(data)
+                self.wfile.flush()
+
+        try:
+            request = json.loads(line.decode("utf-8"))
+            token = self.server.token
+            if token and not hmac.compare_digest(str(request.get("token") or ""), token):
+                result = {"success": False, "error": "Jeton du worker invalide"}
+            else:
+                on_event = (lambda event: send({"event": event})) if request.get("stream_events") else None
+                result = dispatch(request.get("method"), request.get("params"), on_event)
+        except (json.JSONDecodeError, UnicodeDecodeError, AttributeError) as e:
+            result = {"success": False, "error": f"Requête JSON invalide: {e}"}
+
+        send({"result": result})
+
+
+class ThreadingUnixWorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    token = None
+
+
+class ThreadingTCPWorkerServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    token = None
+
+
+def preload():
+    """Import every processing module and build the shared OpenAI client"""
+    try:
+        from whisper_models import get_model_pool
+        # Pinned models (WHISPER_PRELOAD_MODELS) are loaded before the first job
+        get_model_pool().preload()
+    except Exception as e:
+        logging.error(f"Unable to preload Whisper models: {e}")
+
+    for module_name in sorted({module for module, _ in METHODS.values()}):
+        try:
+            _load_module(module_name)
+        except Exception as e:
+            logging.error(f"Unable to preload {module_name}: {e}")
+
+    try:
+        from openai_client import check_openai_config, get_client
+        if check_openai_config() is None:
+            get_client()
+    except Exception as e:
+        logging.error(f"Unable to build OpenAI client: {e}")
+
+
+def serve(socket_path=None, port=None):
+    """Run the worker until interrupted"""
+    address = get_socket_address(socket_path, port)
+    token = get_worker_token()
+    if isinstance(address, tuple) and not token:
+        # Any local process can reach a TCP port: never serve it unauthenticated
+        raise SystemExit("PYTHON_WORKER_TOKEN est obligatoire pour le mode TCP")
+    preload()
+
+    if isinstance(address, tuple):
+        server = ThreadingTCPWorkerServer(address, WorkerRequestHandler)
+    else:
+        if os.path.exists(address):
+            os.unlink(address)
+        # Socket created owner-only (no window where it is group/world accessible)
+        previous_umask = os.umask(0o177)
+        try:
+            server = ThreadingUnixWorkerServer(address, WorkerRequestHandler)
+        finally:
+            os.umask(previous_umask)
+        os.chmod(address, 0o600)
+    server.token = token
+
+    if threading.current_thread() is threading.main_thread():
+        # The worker is stopped with SIGTERM: leave through the finally block below
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    logging.info(f"Python worker listening on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        from openai_cache_utils import CacheMetricsSink
+        CacheMetricsSink.flush_all()
+        server.server_close()
+        if not isinstance(address, tuple) and os.path.exists(address):
+            os.unlink(address)
+
+
+def call_worker(method, params=None, socket_path=None, port=None, timeout=None, on_event=None):
+    """
+    Call a method on the running worker
+
+    Args:
+        method (str): Name of the method
+        params (dict, optional): Keyword arguments for the method
+        socket_path (str, optional): Unix socket path
+        port (int, optional): Localhost TCP port
+        timeout (float, optional): Socket timeout in seconds
+        on_event (callable, optional): Receives the progress events relayed by the worker
+
+    Returns:
+        The method result, or None if no worker is reachable (the caller then
+        runs the function in-process). Once the request is sent, a failure
+        (worker stopped mid-job, garbled answer) is returned as an error dict:
+        running the job again locally could execute and bill it twice.
+    """
+    if os.getenv("PYTHON_WORKER_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+
+    address = get_socket_address(socket_path, port)
+    family = socket.AF_INET if isinstance(address, tuple) else socket.AF_UNIX
+
+    try:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(address)
+    except OSError:
+        return None
+
+    with sock:
+        request = {"method": method, "params": params or {}, "stream_events": on_event is not None,
+                   "token": get_worker_token()}
+        try:
+            sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as stream:
+                for line in stream:
+                    message = json.loads(line.decode("utf-8"))
+                    if "event" in message:
+                        on_event(message["event"])
+                    else:
+                        return message.get("result")
+        except OSError as e:
+            return {"success": False, "error": f"Erreur de communication avec le worker Python: {e}"}
+        except (ValueError, AttributeError) as e:
+            return {"success": False, "error": f"Réponse invalide du worker Python: {e}"}
+
+    return {"success": False, "error": "Le worker Python s'est arrêté avant de répondre"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker Python persistant pour Intelligent Transcription")
+    parser.add_argument("command", choices=["serve", "ping"], help="Démarrer le worker ou vérifier qu'il répond")
+    parser.add_argument("--socket", help=f"Chemin du socket Unix (par défaut: {DEFAULT_SOCKET_PATH})")
+    parser.add_argument("--port", type=int, help="Port TCP local (remplace le socket Unix)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        filename='python_worker.log',
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s'
+    )
+
+    if args.command == "serve":
+        serve(args.socket, args.port)
+        return
+
+    result = call_worker("ping", socket_path=args.socket, port=args.port, timeout=5)
+    if result is None:
+        print(json.dumps({"success": False, "error": "Le worker Python ne répond pas"}))
+        sys.exit(1)
+    print(json.dumps(result))
+    if not result.get("success"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
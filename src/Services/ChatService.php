@@ -272,11 +272,13 @@ class ChatService
         $messageFile = tempnam(sys_get_temp_dir(), 'chat_message_');
         file_put_contents($messageFile, $message);
 
-        // Préparer le contexte optimisé pour le prompt OpenAI
+        // Transmettre le contexte brut: chat_api.py l'assemble avec un vrai tokenizer
+        // (préfixe système + transcription stable pour le cache OpenAI, historique ajusté au budget)
         $contextFile = tempnam(sys_get_temp_dir(), 'chat_context_');
         file_put_contents($contextFile, json_encode([
-            'messages' => $optimizedPrompt,
-            'transcription' => '' // Le contexte de transcription est déjà inclus dans optimizedPrompt
+            'messages' => $updatedContext,
+            'system_prompt' => PromptUtils::getSystemPrompt('chat'),
+            'transcription' => $transcriptionContext
         ]));
 
         // Créer un fichier temporaire pour le résultat
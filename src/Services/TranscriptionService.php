@@ -398,6 +398,17 @@ class TranscriptionService
     private function getAudioDuration($filePath)
     {
         try {
+            // Réutiliser les métadonnées ffprobe mises en cache par preprocess_audio.py
+            $probeFile = $filePath . '.probe.json';
+            if (file_exists($probeFile)) {
+                $probe = json_decode(file_get_contents($probeFile), true);
+                if ($probe && isset($probe['duration'])
+                    && ($probe['size'] ?? null) === filesize($filePath)
+                    && ($probe['mtime'] ?? null) === filemtime($filePath)) {
+                    return (int)floatval($probe['duration']);
+                }
+            }
+            
             // Utiliser ffprobe pour obtenir la durée
             $command = "ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 " . escapeshellarg($filePath);
             $output = shell_exec($command);
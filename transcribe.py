@@ -8,46 +8,331 @@ Ce script est conçu pour être utilisé dans une architecture simplifiée
 import os
 import sys
 import json
+import time
+import shutil
 import argparse
-from dotenv import load_dotenv
-
-# Charger les variables d'environnement depuis différents emplacements possibles
-env_paths = [
-    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))), 'inteligent-transcription-env', '.env'),
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
-]
-
-for env_path in env_paths:
-    if os.path.exists(env_path):
-        load_dotenv(env_path)
-        break
-
-# Importer et configurer OpenAI
-try:
-    import openai
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    openai.organization = os.getenv("OPENAI_ORG_ID", "org-HzNhomFpeY5ewhrUNlmpTehv")
-    if not openai.api_key:
-        print(json.dumps({
-            "success": False,
-            "error": "La clé API OpenAI n'est pas configurée dans le fichier .env"
-        }))
-        sys.exit(1)
-except ImportError:
-    print(json.dumps({
-        "success": False,
-        "error": "Le module openai n'est pas installé. Installez-le avec: pip install openai"
-    }))
-    sys.exit(1)
-
-def transcribe_audio(file_path, language=None, force_language=False):
-    """
-    Transcrit un fichier audio avec OpenAI Whisper
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from openai_client import check_openai_config, get_client, load_environment
+from python_worker import call_worker, JsonLinesWriter
+from audio_chunking import (DEFAULT_CHUNK_SECONDS, DEFAULT_OVERLAP_SECONDS, FFmpegAudioStream,
+                            plan_chunks, extract_chunk, decode_audio, merge_chunk_results, to_columns)
+from transcription_cache import get_transcription_cache, hash_file, make_cache_key
+from transcript_index import index_transcription
+from openai_scheduler import PRIORITY_BACKGROUND, run_scheduled
+from pipeline_timings import add_counter, in_context, instrumented, stage
+from whisper_models import SAMPLE_RATE, LOCAL_BACKENDS, get_local_backend
+from language_id import identify_language, normalize_language, same_language, get_min_probability, should_identify
+from translate import translate_segments, translate_text
+
+DEFAULT_MAX_WORKERS = 4
+
+# Moteur de transcription: "openai" (API whisper-1) ou un moteur local (voir whisper_models)
+DEFAULT_BACKEND = "openai"
+
+# Taille cible de l'audio encodé à la volée en mode streaming (limite de l'API: 25 Mo)
+STREAM_TARGET_SIZE_MB = 24
+
+# Format verbose_json: segments et mots horodatés, champs de confiance par segment
+VERBOSE_OPTIONS = {"response_format": "verbose_json", "timestamp_granularities": ["segment", "word"]}
+SEGMENT_FIELDS = ("start", "end", "text", "avg_logprob", "no_speech_prob", "compression_ratio")
+WORD_FIELDS = ("start", "end", "word")
+
+# Format texte: verbose_json sans horodatage des mots, pour obtenir la langue détectée sans surcoût
+TEXT_OPTIONS = {"response_format": "verbose_json"}
+
+def _field(obj, name, default=None):
+    """Lit un champ d'une réponse OpenAI (objet ou dictionnaire)"""
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+def create_transcription(client, audio_file, language, **options):
+    """
+    Envoie un fichier (ou un flux) à l'API Whisper
+    
+    L'appel passe par l'ordonnanceur partagé (budget "audio", priorité basse);
+    les flux FFmpeg ne pouvant pas être relus, ils ne sont jamais renvoyés.
+    """
+    upload = audio_file
+    if isinstance(audio_file, FFmpegAudioStream):
+        client = client.with_options(max_retries=0)
+        upload = ("audio.mp3", audio_file)
+    else:
+        add_counter("bytes_uploaded", os.fstat(audio_file.fileno()).st_size)
+
+    def rewind():
+        # Un fichier peut être renvoyé depuis le début, pas un flux déjà consommé
+        if isinstance(audio_file, FFmpegAudioStream):
+            return False
+        audio_file.seek(0)
+
+    # Envoi du fichier et traitement par Whisper (indissociables côté client)
+    with stage("whisper_request"):
+        try:
+            return run_scheduled(
+                lambda: client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=upload,
+                    language=language,
+                    **options
+                ),
+                resource="audio",
+                priority=PRIORITY_BACKGROUND,
+                before_retry=rewind
+            )
+        finally:
+            if isinstance(audio_file, FFmpegAudioStream):
+                add_counter("bytes_uploaded", audio_file.bytes_read)
+
+def emit_event(on_event, event, **fields):
+    """Transmet un événement de progression horodaté (si un destinataire est fourni)"""
+    if on_event is not None:
+        on_event(dict(event=event, timestamp=round(time.time(), 3), **fields))
+
+def parse_verbose_response(response):
+    """
+    Extrait le contenu d'une réponse verbose_json de Whisper
+    
+    Returns:
+        dict: {"text", "language", "duration", "segments": [...], "words": [...]}
+    """
+    segments = [
+        {field: _field(segment, field) for field in SEGMENT_FIELDS}
+        for segment in (_field(response, "segments") or [])
+    ]
+    words = [
+        {field: _field(word, field) for field in WORD_FIELDS}
+        for word in (_field(response, "words") or [])
+    ]
+    for segment in segments:
+        segment["text"] = (segment["text"] or "").strip()
+    return {
+        "text": _field(response, "text", ""),
+        "language": _field(response, "language"),
+        "duration": _field(response, "duration"),
+        "segments": segments,
+        "words": words
+    }
+
+def transcribe_chunk(client, file_path, chunk, language, temp_dir, stream=False):
+    """
+    Extrait et transcrit un segment de l'audio
+    
+    En mode streaming, le segment est encodé par FFmpeg directement dans le corps
+    de la requête; sinon il passe par un fichier temporaire.
+    
+    Returns:
+        dict: Texte, segments et mots (horodatages relatifs au segment) et langue détectée
+    """
+    duration = chunk["end"] - chunk["start"]
+    if stream:
+        with FFmpegAudioStream(file_path, chunk["start"], duration) as audio_stream:
+            response = create_transcription(client, audio_stream, language, **VERBOSE_OPTIONS)
+            audio_stream.check()
+    else:
+        chunk_file = os.path.join(temp_dir, f"chunk_{chunk['index']:04d}.mp3")
+        with stage("ffmpeg_extract"):
+            extract_chunk(file_path, chunk["start"], duration, chunk_file)
+        try:
+            with open(chunk_file, "rb") as audio_file:
+                response = create_transcription(client, audio_file, language, **VERBOSE_OPTIONS)
+        finally:
+            os.remove(chunk_file)
+    
+    return parse_verbose_response(response)
+
+def run_chunks(chunks, duration, transcribe_one, max_workers=DEFAULT_MAX_WORKERS, on_event=None):
+    """
+    Transcrit les segments d'un plan en parallèle et recolle les résultats
+    
+    Args:
+        chunks (list): Plan de découpage (voir plan_chunks)
+        duration (float): Durée totale de l'audio
+        transcribe_one (callable): Transcrit un segment, au format de parse_verbose_response
+        max_workers (int): Nombre maximal de segments transcrits simultanément
+        on_event (callable, optional): Reçoit chunks_planned, chunk_started et chunk_finished
+        
+    Returns:
+        dict: Texte recollé, segments et mots horodatés (en colonnes), langue majoritaire,
+            nombre de segments et durée
+    """
+    emit_event(on_event, "chunks_planned", chunks=len(chunks), duration=round(duration, 3))
+    
+    progress_lock = threading.Lock()
+    covered = {"seconds": 0.0}
+    
+    def run(chunk):
+        emit_event(on_event, "chunk_started", index=chunk["index"], start=chunk["start"], end=chunk["end"])
+        result = transcribe_one(chunk)
+        if on_event is not None:
+            # Texte de la zone possédée par ce segment, tel qu'il figurera dans le résultat final
+            partial_text, _, _ = merge_chunk_results([chunk], [result])
+            with progress_lock:
+                covered["seconds"] += min(chunk["own_end"], duration) - chunk["own_start"]
+                percent = round(covered["seconds"] / duration * 100, 1) if duration else 100.0
+            emit_event(on_event, "chunk_finished", index=chunk["index"], start=chunk["start"],
+                       end=chunk["end"], text=partial_text, percent=percent)
+        return result
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(in_context(run), chunks))
+    
+    text, segments, words = merge_chunk_results(chunks, results, SEGMENT_FIELDS, WORD_FIELDS)
+    
+    # Langue majoritaire parmi les segments
+    languages = [result["language"] for result in results if result.get("language")]
+    detected = max(set(languages), key=languages.count) if languages else None
+    
+    return {
+        "text": text,
+        "segments": segments,
+        "words": words,
+        "language": detected,
+        "chunks": len(chunks),
+        "duration": round(duration, 3)
+    }
+
+def transcribe_chunked(client, file_path, language=None, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                       overlap_seconds=DEFAULT_OVERLAP_SECONDS, max_workers=DEFAULT_MAX_WORKERS,
+                       cut_on_silence=False, stream=False, on_event=None):
+    """
+    Transcrit un long fichier en segments chevauchants envoyés en parallèle
+    
+    Args:
+        client: Client OpenAI
+        file_path (str): Chemin vers le fichier audio
+        language (str, optional): Code de langue
+        chunk_seconds (float): Durée d'un segment
+        overlap_seconds (float): Chevauchement entre segments
+        max_workers (int): Nombre maximal de segments transcrits simultanément
+        cut_on_silence (bool): Si True, place les coupures dans les silences détectés
+        stream (bool): Si True, envoie les segments encodés à la volée, sans fichier temporaire
+        on_event (callable, optional): Reçoit les événements chunk_started / chunk_finished
+            (texte partiel et pourcentage de l'audio couvert) au fil de l'eau
+        
+    Returns:
+        dict: Texte recollé, segments et mots horodatés (en colonnes), langue détectée, nombre de segments et durée
+    """
+    from preprocess_audio import get_audio_duration, detect_silences
+    
+    with stage("probe"):
+        duration = get_audio_duration(file_path)
+    if duration is None:
+        raise RuntimeError(f"Impossible de déterminer la durée de {file_path} (ffprobe est-il installé ?)")
+    
+    with stage("silence_detection"):
+        silences = detect_silences(file_path, duration=duration) if cut_on_silence else None
+    chunks = plan_chunks(duration, chunk_seconds, overlap_seconds, silences)
+    
+    temp_dir = None if stream else tempfile.mkdtemp(prefix="transcribe_chunks_")
+    try:
+        return run_chunks(
+            chunks, duration,
+            lambda chunk: transcribe_chunk(client, file_path, chunk, language, temp_dir, stream),
+            max_workers, on_event
+        )
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+def transcribe_local(backend, file_path, language=None, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                     overlap_seconds=DEFAULT_OVERLAP_SECONDS, max_workers=DEFAULT_MAX_WORKERS,
+                     word_timestamps=False, on_event=None):
+    """
+    Transcrit un fichier avec un moteur local, par segments de l'audio décodé
+    
+    L'audio est décodé une seule fois en mémoire (PCM 16 kHz) puis découpé et
+    recollé comme en mode découpé; le nombre de segments réellement transcrits
+    en même temps est borné par le pool de modèles (WHISPER_MODEL_CONCURRENCY).
+    
+    Args:
+        backend: Moteur local (voir whisper_models.get_local_backend)
+        word_timestamps (bool): Si True, horodate aussi les mots (plus coûteux)
+        
+    Returns:
+        dict: Même contenu que transcribe_chunked
+    """
+    with stage("ffmpeg_decode"):
+        samples = decode_audio(file_path, SAMPLE_RATE)
+    duration = len(samples) / SAMPLE_RATE
+    if not duration:
+        raise RuntimeError(f"Aucun échantillon audio décodé dans {file_path}")
+    chunks = plan_chunks(duration, chunk_seconds, overlap_seconds)
+    
+    def transcribe_samples(chunk):
+        audio = samples[int(chunk["start"] * SAMPLE_RATE):int(chunk["end"] * SAMPLE_RATE)]
+        with stage("local_inference"):
+            return backend.transcribe(audio, language, word_timestamps)
+    
+    return run_chunks(chunks, duration, transcribe_samples, max_workers, on_event)
+
+def identify_source_language(file_path, source=None, backend=None, use_cache=True):
+    """
+    Langue de l'audio d'après un court extrait, ou None si elle ne peut pas être identifiée
+    
+    L'identification est une optimisation: sans moteur local installé, hors du
+    worker si le modèle n'est pas déjà chargé (voir language_id.should_identify)
+    ou en cas d'erreur, la transcription se déroule comme si elle n'avait pas eu lieu.
+    """
+    try:
+        if not should_identify(backend):
+            return None
+        with stage("language_id"):
+            return identify_language(file_path, source=source, backend=backend, use_cache=use_cache)
+    except Exception:
+        return None
+
+def remap_segments(segments, segment_plan):
+    """
+    Recale les horodatages d'une transcription de fichier raccourci sur le fichier original
+    
+    Args:
+        segments (dict): Segments ou mots en colonnes {"start": [...], "end": [...], ...}
+        segment_plan (dict or str): Plan produit par preprocess_audio (ou chemin du fichier .segments.json)
+    """
+    from preprocess_audio import map_to_original
+    
+    if isinstance(segment_plan, str):
+        with open(segment_plan, "r", encoding="utf-8") as f:
+            segment_plan = json.load(f)
+    
+    segments["start"] = [map_to_original(t, segment_plan) for t in segments["start"]]
+    segments["end"] = [map_to_original(t, segment_plan) for t in segments["end"]]
+    return segments
+
+@instrumented("transcribe")
+def transcribe_audio(file_path, language=None, force_language=False, chunked=False,
+                     chunk_seconds=DEFAULT_CHUNK_SECONDS, overlap_seconds=DEFAULT_OVERLAP_SECONDS,
+                     max_workers=DEFAULT_MAX_WORKERS, youtube_id=None, use_cache=True,
+                     cut_on_silence=False, segment_plan=None, stream=False, response_format="text",
+                     backend=None, on_event=None):
+    """
+    Transcrit un fichier audio avec OpenAI Whisper (API ou modèle local)
     
     Args:
         file_path (str): Chemin vers le fichier audio
         language (str, optional): Code de langue (fr, en, etc.)
         force_language (bool, optional): Si True, force la traduction dans la langue spécifiée
+        chunked (bool, optional): Si True, découpe l'audio en segments transcrits en parallèle
+        chunk_seconds (float, optional): Durée d'un segment en mode découpé
+        overlap_seconds (float, optional): Chevauchement entre segments en mode découpé
+        max_workers (int, optional): Nombre de segments transcrits simultanément
+        youtube_id (str, optional): ID YouTube, utilisé comme clé de cache à la place de l'empreinte du fichier
+        use_cache (bool, optional): Si False, ignore le cache local des transcriptions
+        cut_on_silence (bool, optional): En mode découpé, place les coupures dans les silences
+        segment_plan (dict or str, optional): Plan de preprocess_audio --remove_silence, pour
+            recaler les horodatages sur le fichier original
+        stream (bool, optional): Si True, encode l'audio avec FFmpeg directement dans la requête,
+            sans fichier prétraité intermédiaire (preprocess_audio.py devient inutile)
+        response_format (str, optional): "text" (texte seul) ou "verbose_json" (segments, mots,
+            champs de confiance et langue détectée, en colonnes parallèles)
+        backend (str, optional): "openai" (API, par défaut), "local" (openai-whisper) ou
+            "faster-whisper" (CTranslate2 int8); TRANSCRIBE_BACKEND si non précisé.
+            Les moteurs locaux transcrivent toujours par segments, sur le CPU
+        on_event (callable, optional): Reçoit les événements de progression (dictionnaires)
         
     Returns:
         dict: Résultat de la transcription
@@ -63,46 +348,195 @@ def transcribe_audio(file_path, language=None, force_language=False):
             language = None
             force_language = False
         
-        # Ouvrir le fichier audio
-        with open(file_path, "rb") as audio_file:
-            # Appeler l'API OpenAI Whisper
-            client = openai.OpenAI(
-                api_key=os.getenv("OPENAI_API_KEY"),
-                organization=os.getenv("OPENAI_ORG_ID", "org-HzNhomFpeY5ewhrUNlmpTehv")
-            )
-            response = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language=language
-            )
-            
-            # Si force_language est True et language est spécifié, traduire le texte
-            transcribed_text = response.text
-            detected_language = "détecté automatiquement"
+        if backend is None:
+            load_environment()
+            backend = os.getenv("TRANSCRIBE_BACKEND", DEFAULT_BACKEND)
+        local_backend = None if backend == "openai" else get_local_backend(backend)
+        model = f"{backend}:{local_backend.model}" if local_backend else "whisper-1"
+        
+        # Consulter le cache local avant tout envoi à l'API
+        cache = get_transcription_cache() if use_cache else None
+        if cache is not None:
+            with stage("cache_lookup"):
+                source = f"youtube:{youtube_id}" if youtube_id else f"sha256:{hash_file(file_path)}"
+                cache_key = make_cache_key(source, model=model, language=language,
+                                           force_language=force_language, chunked=chunked,
+                                           remapped=bool(segment_plan), response_format=response_format)
+                cached = cache.get(cache_key)
+            if cached is not None:
+                cached["cached"] = True
+                emit_event(on_event, "cache_hit")
+                return cached
+        
+        # Traduction demandée: identifier d'abord la langue de l'audio sur un court extrait.
+        # Elle guide la transcription et évite la traduction si l'audio est déjà dans la langue cible.
+        # Sans identification fiable, Whisper détecte lui-même la langue, vérifiée après transcription
+        transcription_language = language
+        translate = bool(force_language and language)
+        identified = None
+        if translate:
+            identified = identify_source_language(file_path, source if cache is not None else None,
+                                                  local_backend.name if local_backend else None, use_cache)
+            if identified and identified["probability"] < get_min_probability():
+                # Trop incertaine: ni indice de transcription, ni langue source de la traduction
+                identified = None
+            if identified:
+                transcription_language = identified["language"]
+                translate = not same_language(identified["language"], language)
+                if not translate:
+                    emit_event(on_event, "translation_skipped", language=identified["language"],
+                               probability=identified["probability"])
+            else:
+                # La langue cible n'indique pas celle de l'audio
+                transcription_language = None
+        
+        # Vérifier la configuration OpenAI (module installé et clé API), inutile en local sans traduction
+        client = None
+        if local_backend is None or translate:
+            config_error = check_openai_config()
+            if config_error:
+                return config_error
             
-            if force_language and language:
-                # Utiliser l'API OpenAI pour traduire le texte dans la langue spécifiée
-                try:
-                    translation_response = client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=[
-                            {"role": "system", "content": f"Tu es un traducteur professionnel. Traduis le texte suivant en {language}, en conservant le style et le ton."},
-                            {"role": "user", "content": transcribed_text}
-                        ]
-                    )
-                    transcribed_text = translation_response.choices[0].message.content
-                    detected_language = f"traduit en {language}"
-                except Exception as e:
-                    # En cas d'erreur de traduction, conserver le texte original
-                    detected_language = f"transcrit en langue originale (échec de traduction: {str(e)})"
+            # Client OpenAI partagé du processus
+            client = get_client()
+        detected_language = "détecté automatiquement"
+        translation_failed = False
+        details = {}
+        verbose = response_format == "verbose_json"
+        options = VERBOSE_OPTIONS if verbose else TEXT_OPTIONS
+        
+        emit_event(on_event, "transcription_started", chunked=chunked, backend=backend)
+        
+        if local_backend is not None:
+            # Modèle local sur le CPU: l'audio décodé est transcrit par segments
+            details = transcribe_local(local_backend, file_path, transcription_language, chunk_seconds, overlap_seconds,
+                                       max_workers, verbose, on_event)
+            source_text = details.pop("text")
+            whisper_language = details.pop("language")
+            if not verbose:
+                details.pop("words")
+            if not chunked:
+                # Mêmes champs qu'une requête unique à l'API
+                details.pop("chunks")
+                if not verbose:
+                    details = {}
+        elif chunked:
+            # Segments chevauchants transcrits en parallèle
+            details = transcribe_chunked(client, file_path, transcription_language, chunk_seconds, overlap_seconds,
+                                         max_workers, cut_on_silence, stream, on_event)
+            source_text = details.pop("text")
+            whisper_language = details.pop("language")
+            if not verbose:
+                details.pop("words")
+        else:
+            if stream:
+                # Encoder à la volée au bitrate exact pour la taille maximale de l'API
+                from preprocess_audio import get_audio_duration, compute_target_bitrate
+                
+                with stage("probe"):
+                    duration = get_audio_duration(file_path)
+                if duration is None:
+                    raise RuntimeError(f"Impossible de déterminer la durée de {file_path} (ffprobe est-il installé ?)")
+                bitrate_kbps = compute_target_bitrate(duration, STREAM_TARGET_SIZE_MB)
+                
+                with FFmpegAudioStream(file_path, bitrate_kbps=bitrate_kbps, sample_rate=22050) as audio_stream:
+                    response = create_transcription(client, audio_stream, transcription_language, **options)
+                    audio_stream.check()
+            else:
+                # Ouvrir le fichier audio et appeler l'API OpenAI Whisper
+                with open(file_path, "rb") as audio_file:
+                    response = create_transcription(client, audio_file, transcription_language, **options)
             
-            # Retourner le résultat
-            return {
-                "success": True,
-                "text": transcribed_text,
-                "language": language or detected_language,
-                "original_text": response.text if force_language and language else None
-            }
+            if verbose:
+                parsed = parse_verbose_response(response)
+                source_text = parsed["text"]
+                whisper_language = parsed["language"]
+                details = {
+                    "segments": to_columns(parsed["segments"], SEGMENT_FIELDS),
+                    "words": to_columns(parsed["words"], WORD_FIELDS),
+                    "duration": parsed["duration"]
+                }
+            else:
+                source_text = response.text
+                whisper_language = _field(response, "language")
+        
+        # Recaler les horodatages sur le fichier original (audio raccourci par preprocess_audio)
+        if segment_plan:
+            for key in ("segments", "words"):
+                if key in details:
+                    remap_segments(details[key], segment_plan)
+        
+        if whisper_language:
+            detected_language = whisper_language
+            details["detected_language"] = whisper_language
+        if identified:
+            details["detected_language"] = identified["language"]
+            details["language_probability"] = identified["probability"]
+        elif translate and same_language(whisper_language, language):
+            # Langue détectée par Whisper sur tout l'audio: déjà celle demandée
+            translate = False
+            emit_event(on_event, "translation_skipped", language=normalize_language(whisper_language),
+                       probability=None)
+        
+        emit_event(on_event, "transcription_finished", percent=100.0)
+        
+        # Si force_language est True et language est spécifié, traduire le texte
+        # (sauf si l'audio est déjà dans cette langue)
+        transcribed_text = source_text
+        
+        if translate:
+            emit_event(on_event, "translation_started", language=language)
+            # Traduire par lots parallèles de segments (ou de phrases, sans horodatages)
+            try:
+                with stage("translation"):
+                    source_language = normalize_language(details.get("detected_language"))
+                    if "segments" in details:
+                        columns = details["segments"]
+                        translation = translate_segments(
+                            [{"id": i, "text": text} for i, text in enumerate(columns["text"])], language,
+                            source_language=source_language
+                        )
+                    else:
+                        translation = translate_text(transcribed_text, language, source_language=source_language)
+                if not translation["success"]:
+                    raise RuntimeError(translation["error"])
+                
+                if "segments" in details:
+                    columns["translated_text"] = [segment["text"] for segment in translation["segments"]]
+                    transcribed_text = " ".join(text for text in columns["translated_text"] if text)
+                else:
+                    transcribed_text = translation["text"]
+                if translation["failed_segments"]:
+                    # Traduction partielle: conservée, mais pas mise en cache
+                    translation_failed = True
+                    details["translation_failed_segments"] = translation["failed_segments"]
+                detected_language = f"traduit en {language}"
+            except Exception as e:
+                # En cas d'erreur de traduction, conserver le texte original
+                translation_failed = True
+                detected_language = f"transcrit en langue originale (échec de traduction: {str(e)})"
+        
+        # Retourner le résultat
+        result = {
+            "success": True,
+            "text": transcribed_text,
+            "language": language or detected_language,
+            "original_text": source_text if translate else None
+        }
+        if force_language and language and not translate:
+            result["translation_skipped"] = True
+        result.update(details)
+        
+        # Ne pas mettre en cache un résultat dont la traduction a échoué
+        if cache is not None and not translation_failed:
+            with stage("cache_store"):
+                cache.set(cache_key, source, result)
+        
+        # Indexer dès maintenant les longues transcriptions pour la recherche du chat
+        with stage("index"):
+            index_transcription(transcribed_text)
+        
+        return result
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -113,10 +547,53 @@ def main():
     parser.add_argument("--language", help="Code de langue (fr, en, etc.)")
     parser.add_argument("--force-language", action="store_true", help="Force la traduction dans la langue spécifiée")
     parser.add_argument("--output", help="Chemin vers le fichier de sortie JSON")
+    parser.add_argument("--chunked", action="store_true", help="Découpe l'audio en segments chevauchants transcrits en parallèle")
+    parser.add_argument("--chunk-seconds", type=float, default=DEFAULT_CHUNK_SECONDS, help=f"Durée d'un segment en secondes (par défaut: {DEFAULT_CHUNK_SECONDS})")
+    parser.add_argument("--overlap-seconds", type=float, default=DEFAULT_OVERLAP_SECONDS, help=f"Chevauchement entre segments en secondes (par défaut: {DEFAULT_OVERLAP_SECONDS})")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS, help=f"Nombre de segments transcrits simultanément (par défaut: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--cut-on-silence", action="store_true", help="En mode découpé, coupe l'audio dans les silences")
+    parser.add_argument("--segment-plan", help="Fichier .segments.json produit par preprocess_audio.py --remove_silence")
+    parser.add_argument("--stream", action="store_true", help="Encode l'audio avec FFmpeg directement dans la requête, sans fichier intermédiaire")
+    parser.add_argument("--response-format", choices=["text", "verbose_json"], default="text", help="text (par défaut) ou verbose_json (segments, mots et confiance en colonnes)")
+    parser.add_argument("--backend", choices=[DEFAULT_BACKEND, *LOCAL_BACKENDS], help="Moteur de transcription: openai (API), local (openai-whisper) ou faster-whisper (CPU, int8); par défaut TRANSCRIBE_BACKEND ou openai")
+    parser.add_argument("--progress", action="store_true", help="Écrit les événements de progression en JSON lines sur la sortie standard (le résultat reste la dernière ligne)")
+    parser.add_argument("--progress-file", help="Fichier où ajouter les événements de progression en JSON lines")
+    parser.add_argument("--youtube-id", help="ID de la vidéo YouTube (clé du cache des transcriptions)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore le cache local des transcriptions")
     args = parser.parse_args()
     
-    # Transcrire le fichier audio
-    result = transcribe_audio(args.file, args.language, args.force_language)
+    # Transcrire le fichier audio via le worker persistant s'il tourne, sinon localement
+    params = {
+        "file_path": os.path.abspath(args.file),
+        "language": args.language,
+        "force_language": args.force_language,
+        "chunked": args.chunked,
+        "chunk_seconds": args.chunk_seconds,
+        "overlap_seconds": args.overlap_seconds,
+        "max_workers": args.max_workers,
+        "youtube_id": args.youtube_id,
+        "use_cache": not args.no_cache,
+        "cut_on_silence": args.cut_on_silence,
+        "segment_plan": os.path.abspath(args.segment_plan) if args.segment_plan else None,
+        "stream": args.stream,
+        "response_format": args.response_format,
+        "backend": args.backend
+    }
+    progress_stream = None
+    on_event = None
+    if args.progress_file:
+        progress_stream = open(args.progress_file, "a", encoding="utf-8")
+        on_event = JsonLinesWriter(progress_stream)
+    elif args.progress:
+        on_event = JsonLinesWriter(sys.stdout)
+    
+    try:
+        result = call_worker("transcribe_audio", params, on_event=on_event)
+        if result is None:
+            result = transcribe_audio(**params, on_event=on_event)
+    finally:
+        if progress_stream:
+            progress_stream.close()
     
     # Enregistrer le résultat dans un fichier JSON si demandé
     if args.output and result["success"]:
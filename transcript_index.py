@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Transcript Retrieval Index
+Splits a transcription into passages once, stores a BM25 index on disk keyed
+by the content hash, and returns the passages relevant to a chat question so
+that long transcriptions no longer have to be sent in full on every turn.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import hashlib
+import argparse
+import tempfile
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+from chat_context import count_tokens
+
+INDEX_VERSION = 1
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "transcript_index")
+DEFAULT_PASSAGE_TOKENS = 250
+DEFAULT_TOP_K = 6
+
+# Transcriptions shorter than this (in tokens) are sent in full and never indexed
+DEFAULT_MIN_TOKENS = 4000
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = frozenset("""
+a au aux avec ce ces cette dans de des du elle en et il ils je la le les leur lui ma mais me mes moi mon ne nos
+notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous y est sont
+a an and are as at be but by for from has have he her his i if in is it its me my no not of on or our she so
+that the their them they this to was we were what when which who will with you your
+""".split())
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def tokenize(text):
+    """Lowercase, strip accents and split into terms, without stopwords"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [word for word in _WORD_RE.findall(text) if len(word) > 1 and word not in STOPWORDS]
+
+
+def split_passages(text, passage_tokens=DEFAULT_PASSAGE_TOKENS, model="gpt-4o-mini"):
+    """
+    Split a transcription into passages of whole sentences of about passage_tokens tokens
+
+    Returns:
+        list: Passages {"start": character offset, "text": str}
+    """
+    passages = []
+    current = []
+    current_start = 0
+    current_tokens = 0
+    position = 0
+
+    for sentence in _SENTENCE_RE.split(text):
+        offset = text.find(sentence, position)
+        position = offset + len(sentence)
+        if not sentence.strip():
+            continue
+
+        tokens = count_tokens(sentence, model)
+        if current and current_tokens + tokens > passage_tokens:
+            passages.append({"start": current_start, "text": " ".join(current)})
+            current = []
+            current_tokens = 0
+        if not current:
+            current_start = offset
+        current.append(sentence.strip())
+        current_tokens += tokens
+
+    if current:
+        passages.append({"start": current_start, "text": " ".join(current)})
+    return passages
+
+
+def text_key(text):
+    """Content hash identifying a transcription's index"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TranscriptIndex:
+    """BM25 index over the passages of one transcription"""
+
+    def __init__(self, passages, postings, lengths):
+        self.passages = passages
+        self.postings = postings
+        self.lengths = lengths
+        self.avg_length = sum(lengths) / len(lengths) if lengths else 0
+
+    @classmethod
+    def build(cls, text, passage_tokens=DEFAULT_PASSAGE_TOKENS):
+        passages = split_passages(text, passage_tokens)
+        postings = {}
+        lengths = []
+        for i, passage in enumerate(passages):
+            terms = tokenize(passage["text"])
+            lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, []).append([i, frequency])
+        return cls(passages, postings, lengths)
+
+    def to_dict(self):
+        return {"version": INDEX_VERSION, "passages": self.passages, "postings": self.postings, "lengths": self.lengths}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["passages"], data["postings"], data["lengths"])
+
+    def search(self, query, top_k=DEFAULT_TOP_K):
+        """
+        Return the top_k passages for a query, in transcription order
+
+        Returns:
+            list: Passages {"index", "start", "text", "score"}
+        """
+        count = len(self.passages)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, frequency in postings:
+                norm = K1 * (1 - B + B * self.lengths[i] / self.avg_length) if self.avg_length else K1
+                scores[i] = scores.get(i, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+
+        best = sorted(scores, key=lambda i: (-scores[i], i))[:top_k]
+        return [dict(self.passages[i], index=i, score=round(scores[i], 4)) for i in sorted(best)]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+_MAX_LOADED_INDEXES = 32
+
+
+def get_index_dir():
+    return os.getenv("TRANSCRIPT_INDEX_PATH", DEFAULT_INDEX_DIR)
+
+
+def get_index(text, build=True):
+    """
+    Return the index of a transcription, loading it from disk or building it once
+
+    Indexes are kept in memory (LRU) so a long-lived worker reuses them across turns.
+
+    Args:
+        text (str): Transcription text
+        build (bool): Build and save the index when it does not exist yet
+
+    Returns:
+        TranscriptIndex or None
+    """
+    key = text_key(text)
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+
+    path = os.path.join(get_index_dir(), f"{key}.json")
+    index = None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION:
+            index = TranscriptIndex.from_dict(data)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if index is None:
+        if not build:
+            return None
+        index = TranscriptIndex.build(text)
+        save_index(index, path)
+
+    with _indexes_lock:
+        _indexes[key] = index
+        if len(_indexes) > _MAX_LOADED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def save_index(index, path):
+    """Write an index atomically (temporary file then rename)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def get_retrieval_settings():
+    """Return (min_tokens, top_k) from CHAT_RETRIEVAL_MIN_TOKENS and CHAT_RETRIEVAL_TOP_K"""
+    return (
+        int(os.getenv("CHAT_RETRIEVAL_MIN_TOKENS", DEFAULT_MIN_TOKENS)),
+        int(os.getenv("CHAT_RETRIEVAL_TOP_K", DEFAULT_TOP_K))
+    )
+
+
+def needs_retrieval(text, model="gpt-4o-mini"):
+    """Whether a transcription is long enough to be retrieved from rather than sent in full"""
+    if not text:
+        return False
+    min_tokens = get_retrieval_settings()[0]
+    # A token covers at least one byte: short texts are decided without loading the tokenizer
+    if len(text.encode("utf-8")) <= min_tokens:
+        return False
+    return count_tokens(text, model) > min_tokens
+
+
+def retrieve_passages(text, query, top_k=None):
+    """
+    Return the passages of a transcription relevant to a query
+
+    Falls back to the opening passages when no term of the query matches.
+    """
+    if top_k is None:
+        top_k = get_retrieval_settings()[1]
+    index = get_index(text)
+    results = index.search(query, top_k)
+    if not results:
+        results = [dict(passage, index=i, score=0.0) for i, passage in enumerate(index.passages[:top_k])]
+    return results
+
+
+def index_transcription(text):
+    """
+    Build the index of a freshly saved transcription if chat will need it
+
+    Errors are swallowed: the index is rebuilt on the first chat turn otherwise.
+
+    Returns:
+        bool: True if an index exists for the text
+    """
+    try:
+        if not needs_retrieval(text):
+            return False
+        return get_index(text) is not None
+    except Exception:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index de recherche des transcriptions")
+    parser.add_argument("--file", required=True, help="Fichier texte de la transcription")
+    parser.add_argument("--query", help="Question: affiche les passages pertinents au lieu de seulement indexer")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Nombre de passages retournés")
+    args = parser.parse_args()
+
+    try:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+        index = get_index(text)
+    except Exception as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
+
+    result = {"success": True, "key": text_key(text), "passages": len(index.passages)}
+    if args.query:
+        result["results"] = index.search(args.query, args.top_k)
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+"""
+Cache local des résultats de transcription
+Les résultats sont indexés par l'empreinte du contenu audio (ou l'ID YouTube)
+et par les paramètres de transcription, stockés dans SQLite avec une éviction
+LRU bornée en taille et des compteurs de succès/échecs.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from contextlib import contextmanager
+
+from openai_client import load_environment
+
+HASH_BLOCK_SIZE = 1024 * 1024
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "transcription_cache.db")
+DEFAULT_MAX_SIZE_MB = 200
+
+
+def hash_file(file_path, block_size=HASH_BLOCK_SIZE):
+    """
+    Calcule l'empreinte SHA-256 d'un fichier par blocs de taille fixe
+
+    Le fichier n'est jamais chargé entièrement en mémoire, même pour des vidéos de plusieurs Go.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_cache_key(source, **params):
+    """
+    Construit la clé de cache à partir de la source et des paramètres
+
+    Args:
+        source (str): Empreinte du fichier ("sha256:...") ou ID YouTube ("youtube:...")
+        **params: Paramètres influençant le résultat (language, force_language, model, ...)
+    """
+    material = json.dumps({"source": source, "params": params}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TranscriptionCache:
+    """Cache SQLite des résultats de transcription avec éviction LRU"""
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.db_path = db_path
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcription_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transcription_cache_access ON transcription_cache(last_access)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcription_cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _increment(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO transcription_cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def get(self, cache_key):
+        """Retourne le résultat en cache ou None, et met à jour les compteurs"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM transcription_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+
+            if row is None:
+                self._increment(conn, "misses")
+                return None
+
+            conn.execute(
+                "UPDATE transcription_cache SET last_access = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (time.time(), cache_key)
+            )
+            self._increment(conn, "hits")
+            return json.loads(row[0])
+
+    def set(self, cache_key, source, result):
+        """Enregistre un résultat puis évince les entrées les moins récemment utilisées"""
+        payload = json.dumps(result, ensure_ascii=False)
+        size_bytes = len(payload.encode("utf-8"))
+        now = time.time()
+
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO transcription_cache "
+                "(cache_key, source, result, size_bytes, created_at, last_access, hit_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (cache_key, source, payload, size_bytes, now, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM transcription_cache").fetchone()[0]
+        if total <= self.max_size_bytes:
+            return
+
+        evicted = 0
+        for cache_key, size_bytes in conn.execute(
+            "SELECT cache_key, size_bytes FROM transcription_cache ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_size_bytes:
+                break
+            conn.execute("DELETE FROM transcription_cache WHERE cache_key = ?", (cache_key,))
+            total -= size_bytes
+            evicted += 1
+
+        if evicted:
+            self._increment(conn, "evictions", evicted)
+
+    def stats(self):
+        """Retourne les compteurs et l'occupation du cache"""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM transcription_cache_stats").fetchall())
+            entries, size_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM transcription_cache"
+            ).fetchone()
+
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "entries": entries,
+            "size_mb": round(size_bytes / (1024 * 1024), 3),
+            "max_size_mb": round(self.max_size_bytes / (1024 * 1024), 3),
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(hits / lookups * 100, 2) if lookups else 0
+        }
+
+    def clear(self):
+        """Vide le cache et remet les compteurs à zéro"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM transcription_cache")
+            conn.execute("DELETE FROM transcription_cache_stats")
+
+
+_cache = None
+
+
+def get_transcription_cache():
+    """
+    Retourne le cache du processus, ou None s'il est désactivé
+
+    Configuration: TRANSCRIPTION_CACHE_PATH, TRANSCRIPTION_CACHE_MAX_MB, TRANSCRIPTION_CACHE_DISABLED
+    """
+    global _cache
+    load_environment()
+
+    if os.getenv("TRANSCRIPTION_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+
+    if _cache is None:
+        _cache = TranscriptionCache(
+            os.getenv("TRANSCRIPTION_CACHE_PATH", DEFAULT_CACHE_PATH),
+            float(os.getenv("TRANSCRIPTION_CACHE_MAX_MB", DEFAULT_MAX_SIZE_MB))
+        )
+    return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestion du cache des transcriptions")
+    parser.add_argument("--stats", action="store_true", help="Affiche les statistiques du cache")
+    parser.add_argument("--clear", action="store_true", help="Vide le cache")
+    args = parser.parse_args()
+
+    cache = get_transcription_cache()
+    if cache is None:
+        print(json.dumps({"success": False, "error": "Le cache des transcriptions est désactivé"}))
+        return
+
+    if args.clear:
+        cache.clear()
+
+    print(json.dumps({"success": True, **cache.stats()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Moteur de traduction par segments avec OpenAI
+Les segments Whisper (ou les phrases d'un texte) sont regroupés en lots
+traduits en parallèle; chaque lot est une requête JSON qui conserve les
+identifiants et horodatages des segments. Le préfixe système est identique
+d'une requête à l'autre (cache de prompt OpenAI), un lot en échec est
+retraduit segment par segment et les segments déjà présents dans la mémoire
+de traduction (translation_memory.py) ne sont pas renvoyés au modèle; un
+segment presque identique n'y sert que de traduction de référence.
+
+Usage:
+    python translate.py --segments segments.json --language en
+    python translate.py --file texte.txt --language en
+"""
+
+import sys
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from openai_client import check_openai_config, get_client
+from openai_cache_utils import extract_cache_metrics, record_cache_metrics
+from python_worker import call_worker
+from chat_context import count_tokens
+from transcript_index import split_passages
+from openai_scheduler import PRIORITY_BACKGROUND, estimate_chat_tokens, run_scheduled
+from pipeline_timings import add_counter, in_context, instrumented, stage
+from translation_memory import get_translation_memory
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_MAX_WORKERS = 8
+
+# Taille d'un lot: assez petit pour rester loin de la limite de tokens en sortie
+DEFAULT_BATCH_TOKENS = 1500
+DEFAULT_BATCH_SEGMENTS = 40
+
+# Taille des groupes de phrases d'un texte libre traduits comme un segment
+DEFAULT_UNIT_TOKENS = 150
+
+# Préfixe système statique: la langue cible est donnée dans le message utilisateur
+TRANSLATOR_INSTRUCTIONS = """Tu es un traducteur professionnel spécialisé dans les transcriptions audio et vidéo.
+Tu reçois un objet JSON {"segments": [{"id": ..., "text": ...}, ...]} précédé d'une ligne "Langue cible: ...".
+Traduis le texte de chaque segment dans la langue cible, en conservant le style, le ton, les noms propres et les chiffres.
+Les segments se suivent: utilise leur contexte, mais traduis chaque segment séparément, sans fusionner, découper ni réordonner les segments.
+Un segment déjà dans la langue cible est recopié tel quel.
+Un segment peut porter une "reference" {"source": ..., "translation": ...}: traduction validée d'une phrase proche mais différente. Reprends-en la terminologie et le style, mais traduis fidèlement le texte du segment, y compris là où il diffère de la source de référence.
+Réponds uniquement avec un objet JSON {"segments": [{"id": ..., "text": ...}, ...]} contenant exactement les mêmes identifiants."""
+
+
+def split_text_units(text, unit_tokens=DEFAULT_UNIT_TOKENS, model=DEFAULT_MODEL):
+    """
+    Découpe un texte en groupes de phrases entières, paragraphe par paragraphe
+
+    Returns:
+        list: Segments {"id", "text", "paragraph"}
+    """
+    units = []
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+    for paragraph_index, paragraph in enumerate(paragraphs):
+        for passage in split_passages(paragraph, unit_tokens, model):
+            units.append({"id": len(units), "text": passage["text"], "paragraph": paragraph_index})
+    return units
+
+
+def plan_batches(segments, batch_tokens=DEFAULT_BATCH_TOKENS, batch_segments=DEFAULT_BATCH_SEGMENTS,
+                 model=DEFAULT_MODEL):
+    """
+    Regroupe des segments consécutifs en lots d'au plus batch_tokens tokens
+
+    Returns:
+        list: Lots de positions dans segments
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for position, segment in enumerate(segments):
+        tokens = count_tokens(segment.get("text") or "", model)
+        if current and (current_tokens + tokens > batch_tokens or len(current) >= batch_segments):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(position)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_messages(texts, language, references=None):
+    """Préfixe système statique puis langue cible et segments numérotés 0..n-1 (avec leur référence éventuelle)"""
+    segments = []
+    for i, text in enumerate(texts):
+        segment = {"id": i, "text": text}
+        if references and references[i]:
+            segment["reference"] = references[i]
+        segments.append(segment)
+    payload = {"segments": segments}
+    return [
+        {"role": "system", "content": TRANSLATOR_INSTRUCTIONS},
+        {"role": "user", "content": f"Langue cible: {language}\n\n{json.dumps(payload, ensure_ascii=False)}"}
+    ]
+
+
+def translate_texts(texts, language, model=DEFAULT_MODEL, references=None):
+    """
+    Traduit une liste de textes en une seule requête
+
+    Args:
+        references (list, optional): Pour chaque texte, None ou {"source", "translation"}
+            d'une phrase proche tirée de la mémoire de traduction
+
+    Returns:
+        tuple: (traductions dans l'ordre, métriques d'utilisation)
+
+    Raises:
+        ValueError: Si la réponse ne contient pas exactement un texte par segment
+    """
+    messages = build_messages(texts, language, references)
+    source_tokens = sum(count_tokens(text, model) for text in texts)
+    with stage("openai_request"):
+        response = run_scheduled(
+            lambda: get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format={"type": "json_object"}
+            ),
+            tokens=estimate_chat_tokens(messages, source_tokens * 2 + 50 * len(texts), model),
+            priority=PRIORITY_BACKGROUND
+        )
+    metrics = extract_cache_metrics(response)
+    record_cache_metrics(metrics, model=model, context="translation")
+
+    translated = {}
+    for item in json.loads(response.choices[0].message.content).get("segments", []):
+        if isinstance(item, dict) and isinstance(item.get("text"), str):
+            translated[str(item.get("id"))] = item["text"].strip()
+    missing = [i for i in range(len(texts)) if str(i) not in translated]
+    if missing:
+        raise ValueError(f"Réponse incomplète: {len(missing)} segment(s) sur {len(texts)} sans traduction")
+    return [translated[str(i)] for i in range(len(texts))], metrics
+
+
+def _sum_usage(metrics_list):
+    """Additionne les compteurs de tokens de plusieurs requêtes"""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+    for metrics in metrics_list:
+        for key in usage:
+            usage[key] += metrics.get(key, 0)
+    return usage
+
+
+@instrumented("translation")
+def translate_segments(segments, language, model=DEFAULT_MODEL, max_workers=DEFAULT_MAX_WORKERS,
+                       batch_tokens=DEFAULT_BATCH_TOKENS, batch_segments=DEFAULT_BATCH_SEGMENTS,
+                       source_language=None, use_memory=True):
+    """
+    Traduit des segments par lots parallèles
+
+    Les champs des segments (id, start, end, ...) sont conservés; "text" reçoit
+    la traduction et "original_text" le texte source. Un lot en échec (erreur
+    ou réponse incomplète) est retraduit segment par segment; un segment qui
+    échoue encore garde son texte source et figure dans failed_segments.
+    Les segments trouvés à l'identique dans la mémoire de traduction sont
+    repris sans requête; un segment approchant est traduit avec la traduction
+    proche comme référence (memory_references). Les nouvelles traductions sont
+    enregistrées dans la mémoire.
+
+    Args:
+        segments (list): Segments {"id", "text", ...} (l'id est la position si absent)
+        language (str): Langue cible (fr, en, etc.)
+        model (str, optional): Modèle OpenAI
+        max_workers (int, optional): Nombre de lots traduits simultanément
+        batch_tokens (int, optional): Taille maximale d'un lot en tokens source
+        batch_segments (int, optional): Nombre maximal de segments par lot
+        source_language (str, optional): Langue source, si connue (clé de la mémoire de traduction)
+        use_memory (bool): Si False, ignore la mémoire de traduction
+
+    Returns:
+        dict: {"success", "segments", "batches", "failed_segments", "memory_hits", "memory_references", "usage"}
+    """
+    config_error = check_openai_config()
+    if config_error:
+        return config_error
+
+    try:
+        memory = get_translation_memory() if use_memory else None
+        return _translate_segments(segments, language, model, max_workers, batch_tokens, batch_segments,
+                                   source_language, memory)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def _translate_segments(segments, language, model, max_workers, batch_tokens, batch_segments,
+                        source_language=None, memory=None):
+    segments = [dict(segment, id=segment.get("id", i)) for i, segment in enumerate(segments)]
+    pending = [i for i, segment in enumerate(segments) if (segment.get("text") or "").strip()]
+
+    translated = {}
+    references = {}
+    if memory is not None and pending:
+        with stage("translation_memory_lookup"):
+            found = memory.lookup([segments[i]["text"] for i in pending], language, model, source_language)
+        for position, match in found.items():
+            if match["match"] == "exact":
+                translated[pending[position]] = match["translation"]
+            else:
+                # Phrase proche mais différente: référence pour le modèle, jamais traduction finale
+                references[pending[position]] = {"source": match["source"], "translation": match["translation"]}
+        add_counter("memory_hits", len(translated))
+        add_counter("memory_references", len(references))
+        pending = [i for i in pending if i not in translated]
+    memory_hits = len(translated)
+
+    batches = [[pending[k] for k in batch] for batch in plan_batches([segments[i] for i in pending],
+                                                                     batch_tokens, batch_segments, model)]
+
+    def run(batch):
+        texts = [segments[i]["text"].strip() for i in batch]
+        batch_references = [references.get(i) for i in batch]
+        try:
+            translations, metrics = translate_texts(texts, language, model, batch_references)
+            return list(zip(batch, translations)), [metrics], []
+        except Exception as batch_error:
+            if len(batch) == 1:
+                return [], [], [(batch[0], str(batch_error))]
+
+        # Lot en échec: chaque segment est retenté seul
+        add_counter("batches_retried")
+        done, usage, failed = [], [], []
+        for i, text, reference in zip(batch, texts, batch_references):
+            try:
+                translations, metrics = translate_texts([text], language, model, [reference])
+                done.append((i, translations[0]))
+                usage.append(metrics)
+            except Exception as e:
+                failed.append((i, str(e)))
+        return done, usage, failed
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        outputs = list(executor.map(in_context(run), batches))
+
+    usage = []
+    failed = {}
+    new_translations = []
+    for done, batch_usage, batch_failed in outputs:
+        translated.update(done)
+        new_translations.extend((segments[i]["text"], translation) for i, translation in done)
+        usage.extend(batch_usage)
+        failed.update(batch_failed)
+
+    if memory is not None and new_translations:
+        with stage("translation_memory_store"):
+            memory.store(new_translations, language, model, source_language)
+
+    results = []
+    for i, segment in enumerate(segments):
+        results.append(dict(segment, text=translated.get(i, segment.get("text") or ""),
+                            original_text=segment.get("text") or ""))
+
+    if failed and len(failed) == len(pending) and not memory_hits:
+        return {"success": False, "error": next(iter(failed.values()))}
+    return {
+        "success": True,
+        "segments": results,
+        "language": language,
+        "batches": len(batches),
+        "failed_segments": [segments[i]["id"] for i in sorted(failed)],
+        "memory_hits": memory_hits,
+        "memory_references": [segments[i]["id"] for i in sorted(references)],
+        "usage": _sum_usage(usage)
+    }
+
+
+@instrumented("translation")
+def translate_text(text, language, model=DEFAULT_MODEL, max_workers=DEFAULT_MAX_WORKERS,
+                   batch_tokens=DEFAULT_BATCH_TOKENS, source_language=None, use_memory=True):
+    """
+    Traduit un texte libre découpé aux limites de phrases
+
+    Returns:
+        dict: {"success", "text", "original_text", "language", "batches", "failed_segments", "memory_hits",
+            "memory_references", "usage"}
+    """
+    try:
+        if not text or text.strip() == "":
+            return {"success": False, "error": "Le texte à traduire est vide"}
+
+        units = split_text_units(text, model=model)
+        result = translate_segments(units, language, model, max_workers, batch_tokens,
+                                    source_language=source_language, use_memory=use_memory)
+        if not result["success"]:
+            return result
+
+        paragraphs = {}
+        for unit in result["segments"]:
+            paragraphs.setdefault(unit["paragraph"], []).append(unit["text"])
+        return {
+            "success": True,
+            "text": "\n\n".join(" ".join(parts) for _, parts in sorted(paragraphs.items())),
+            "original_text": text,
+            "language": language,
+            "batches": result["batches"],
+            "failed_segments": result["failed_segments"],
+            "memory_hits": result["memory_hits"],
+            "memory_references": result["memory_references"],
+            "usage": result["usage"]
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def read_segments_file(path):
+    """Lit des segments: tableau JSON, objet {"segments": [...]} ou colonnes {"start": [...], "text": [...]}"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and "segments" in data:
+        data = data["segments"]
+    if isinstance(data, dict):
+        # Colonnes parallèles (format verbose_json de transcribe.py)
+        fields = list(data)
+        return [dict(zip(fields, values), id=i) for i, values in enumerate(zip(*data.values()))]
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Traduction par segments avec OpenAI")
+    parser.add_argument("--text", help="Texte à traduire")
+    parser.add_argument("--file", help="Fichier texte à traduire")
+    parser.add_argument("--segments", help="Fichier JSON de segments (tableau, {\"segments\": [...]} ou colonnes)")
+    parser.add_argument("--language", required=True, help="Langue cible (fr, en, etc.)")
+    parser.add_argument("--source-language", help="Langue source, si connue (clé de la mémoire de traduction)")
+    parser.add_argument("--output", help="Chemin vers le fichier de sortie JSON")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"Modèle OpenAI (par défaut: {DEFAULT_MODEL})")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS, help="Nombre de lots traduits simultanément")
+    parser.add_argument("--batch-tokens", type=int, default=DEFAULT_BATCH_TOKENS, help="Taille maximale d'un lot en tokens")
+    parser.add_argument("--no-memory", action="store_true", help="Ignore la mémoire de traduction")
+    args = parser.parse_args()
+
+    options = {"language": args.language, "model": args.model, "max_workers": args.max_workers,
+               "batch_tokens": args.batch_tokens, "source_language": args.source_language,
+               "use_memory": not args.no_memory}
+    try:
+        if args.segments:
+            method = "translate_segments"
+            options["segments"] = read_segments_file(args.segments)
+        else:
+            method = "translate_text"
+            if args.text:
+                options["text"] = args.text
+            elif args.file:
+                with open(args.file, "r", encoding="utf-8") as f:
+                    options["text"] = f.read()
+            else:
+                print(json.dumps({"success": False, "error": "Vous devez spécifier un texte, un fichier ou des segments"}))
+                sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"success": False, "error": f"Erreur lors de la lecture du fichier: {str(e)}"}))
+        sys.exit(1)
+
+    # Traduire via le worker persistant s'il tourne, sinon localement
+    result = call_worker(method, options)
+    if result is None:
+        result = translate_segments(**options) if method == "translate_segments" else translate_text(**options)
+
+    if args.output and result["success"]:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    # Afficher le résultat en JSON pour faciliter le traitement par PHP
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Mémoire de traduction
+Conserve chaque segment traduit, indexé par son texte source normalisé, les
+langues source et cible et le modèle, pour ne plus renvoyer au modèle les
+génériques, avertissements et formules qui reviennent d'un épisode à l'autre.
+Seule une correspondance exacte remplace la requête; sur option, un segment
+presque identique (index de trigrammes de caractères puis similarité d'édition)
+est fourni au modèle comme traduction de référence. Éviction LRU bornée en
+nombre d'entrées, import/export JSON lines et compteurs de succès.
+
+Usage:
+    python translation_memory.py --stats
+    python translation_memory.py --export memoire.jsonl
+    python translation_memory.py --import memoire.jsonl
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from contextlib import contextmanager
+
+from openai_client import load_environment
+
+DEFAULT_MEMORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "translation_memory.db")
+DEFAULT_MAX_ENTRIES = 100000
+# 1 = correspondance exacte uniquement: une phrase proche peut avoir le sens inverse
+# ("I don't think" / "I do think"), les correspondances approchantes ne servent que de référence
+DEFAULT_SIMILARITY = 1.0
+
+# Les segments plus courts ne sont retrouvés que par correspondance exacte
+MIN_FUZZY_CHARS = 20
+
+# Nombre de candidats (trigrammes communs) vérifiés par similarité d'édition
+FUZZY_CANDIDATES = 20
+
+# Recherche approchante bornée: seuls les trigrammes les plus rares du segment sont
+# interrogés, et ceux présents dans plus de MAX_NGRAM_ENTRIES entrées (" de", "the") sont ignorés
+FUZZY_QUERY_NGRAMS = 16
+MAX_NGRAM_ENTRIES = 1000
+
+_SPACE_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def normalize_segment(text):
+    """Forme canonique d'un segment: Unicode NFC, espaces réduits"""
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def _fuzzy_form(text):
+    return normalize_segment(text).casefold()
+
+
+def trigrams(text):
+    """Trigrammes de caractères d'un segment (forme sans casse)"""
+    text = f" {_fuzzy_form(text)} "
+    return {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+
+
+class TranslationMemory:
+    """Mémoire de traduction SQLite avec recherche exacte et approchante"""
+
+    def __init__(self, db_path=DEFAULT_MEMORY_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 similarity_threshold=DEFAULT_SIMILARITY):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translation_memory (
+                    entry_key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    source_language TEXT NOT NULL,
+                    target_language TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_translation_memory_access ON translation_memory(last_access)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translation_memory_ngrams (
+                    scope TEXT NOT NULL,
+                    ngram TEXT NOT NULL,
+                    entry_key TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_translation_memory_ngrams ON translation_memory_ngrams(scope, ngram)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_translation_memory_ngrams_entry ON translation_memory_ngrams(entry_key)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translation_memory_ngram_counts (
+                    scope TEXT NOT NULL,
+                    ngram TEXT NOT NULL,
+                    entries INTEGER NOT NULL,
+                    PRIMARY KEY (scope, ngram)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translation_memory_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _increment(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO translation_memory_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    @staticmethod
+    def _scope(source_language, target_language, model):
+        material = f"{source_language or ''}\n{target_language}\n{model}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _key(scope, normalized):
+        return hashlib.sha256(f"{scope}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def _find_similar(self, conn, scope, text):
+        """Meilleure entrée approchante (mêmes nombres, similarité d'édition suffisante) ou None"""
+        grams = list(trigrams(text))
+        frequencies = dict(conn.execute(
+            f"SELECT ngram, entries FROM translation_memory_ngram_counts WHERE scope = ? AND ngram IN ({','.join('?' * len(grams))})",
+            (scope, *grams)
+        ).fetchall())
+        rare = sorted((gram for gram in grams if 0 < frequencies.get(gram, 0) <= MAX_NGRAM_ENTRIES),
+                      key=frequencies.get)[:FUZZY_QUERY_NGRAMS]
+        if not rare:
+            return None
+
+        candidates = conn.execute(
+            f"SELECT entry_key FROM translation_memory_ngrams WHERE scope = ? AND ngram IN ({','.join('?' * len(rare))}) "
+            "GROUP BY entry_key ORDER BY COUNT(*) DESC LIMIT ?",
+            (scope, *rare, FUZZY_CANDIDATES)
+        ).fetchall()
+        if not candidates:
+            return None
+
+        form = _fuzzy_form(text)
+        numbers = _NUMBER_RE.findall(form)
+        best = None
+        rows = conn.execute(
+            f"SELECT entry_key, source, translation FROM translation_memory WHERE entry_key IN ({','.join('?' * len(candidates))})",
+            [key for key, in candidates]
+        ).fetchall()
+        for entry_key, source, translation in rows:
+            candidate = _fuzzy_form(source)
+            # Un numéro d'épisode ou un chiffre différent change la traduction
+            if _NUMBER_RE.findall(candidate) != numbers:
+                continue
+            score = SequenceMatcher(None, form, candidate, autojunk=False).ratio()
+            if score >= self.similarity_threshold and (best is None or score > best[0]):
+                best = (score, entry_key, source, translation)
+        return best
+
+    def _remove_entries(self, conn, entry_keys):
+        """Supprime des entrées et leurs trigrammes en tenant à jour les fréquences"""
+        for entry_key in entry_keys:
+            conn.execute(
+                "UPDATE translation_memory_ngram_counts SET entries = entries - 1 "
+                "WHERE (scope, ngram) IN (SELECT scope, ngram FROM translation_memory_ngrams WHERE entry_key = ?)",
+                (entry_key,)
+            )
+            conn.execute("DELETE FROM translation_memory_ngrams WHERE entry_key = ?", (entry_key,))
+            conn.execute("DELETE FROM translation_memory WHERE entry_key = ?", (entry_key,))
+        conn.execute("DELETE FROM translation_memory_ngram_counts WHERE entries <= 0")
+
+    def lookup(self, texts, target_language, model, source_language=None):
+        """
+        Cherche la traduction de plusieurs segments
+
+        Une correspondance approchante (seulement si le seuil de similarité est
+        inférieur à 1) désigne la traduction d'une autre phrase: elle ne doit
+        servir que de référence, jamais de traduction finale.
+
+        Returns:
+            dict: Position -> {"translation", "source", "match": "exact"|"fuzzy", "similarity"},
+                pour les segments trouvés uniquement
+        """
+        scope = self._scope(source_language, target_language, model)
+        found = {}
+        hit_keys = []
+        counts = {"hits_exact": 0, "hits_fuzzy": 0, "misses": 0}
+
+        # Lectures hors verrou (WAL): seules les écritures sont sérialisées
+        with self._connect() as conn:
+            for position, text in enumerate(texts):
+                normalized = normalize_segment(text)
+                if not normalized:
+                    continue
+                entry_key = self._key(scope, normalized)
+                row = conn.execute(
+                    "SELECT source, translation FROM translation_memory WHERE entry_key = ?", (entry_key,)
+                ).fetchone()
+                match = {"match": "exact", "similarity": 1.0}
+
+                if row is None and self.similarity_threshold < 1 and len(normalized) >= MIN_FUZZY_CHARS:
+                    best = self._find_similar(conn, scope, normalized)
+                    if best:
+                        entry_key, row = best[1], best[2:]
+                        match = {"match": "fuzzy", "similarity": round(best[0], 3)}
+
+                if row is None:
+                    counts["misses"] += 1
+                    continue
+                counts[f"hits_{match['match']}"] += 1
+                hit_keys.append(entry_key)
+                found[position] = dict(match, source=row[0], translation=row[1])
+
+        with self._lock, self._connect() as conn:
+            now = time.time()
+            conn.executemany(
+                "UPDATE translation_memory SET last_access = ?, hit_count = hit_count + 1 WHERE entry_key = ?",
+                [(now, entry_key) for entry_key in hit_keys]
+            )
+            for name, amount in counts.items():
+                if amount:
+                    self._increment(conn, name, amount)
+        return found
+
+    def store(self, pairs, target_language, model, source_language=None):
+        """
+        Enregistre des paires (source, traduction) puis évince les entrées les moins récemment utilisées
+
+        Returns:
+            int: Nombre de paires enregistrées
+        """
+        scope = self._scope(source_language, target_language, model)
+        now = time.time()
+        stored = 0
+
+        with self._lock, self._connect() as conn:
+            for source, translation in pairs:
+                normalized = normalize_segment(source)
+                if not normalized or translation is None:
+                    continue
+                entry_key = self._key(scope, normalized)
+                self._remove_entries(conn, [entry_key])
+                conn.execute(
+                    "INSERT INTO translation_memory "
+                    "(entry_key, scope, source_language, target_language, model, source, translation, "
+                    "created_at, last_access, hit_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                    (entry_key, scope, source_language or "", target_language, model, normalized, translation, now, now)
+                )
+                if len(normalized) >= MIN_FUZZY_CHARS:
+                    grams = trigrams(normalized)
+                    conn.executemany(
+                        "INSERT INTO translation_memory_ngrams (scope, ngram, entry_key) VALUES (?, ?, ?)",
+                        [(scope, gram, entry_key) for gram in grams]
+                    )
+                    conn.executemany(
+                        "INSERT INTO translation_memory_ngram_counts (scope, ngram, entries) VALUES (?, ?, 1) "
+                        "ON CONFLICT(scope, ngram) DO UPDATE SET entries = entries + 1",
+                        [(scope, gram) for gram in grams]
+                    )
+                stored += 1
+
+            evicted = [key for key, in conn.execute(
+                "SELECT entry_key FROM translation_memory ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                (self.max_entries,)
+            ).fetchall()]
+            if evicted:
+                self._remove_entries(conn, evicted)
+                self._increment(conn, "evictions", len(evicted))
+        return stored
+
+    def export_entries(self, stream):
+        """Écrit toutes les entrées en JSON lines; retourne leur nombre"""
+        count = 0
+        with self._connect() as conn:
+            for source_language, target_language, model, source, translation in conn.execute(
+                "SELECT source_language, target_language, model, source, translation FROM translation_memory "
+                "ORDER BY created_at"
+            ):
+                stream.write(json.dumps({
+                    "source_language": source_language or None,
+                    "target_language": target_language,
+                    "model": model,
+                    "source": source,
+                    "translation": translation
+                }, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def import_entries(self, stream):
+        """Importe des entrées JSON lines (format d'export_entries); retourne leur nombre"""
+        groups = {}
+        for line in stream:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            scope = (entry.get("target_language"), entry.get("model"), entry.get("source_language") or None)
+            groups.setdefault(scope, []).append((entry.get("source"), entry.get("translation")))
+        return sum(self.store(pairs, *scope) for scope, pairs in groups.items())
+
+    def stats(self):
+        """Retourne les compteurs et l'occupation de la mémoire"""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM translation_memory_stats").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM translation_memory").fetchone()[0]
+            pairs = conn.execute(
+                "SELECT source_language, target_language, COUNT(*) FROM translation_memory "
+                "GROUP BY source_language, target_language ORDER BY COUNT(*) DESC"
+            ).fetchall()
+
+        hits_exact = counters.get("hits_exact", 0)
+        hits_fuzzy = counters.get("hits_fuzzy", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits_exact + hits_fuzzy + misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "language_pairs": [
+                {"source_language": source or None, "target_language": target, "entries": count}
+                for source, target, count in pairs
+            ],
+            "hits_exact": hits_exact,
+            "hits_fuzzy": hits_fuzzy,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            # Seules les correspondances exactes évitent une requête
+            "hit_rate": round(hits_exact / lookups * 100, 2) if lookups else 0,
+            "reference_rate": round(hits_fuzzy / lookups * 100, 2) if lookups else 0
+        }
+
+    def clear(self):
+        """Vide la mémoire et remet les compteurs à zéro"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM translation_memory")
+            conn.execute("DELETE FROM translation_memory_ngrams")
+            conn.execute("DELETE FROM translation_memory_ngram_counts")
+            conn.execute("DELETE FROM translation_memory_stats")
+
+
+_memory = None
+
+
+def get_translation_memory():
+    """
+    Retourne la mémoire de traduction du processus, ou None si elle est désactivée
+
+    Configuration: TRANSLATION_MEMORY_PATH, TRANSLATION_MEMORY_MAX_ENTRIES,
+    TRANSLATION_MEMORY_SIMILARITY, TRANSLATION_MEMORY_DISABLED
+    """
+    global _memory
+    load_environment()
+
+    if os.getenv("TRANSLATION_MEMORY_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+
+    if _memory is None:
+        _memory = TranslationMemory(
+            os.getenv("TRANSLATION_MEMORY_PATH", DEFAULT_MEMORY_PATH),
+            int(os.getenv("TRANSLATION_MEMORY_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            float(os.getenv("TRANSLATION_MEMORY_SIMILARITY", DEFAULT_SIMILARITY))
+        )
+    return _memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestion de la mémoire de traduction")
+    parser.add_argument("--stats", action="store_true", help="Affiche les statistiques de la mémoire")
+    parser.add_argument("--clear", action="store_true", help="Vide la mémoire")
+    parser.add_argument("--export", dest="export_file", help="Exporte les entrées en JSON lines (- pour la sortie standard)")
+    parser.add_argument("--import", dest="import_file", help="Importe des entrées JSON lines (format d'export)")
+    args = parser.parse_args()
+
+    memory = get_translation_memory()
+    if memory is None:
+        print(json.dumps({"success": False, "error": "La mémoire de traduction est désactivée"}))
+        return
+
+    result = {"success": True}
+    try:
+        if args.clear:
+            memory.clear()
+        if args.import_file:
+            with open(args.import_file, "r", encoding="utf-8") as f:
+                result["imported"] = memory.import_entries(f)
+        if args.export_file == "-":
+            memory.export_entries(sys.stdout)
+            return
+        if args.export_file:
+            with open(args.export_file, "w", encoding="utf-8") as f:
+                result["exported"] = memory.export_entries(f)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        return
+
+    print(json.dumps(dict(result, **memory.stats()), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Modèles Whisper locaux
+Charge chaque modèle une seule fois par processus et le partage entre les
+requêtes: modèles épinglés préchargés, éviction des modèles inactifs sous un
+budget mémoire et accès sérialisé pour que des utilisateurs simultanés ne
+chargent pas chacun leur copie des poids.
+
+Les moteurs locaux (openai-whisper, ou faster-whisper quantifié en int8 sur
+CTranslate2) transcrivent sur le CPU, sans appel à l'API.
+"""
+
+import os
+import gc
+import abc
+import time
+import logging
+import threading
+import importlib.util
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from openai_client import load_environment
+
+DEFAULT_MEMORY_BUDGET_MB = 2048
+DEFAULT_IDLE_SECONDS = 1800
+DEFAULT_CONCURRENCY = 1
+DEFAULT_LOCAL_MODEL = "base"
+DEFAULT_COMPUTE_TYPE = "int8"
+SAMPLE_RATE = 16000
+
+# Taille approximative des poids en float32 (Mo), utilisée pour libérer la place avant un chargement
+MODEL_SIZES_MB = {
+    "tiny": 150, "tiny.en": 150,
+    "base": 290, "base.en": 290,
+    "small": 930, "small.en": 930,
+    "medium": 2950, "medium.en": 2950,
+    "turbo": 3100, "large-v3-turbo": 3100,
+    "large": 5900, "large-v1": 5900, "large-v2": 5900, "large-v3": 5900,
+}
+DEFAULT_MODEL_SIZE_MB = 1000
+
+
+def load_whisper_model(name, device="cpu", download_root=None):
+    """Charge un modèle openai-whisper (import différé: le paquet est lourd et optionnel)"""
+    import whisper
+
+    return whisper.load_model(name, device=device, download_root=download_root)
+
+
+def measure_model_mb(model, key):
+    """Taille des poids d'un modèle PyTorch chargé, ou estimation d'après son nom"""
+    parameters = getattr(model, "parameters", None)
+    if callable(parameters):
+        try:
+            return sum(p.numel() * p.element_size() for p in parameters()) / (1024 * 1024)
+        except Exception:
+            pass
+    return estimate_model_mb(key)
+
+
+def estimate_model_mb(key):
+    parts = str(key).split(":")
+    size = MODEL_SIZES_MB.get(parts[-1], DEFAULT_MODEL_SIZE_MB)
+    # Poids quantifiés sur 8 bits: quatre fois moins qu'en float32
+    return size / 4 if "int8" in parts else size
+
+
+class _PoolEntry:
+    def __init__(self, key, concurrency):
+        self.key = key
+        self.model = None
+        self.size_mb = 0.0
+        self.users = 0
+        self.uses = 0
+        self.last_used = time.monotonic()
+        self.loaded = threading.Event()
+        self.error = None
+        self.slots = threading.Semaphore(max(1, concurrency))
+
+
+class WhisperModelPool:
+    """
+    Registre des modèles chargés dans le processus
+
+    Les clés identifient un modèle et sa configuration ("base", ou
+    "faster-whisper:int8:1x8:small" pour un autre chargeur). Un seul thread charge
+    une clé donnée: les autres attendent la fin du chargement puis partagent
+    le modèle; chaque modèle sert au plus `concurrency` requêtes à la fois.
+    """
+
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, idle_seconds=DEFAULT_IDLE_SECONDS,
+                 pinned=(), concurrency=DEFAULT_CONCURRENCY, device="cpu", download_root=None):
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_seconds = idle_seconds
+        self.pinned = set(pinned)
+        self._loaders = {}
+        self.concurrency = concurrency
+        self.device = device
+        self.download_root = download_root
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"loads": 0, "hits": 0, "evictions": 0, "load_seconds": 0.0}
+
+    def _default_loader(self, key):
+        return load_whisper_model(key, self.device, self.download_root)
+
+    def _used_mb(self, exclude=None):
+        return sum(entry.size_mb for key, entry in self._entries.items() if key != exclude)
+
+    def _evict_locked(self, entry):
+        del self._entries[entry.key]
+        entry.model = None
+        self._counters["evictions"] += 1
+        logging.info(f"Modèle Whisper {entry.key} libéré")
+
+    def _make_room_locked(self, needed_mb, exclude=None):
+        """Libère les modèles inactifs non épinglés, du moins récemment utilisé au plus récent"""
+        for key, entry in list(self._entries.items()):
+            if self._used_mb(exclude) + needed_mb <= self.memory_budget_mb:
+                return True
+            if key == exclude or key in self.pinned or entry.users or not entry.loaded.is_set():
+                continue
+            self._evict_locked(entry)
+        return self._used_mb(exclude) + needed_mb <= self.memory_budget_mb
+
+    def _acquire(self, key, loader, concurrency=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            loading = entry is None
+            if loading:
+                entry = _PoolEntry(key, concurrency or self.concurrency)
+                self._entries[key] = entry
+                if not self._make_room_locked(estimate_model_mb(key), exclude=key):
+                    logging.warning(f"Budget mémoire Whisper dépassé pour charger {key} (modèles épinglés ou en cours d'utilisation)")
+            else:
+                self._counters["hits"] += 1
+            entry.users += 1
+            self._entries.move_to_end(key)
+
+        if loading:
+            # Rendre la mémoire des modèles évincés avant d'allouer les nouveaux poids
+            gc.collect()
+            started = time.monotonic()
+            try:
+                model = (loader or self._default_loader)(key)
+            except Exception as e:
+                with self._lock:
+                    entry.error = e
+                    entry.users -= 1
+                    self._entries.pop(key, None)
+                entry.loaded.set()
+                raise
+            with self._lock:
+                entry.model = model
+                entry.size_mb = measure_model_mb(model, key)
+                self._counters["loads"] += 1
+                self._counters["load_seconds"] += time.monotonic() - started
+            entry.loaded.set()
+            logging.info(f"Modèle Whisper {key} chargé en {time.monotonic() - started:.1f} s ({entry.size_mb:.0f} Mo)")
+        else:
+            entry.loaded.wait()
+            if entry.error is not None:
+                with self._lock:
+                    entry.users -= 1
+                raise RuntimeError(f"Le chargement du modèle Whisper {key} a échoué: {entry.error}")
+        return entry
+
+    @contextmanager
+    def use(self, key, loader=None, concurrency=None):
+        """
+        Emprunte un modèle, chargé au premier usage
+
+        Args:
+            key (str): Nom du modèle ("base", "small", ...) ou clé propre au chargeur
+            loader (callable, optional): Charge le modèle à partir de la clé (openai-whisper par défaut)
+            concurrency (int, optional): Requêtes simultanées servies par ce modèle, quand le
+                chargeur le construit pour en servir plusieurs (fixé au premier chargement)
+
+        Yields:
+            Le modèle, réservé à l'appelant tant que `concurrency` vaut 1
+        """
+        entry = self._acquire(key, loader, concurrency)
+        try:
+            with entry.slots:
+                yield entry.model
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.uses += 1
+                entry.last_used = time.monotonic()
+            self.evict_idle()
+
+    def is_loaded(self, key):
+        """Indique si un modèle est déjà chargé (sans le charger)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.loaded.is_set() and entry.error is None
+
+    def pin(self, key, loader=None):
+        """Épingle un modèle: préchargé par preload() avec son chargeur et jamais libéré"""
+        with self._lock:
+            self.pinned.add(key)
+            if loader is not None:
+                self._loaders[key] = loader
+
+    def preload(self, keys=None, loader=None):
+        """Charge les modèles épinglés (ou ceux indiqués) sans attendre une première requête"""
+        for key in keys if keys is not None else sorted(self.pinned):
+            with self.use(key, loader or self._loaders.get(key)):
+                pass
+
+    def evict_idle(self):
+        """Libère les modèles non épinglés inutilisés depuis plus de idle_seconds"""
+        now = time.monotonic()
+        evicted = False
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if (key not in self.pinned and not entry.users and entry.loaded.is_set()
+                        and now - entry.last_used > self.idle_seconds):
+                    self._evict_locked(entry)
+                    evicted = True
+        if evicted:
+            gc.collect()
+
+    def stats(self):
+        """Modèles chargés, mémoire occupée et compteurs de chargement"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "memory_budget_mb": self.memory_budget_mb,
+                "memory_used_mb": round(self._used_mb(), 1),
+                "models": [{
+                    "key": key,
+                    "size_mb": round(entry.size_mb, 1),
+                    "pinned": key in self.pinned,
+                    "in_use": entry.users,
+                    "uses": entry.uses,
+                    "idle_seconds": round(now - entry.last_used, 1)
+                } for key, entry in self._entries.items() if entry.loaded.is_set()],
+                **{name: round(value, 2) if isinstance(value, float) else value for name, value in self._counters.items()}
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_model_pool():
+    """
+    Retourne le pool du processus
+
+    Configuration: WHISPER_MODEL_MEMORY_MB, WHISPER_MODEL_IDLE_SECONDS,
+    WHISPER_PRELOAD_MODELS (modèles épinglés, séparés par des virgules: "base"
+    pour openai-whisper, "faster-whisper:small" pour un autre moteur),
+    WHISPER_MODEL_CONCURRENCY, WHISPER_DEVICE, WHISPER_MODEL_DIR
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None:
+            load_environment()
+            _pool = WhisperModelPool(
+                memory_budget_mb=float(os.getenv("WHISPER_MODEL_MEMORY_MB", DEFAULT_MEMORY_BUDGET_MB)),
+                idle_seconds=float(os.getenv("WHISPER_MODEL_IDLE_SECONDS", DEFAULT_IDLE_SECONDS)),
+                concurrency=int(os.getenv("WHISPER_MODEL_CONCURRENCY", DEFAULT_CONCURRENCY)),
+                device=os.getenv("WHISPER_DEVICE", "cpu"),
+                download_root=os.getenv("WHISPER_MODEL_DIR") or None
+            )
+            # Clés épinglées construites par les moteurs eux-mêmes (mêmes clés qu'à l'usage)
+            for backend in _preload_backends(_pool.concurrency):
+                _pool.pin(backend.key, backend.load)
+    return _pool
+
+
+def _preload_backends(concurrency):
+    backends = []
+    for item in os.getenv("WHISPER_PRELOAD_MODELS", "").split(","):
+        name, _, model = item.strip().rpartition(":")
+        if not model:
+            continue
+        backend_class = LOCAL_BACKENDS.get(name or OpenAIWhisperBackend.name)
+        if backend_class is None:
+            logging.warning(f"WHISPER_PRELOAD_MODELS: moteur inconnu {name} ignoré")
+            continue
+        # workers explicite: le pool est en cours de construction
+        backends.append(backend_class(model, workers=concurrency))
+    return backends
+
+
+def get_cpu_threads():
+    """Threads de calcul: WHISPER_THREADS, ou les cœurs disponibles pour ce processus"""
+    threads = os.getenv("WHISPER_THREADS")
+    if threads:
+        return max(1, int(threads))
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _value(obj, name, default=None):
+    """Lit un champ d'un segment ou d'un mot (dictionnaire ou objet selon le moteur)"""
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def _parse_segments(segments):
+    """Segments et mots au format de parse_verbose_response (transcribe.py)"""
+    parsed = []
+    words = []
+    for segment in segments:
+        parsed.append({
+            "start": _value(segment, "start"),
+            "end": _value(segment, "end"),
+            "text": (_value(segment, "text") or "").strip(),
+            "avg_logprob": _value(segment, "avg_logprob"),
+            "no_speech_prob": _value(segment, "no_speech_prob"),
+            "compression_ratio": _value(segment, "compression_ratio")
+        })
+        words.extend({
+            "start": _value(word, "start"),
+            "end": _value(word, "end"),
+            "word": _value(word, "word")
+        } for word in (_value(segment, "words") or []))
+    return parsed, words
+
+
+def _to_float32(samples):
+    import numpy as np
+
+    return samples.astype(np.float32) / 32768.0 if samples.dtype == np.int16 else samples
+
+
+class LocalWhisperBackend(abc.ABC):
+    """
+    Moteur de transcription local
+
+    transcribe() reçoit les échantillons d'un segment (mono 16 kHz, voir
+    audio_chunking.decode_audio) et retourne le même contenu qu'une réponse
+    verbose_json de l'API: {"text", "language", "duration", "segments", "words"},
+    horodatages relatifs au début du segment.
+    """
+
+    name = None
+    # Paquets nécessaires au moteur (optionnels)
+    requires = ()
+
+    def __init__(self, model=DEFAULT_LOCAL_MODEL, threads=None, workers=None):
+        self.model = model
+        self.threads = threads or get_cpu_threads()
+        self.workers = max(1, workers or get_model_pool().concurrency)
+
+    @property
+    def key(self):
+        # Le nom du modèle termine la clé (estimation de sa taille par le pool)
+        return f"{self.name}:{self.model}"
+
+    @classmethod
+    def is_installed(cls):
+        """Indique si les paquets du moteur sont importables (sans les importer)"""
+        return all(importlib.util.find_spec(module) is not None for module in cls.requires)
+
+    @abc.abstractmethod
+    def load(self, key):
+        """Charge et retourne le modèle désigné par key (appelé par le pool)"""
+
+    @abc.abstractmethod
+    def run(self, model, audio, language, word_timestamps):
+        """Transcrit audio (float32) et retourne le dict décrit par transcribe()"""
+
+    @abc.abstractmethod
+    def run_detection(self, model, audio):
+        """Identifie la langue d'audio (float32) et retourne (code de langue, probabilité)"""
+
+    def transcribe(self, samples, language=None, word_timestamps=False):
+        audio = _to_float32(samples)
+        with get_model_pool().use(self.key, self.load, self.workers) as model:
+            result = self.run(model, audio, language, word_timestamps)
+        if result.get("duration") is None:
+            result["duration"] = round(len(audio) / SAMPLE_RATE, 3)
+        return result
+
+    def detect_language(self, samples):
+        """
+        Identifie la langue d'un extrait (les 30 premières secondes suffisent au modèle)
+
+        Returns:
+            tuple: (code de langue, probabilité)
+        """
+        audio = _to_float32(samples)
+        with get_model_pool().use(self.key, self.load, self.workers) as model:
+            return self.run_detection(model, audio)
+
+
+class OpenAIWhisperBackend(LocalWhisperBackend):
+    """
+    openai-whisper (PyTorch)
+
+    Le cache des clés/valeurs est branché sur le modèle pendant chaque appel:
+    un modèle ne sert qu'une requête à la fois, qui dispose de tous les threads.
+    """
+
+    name = "local"
+    requires = ("whisper", "torch")
+
+    def __init__(self, model=DEFAULT_LOCAL_MODEL, threads=None, workers=None):
+        super().__init__(model, threads, 1)
+
+    @property
+    def key(self):
+        # Même clé que le chargeur par défaut du pool (prototype Gradio)
+        return self.model
+
+    def load(self, key):
+        pool = get_model_pool()
+        return load_whisper_model(self.model, pool.device, pool.download_root)
+
+    def run(self, model, audio, language, word_timestamps):
+        import torch
+
+        # Réglage global de PyTorch: réappliqué à chaque appel
+        torch.set_num_threads(self.threads)
+        with torch.inference_mode():
+            response = model.transcribe(audio, language=language, word_timestamps=word_timestamps,
+                                        fp16=False, verbose=None)
+        segments, words = _parse_segments(response.get("segments") or [])
+        return {"text": (response.get("text") or "").strip(), "language": response.get("language"),
+                "duration": None, "segments": segments, "words": words}
+
+    def run_detection(self, model, audio):
+        import torch
+        import whisper
+
+        torch.set_num_threads(self.threads)
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels).to(model.device)
+        with torch.inference_mode():
+            _, probabilities = model.detect_language(mel)
+        language = max(probabilities, key=probabilities.get)
+        return language, float(probabilities[language])
+
+
+class FasterWhisperBackend(LocalWhisperBackend):
+    """
+    faster-whisper (CTranslate2), quantifié en int8 par défaut
+
+    Le modèle est construit pour servir `workers` segments en parallèle, les
+    threads de calcul étant répartis entre eux.
+    """
+
+    name = "faster-whisper"
+    requires = ("faster_whisper",)
+
+    def __init__(self, model=DEFAULT_LOCAL_MODEL, threads=None, workers=None, compute_type=None):
+        super().__init__(model, threads, workers)
+        self.compute_type = compute_type or os.getenv("WHISPER_COMPUTE_TYPE", DEFAULT_COMPUTE_TYPE)
+
+    @property
+    def key(self):
+        return f"{self.name}:{self.compute_type}:{self.workers}x{max(1, self.threads // self.workers)}:{self.model}"
+
+    def load(self, key):
+        from faster_whisper import WhisperModel
+
+        pool = get_model_pool()
+        return WhisperModel(self.model, device=pool.device, compute_type=self.compute_type,
+                            cpu_threads=max(1, self.threads // self.workers), num_workers=self.workers,
+                            download_root=pool.download_root)
+
+    def run(self, model, audio, language, word_timestamps):
+        segments, info = model.transcribe(audio, language=language, word_timestamps=word_timestamps)
+        # Les segments sont décodés au fil de l'itération
+        segments, words = _parse_segments(list(segments))
+        return {"text": " ".join(segment["text"] for segment in segments if segment["text"]),
+                "language": info.language, "duration": info.duration, "segments": segments, "words": words}
+
+    def run_detection(self, model, audio):
+        # La langue est identifiée avant le premier segment: le générateur n'est pas parcouru
+        _, info = model.transcribe(audio)
+        return info.language, float(info.language_probability)
+
+
+LOCAL_BACKENDS = {
+    OpenAIWhisperBackend.name: OpenAIWhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend
+}
+
+
+def get_local_backend(name, model=None, threads=None, workers=None):
+    """
+    Retourne un moteur de transcription local
+
+    Args:
+        name (str): "local" (openai-whisper) ou "faster-whisper"
+        model (str, optional): Modèle (WHISPER_MODEL, "base" par défaut)
+        threads (int, optional): Threads de calcul (WHISPER_THREADS, cœurs disponibles par défaut)
+        workers (int, optional): Segments transcrits en parallèle par un même modèle, si le
+            moteur le permet (WHISPER_MODEL_CONCURRENCY par défaut)
+    """
+    backend_class = LOCAL_BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"Moteur de transcription inconnu: {name} (choix: openai, {', '.join(LOCAL_BACKENDS)})")
+    return backend_class(model or os.getenv("WHISPER_MODEL", DEFAULT_LOCAL_MODEL), threads, workers)